@@ -0,0 +1,220 @@
+from __future__ import print_function
+
+'''
+Accuracy checks that accompany the benchmarks, so that a performance
+change cannot silently change the results.
+
+Blair: the 3x3 panel wing from Blair's DLM report at Mach 0.5 and
+reduced frequency 1.0. The Cp values computed with the full kernel
+are compared with the published values.
+
+Regression: the aspect-ratio 20 rectangular wing from
+examples/blair_rodden_test.py pitching about the quarter chord. The
+lift coefficient is compared with a snapshot of the values computed
+with this implementation. This is not a check against published
+results: it only detects a change in the results, with a tolerance
+that allows for round-off from a different BLAS or compiler. The
+steady lift slope of the same wing is checked against Helmbold's
+formula.
+
+Gust: a wing with a plunge and a pitch mode in a 1-cosine gust. The
+response computed from the frequency response with an inverse FFT
+must be causal: the periodic window is twice as long as the
+response, so the second half holds the response at negative times
+and must vanish.
+
+Gust lift: the same wing in an upward 1-cosine gust, computed with
+computeDiscreteGustResponse. The lift and the upward plunge response
+must both peak with a positive sign.
+'''
+
+import numpy as np
+from dlm4py.DLM import DLM
+
+# The Cp values from Blair
+BLAIR_CP = np.array([-5.4900e-01 + 6.2682e+00j,
+                     -3.8862e+00 + 2.4495e+00j,
+                     -3.8736e+00 + 1.1745e+00j,
+                     -5.9144e-01 + 5.8092e+00j,
+                     -3.6405e+00 + 2.1530e+00j,
+                     -3.6234e+00 + 1.0281e+00j,
+                     -5.8286e-01 + 4.5474e+00j,
+                     -2.8983e+00 + 1.4663e+00j,
+                     -2.8893e+00 + 7.1186e-01j])
+
+# The reduced frequencies and the snapshot of the lift coefficients
+# computed for the aspect-ratio 20 wing with 40 x 10 panels
+REGRESSION_KR = np.array([0.0, 0.5, 1.0, 2.0])
+REGRESSION_CL = np.array([5.469951193063657 + 0.0j,
+                      3.832764109044396 + 1.6336455899880025j,
+                      3.465370742946183 + 4.135916667805367j,
+                      2.972597970369871 + 8.473480176997821j])
+
+# The tolerances for the checks
+BLAIR_TOL = 2e-3
+REGRESSION_TOL = 1e-6
+HELMBOLD_TOL = 0.05
+GUST_TOL = 1e-3
+GUST_LIFT_TOL = 0.0
+
+def computeBlair():
+    '''Compute the Cp values for the Blair test case'''
+
+    solver = DLM(is_symmetric=1)
+    solver.addMeshSegment(3, 3, 12.0, 12.0)
+    solver.use_steady_kernel = False
+
+    # kr = omega*b/U with b = 6
+    U = 1.0
+    omega = U*1.0/6.0
+    solver.computeInfluenceMatrix(U, omega, 0.5)
+
+    w = -1j*np.ones(solver.npanels, dtype=complex)
+    Cp = np.linalg.solve(solver.Dtrans.T, w)
+
+    return Cp
+
+def computeRodden(kvals=REGRESSION_KR):
+    '''Compute the lift coefficient of the aspect-ratio 20 wing'''
+
+    chord = 0.5
+    solver = DLM(is_symmetric=1)
+    solver.addMeshSegment(40, 10, 5.0, chord)
+
+    U = 1.0
+    Cl = np.zeros(len(kvals), dtype=complex)
+    for k, kr in enumerate(kvals):
+        # The downwash for a unit pitch about the quarter chord
+        omega = kr*U/(0.5*chord)
+        w = -1.0 - 1j*(omega/U)*(solver.Xr[:,0] - 0.25*chord)
+
+        solver.computeInfluenceMatrix(U, omega, 0.0)
+        Cp = np.linalg.solve(solver.Dtrans.T, w)
+        Cl[k] = np.sum(Cp)/solver.npanels
+
+    return Cl
+
+def createGustWing():
+    '''
+    Create a wing with a mass-normalized upward plunge mode and a
+    pitch mode about the quarter chord
+    '''
+
+    solver = DLM(is_symmetric=1)
+    solver.addMeshSegment(8, 4, 4.0, 1.0)
+
+    # Set the mass-normalized plunge and pitch modes. The leading
+    # edge is at x = -0.25.
+    nvecs = 2
+    modes = np.zeros((solver.nnodes, 3, nvecs))
+    modes[:,2,0] = 0.3
+    modes[:,2,1] = -0.3*(solver.X[:,0] + 0.1)
+    solver.Kr = np.diag([4.0**2, 12.0**2])
+    solver.omega = np.array([4.0, 12.0])
+    solver.Qm_modes = modes.reshape(-1, nvecs)
+    solver.Qm_vwash = np.zeros((solver.npanels, nvecs))
+    solver.Qm_dwash = np.zeros((solver.npanels, nvecs))
+    for k in range(nvecs):
+        solver.Qm_vwash[:,k], solver.Qm_dwash[:,k] = \
+            solver.getModeBCs(modes[:,:,k])
+
+    return solver
+
+def computeGust(N=2048, dt=0.01):
+    '''
+    Compute the time history of the modal coordinates of the gust
+    wing in a 1-cosine gust at U = 10
+    '''
+
+    from dlm4py.gust import oneMinusCosine
+
+    solver = createGustWing()
+
+    # Compute the response to a gust that arrives at t = 0
+    U = 10.0
+    qinf = 0.5*1.225*U**2
+    t = dt*np.arange(N)
+    omegas = 2.0*np.pi*np.fft.rfftfreq(N, dt)
+    R = solver.computeGustFRF(U, 0.0, omegas, qinf, aoa=1.0/U,
+                              x0=np.min(solver.Xr[:,0]), panel=False)
+    Wg = np.fft.rfft(oneMinusCosine(t, U, 2.0))
+    q = np.fft.irfft(Wg[:,np.newaxis]*R, n=N, axis=0)
+
+    return t, q
+
+def computeGustLift(dt=0.01, tfinal=20.0):
+    '''
+    Compute the time history of the plunge coordinate and the lift of
+    the gust wing in an upward 1-cosine gust at U = 10
+    '''
+
+    from dlm4py.gust import computeDiscreteGustResponse
+
+    solver = createGustWing()
+    solver.verbose = False
+
+    U = 10.0
+    qinf = 0.5*1.225*U**2
+    t, q, lift, Cp = computeDiscreteGustResponse(solver, U, 0.0, qinf, 2.0,
+                                                 dt=dt, tfinal=tfinal)
+
+    return t, q[0,:,0], lift[0]
+
+def computeErrors(name):
+    '''
+    Compute the relative error for one of the checks: 'blair',
+    'regression', 'helmbold', 'gust' or 'gust_lift'. The error for
+    'gust_lift' is the number of the peak plunge and peak lift that
+    do not have a positive sign.
+    '''
+
+    if name == 'blair':
+        Cp = computeBlair()
+        return np.max(np.absolute(Cp - BLAIR_CP)/np.absolute(BLAIR_CP))
+    elif name == 'regression':
+        Cl = computeRodden()
+        return np.max(np.absolute(Cl - REGRESSION_CL)/
+                      np.absolute(REGRESSION_CL))
+    elif name == 'gust':
+        # The response at negative times relative to the peak
+        t, q = computeGust()
+        qmax = np.max(np.absolute(q), axis=1)
+        return np.max(qmax[len(t)//2:])/np.max(qmax)
+    elif name == 'gust_lift':
+        # The peaks of an upward gust response must be upward
+        t, z, lift = computeGustLift()
+        zpeak = z[np.argmax(np.absolute(z))]
+        lpeak = lift[np.argmax(np.absolute(lift))]
+        return float(zpeak <= 0.0) + float(lpeak <= 0.0)
+
+    # Helmbold's formula for the lift slope of a straight wing
+    Ar = 20.0
+    Clalpha = 2.0*np.pi*Ar/(2.0 + np.sqrt(Ar**2 + 4.0))
+    Cl = computeRodden([0.0])
+
+    return abs(Cl[0].real - Clalpha)/Clalpha
+
+def checkAccuracy(verbose=True):
+    '''
+    Run the accuracy checks.
+
+    Output:
+    errors:  a dictionary of the errors for each check
+    passed:  True if all the errors are within the tolerances
+    '''
+
+    tols = {'blair': BLAIR_TOL, 'regression': REGRESSION_TOL,
+            'helmbold': HELMBOLD_TOL, 'gust': GUST_TOL,
+            'gust_lift': GUST_LIFT_TOL}
+
+    errors = {}
+    passed = True
+    for name in ['blair', 'regression', 'helmbold', 'gust', 'gust_lift']:
+        errors[name] = float(computeErrors(name))
+        ok = errors[name] <= tols[name]
+        passed = passed and ok
+        if verbose:
+            print('%-10s rel. error %10.3e  tol %10.3e  %s'%(
+                name, errors[name], tols[name], 'ok' if ok else 'FAILED'))
+
+    return errors, passed
@@ -0,0 +1,57 @@
+from __future__ import print_function
+
+'''
+Measure the time required to import dlm4py.DLM in a fresh
+interpreter and check that the structural and parallel packages are
+not loaded by the import. Aerodynamic-only uses of the DLM class
+should not pay for TACS, FUNtoFEM, MPI or scipy.linalg.
+
+Usage: python bench_import.py [nrepeat]
+'''
+
+import sys
+import subprocess
+
+# The modules that should only be imported when they are used
+_DEFERRED = ['tacs', 'funtofem', 'mpi4py', 'scipy.linalg', 'scipy.sparse',
+             'multiprocessing', 'concurrent.futures']
+
+_SCRIPT = '''
+import sys, time
+t0 = time.time()
+import dlm4py.DLM
+t = time.time() - t0
+loaded = [name for name in %r if name in sys.modules]
+print(t)
+print(' '.join(loaded))
+'''%(_DEFERRED)
+
+def timeImport(module='numpy'):
+    '''Time the import of a module in a fresh interpreter'''
+
+    script = 'import time\nt0 = time.time()\nimport %s\nprint(time.time() - t0)'
+    out = subprocess.check_output([sys.executable, '-c', script%(module)])
+
+    return float(out.decode().split()[-1])
+
+if __name__ == '__main__':
+    nrepeat = 5
+    if len(sys.argv) > 1:
+        nrepeat = int(sys.argv[1])
+
+    times = []
+    for i in range(nrepeat):
+        out = subprocess.check_output([sys.executable, '-c', _SCRIPT])
+        lines = out.decode().split('\n')
+        times.append(float(lines[-3]))
+        loaded = lines[-2].split()
+
+    # numpy is always required, so report it separately
+    tnumpy = min([timeImport('numpy') for i in range(nrepeat)])
+
+    print('import dlm4py.DLM:  %10.4f s (best of %d)'%(min(times), nrepeat))
+    print('import numpy:       %10.4f s'%(tnumpy))
+    if len(loaded) > 0:
+        print('Deferred modules loaded at import: %s'%(', '.join(loaded)))
+    else:
+        print('No deferred modules loaded at import')
@@ -0,0 +1,152 @@
+from __future__ import print_function
+
+'''
+Micro-benchmark for the per-panel operations in DLM.py. Each operation
+is compared against the element-by-element Python loop that it
+replaced on a mesh with 10000 panels.
+
+Usage: python bench_panel_loops.py [n] [m]
+'''
+
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+from dlm4py.DLM import DLM
+import dlm
+
+def timeit(func, nrepeat=3):
+    '''Return the best time out of nrepeat calls to func'''
+    best = None
+    for i in range(nrepeat):
+        t0 = time.time()
+        func()
+        t = time.time() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+def loopDownwash(solver, U, omega):
+    w = np.zeros(solver.npanels, dtype=complex)
+    for i in range(solver.npanels):
+        w[i] = -1.0 - 1j*(omega/U)*solver.Xr[i, 0]
+    return w
+
+def loopRigidDownwash(solver, U, omega, x, xcm, W0):
+    w = np.zeros(solver.npanels, dtype=complex)
+    zdot = x[1] - W0*x[3]
+    for i in range(solver.npanels):
+        xbar = xcm - solver.Xr[i, 0]
+        w[i] = -zdot - x[2]*xbar - (U + x[0])*x[3]
+        w[i] += W0*(-1.0 - 1j*(omega/U)*solver.Xr[i, 0])
+    return w
+
+def loopModalForces(solver, qinf, Cp, modes):
+    nvecs = modes.shape[1]
+    F = np.zeros((nvecs, nvecs), dtype=complex)
+    forces = np.zeros((solver.nnodes, 3), dtype=complex)
+    for i in range(nvecs):
+        forces[:,:] = 0.0
+        dlm.addcpforces(qinf, Cp[:,i], solver.X.T, solver.conn.T, forces.T)
+        F[:,i] += np.dot(modes.T, forces.flatten())
+    for i in range(nvecs):
+        F[i, i] += 1.0
+    return F
+
+def vecModalForces(solver, qinf, Cp, modes):
+    nvecs = modes.shape[1]
+    F = qinf*np.dot(solver.computeModalForceMat(modes), Cp)
+    F[np.diag_indices(nvecs)] += 1.0
+    return F
+
+def loopWrite(solver, Cp, filename):
+    fp = open(filename, 'w')
+    for j in range(3):
+        for i in range(solver.nnodes):
+            fp.write('%e\n'%(solver.X[i, j]))
+    for i in range(solver.npanels):
+        fp.write('%e\n'%(Cp[i].real))
+    for i in range(solver.npanels):
+        fp.write('%e\n'%(Cp[i].imag))
+    for i in range(solver.npanels):
+        fp.write('%d %d %d %d\n'%(
+                solver.conn[i,0]+1, solver.conn[i,1]+1,
+                solver.conn[i,2]+1, solver.conn[i,3]+1))
+    fp.close()
+    return
+
+def vecWrite(solver, Cp, filename):
+    fp = open(filename, 'w')
+    vals = solver.X.T.flatten().tolist()
+    fp.write(('%e\n'*len(vals))%tuple(vals))
+    vals = np.hstack((Cp.real, Cp.imag)).tolist()
+    fp.write(('%e\n'*len(vals))%tuple(vals))
+    vals = (solver.conn+1).flatten().tolist()
+    fp.write(('%d %d %d %d\n'*solver.npanels)%tuple(vals))
+    fp.close()
+    return
+
+if __name__ == '__main__':
+    n = 200
+    m = 50
+    if len(sys.argv) > 2:
+        n = int(sys.argv[1])
+        m = int(sys.argv[2])
+
+    solver = DLM(is_symmetric=1)
+    solver.addMeshSegment(n, m, 10.0, 1.0)
+    print('npanels = %d, nnodes = %d'%(solver.npanels, solver.nnodes))
+
+    np.random.seed(0)
+    U = 100.0
+    omega = 10.0
+    qinf = 0.5*1.225*U**2
+    x = np.array([0.1, 0.2, 0.3, 0.01, 0.0, 0.0])
+    xcm = 0.25
+    W0 = 0.5
+    nvecs = 10
+    modes = np.random.uniform(size=(3*solver.nnodes, nvecs))
+    Cp = (np.random.uniform(size=(solver.npanels, nvecs)) +
+          1j*np.random.uniform(size=(solver.npanels, nvecs)))
+
+    print('%-20s %12s %12s %10s %12s'%(
+        'Operation', 'Loop (s)', 'Vector (s)', 'Speedup', 'Max diff'))
+
+    def report(name, floop, fvec, diff):
+        tl = timeit(floop)
+        tv = timeit(fvec)
+        print('%-20s %12.4e %12.4e %10.1f %12.4e'%(
+            name, tl, tv, tl/tv, diff))
+
+    report('downwash',
+           lambda: loopDownwash(solver, U, omega),
+           lambda: -1.0 - 1j*(omega/U)*solver.Xr[:,0],
+           np.max(np.absolute(loopDownwash(solver, U, omega) -
+                          (-1.0 - 1j*(omega/U)*solver.Xr[:,0]))))
+
+    report('rigid downwash',
+           lambda: loopRigidDownwash(solver, U, omega, x, xcm, W0),
+           lambda: solver.computeRigidDownwash(U, 1.0, omega, x, xcm, W0),
+           np.max(np.absolute(
+               loopRigidDownwash(solver, U, omega, x, xcm, W0) -
+               solver.computeRigidDownwash(U, 1.0, omega, x, xcm, W0))))
+
+    report('modal forces',
+           lambda: loopModalForces(solver, qinf, Cp, modes),
+           lambda: vecModalForces(solver, qinf, Cp, modes),
+           np.max(np.absolute(loopModalForces(solver, qinf, Cp, modes) -
+                          vecModalForces(solver, qinf, Cp, modes))))
+
+    tmpdir = tempfile.mkdtemp()
+    f1 = os.path.join(tmpdir, 'loop.dat')
+    f2 = os.path.join(tmpdir, 'vec.dat')
+    loopWrite(solver, Cp[:,0], f1)
+    vecWrite(solver, Cp[:,0], f2)
+    report('write file',
+           lambda: loopWrite(solver, Cp[:,0], f1),
+           lambda: vecWrite(solver, Cp[:,0], f2),
+           float(open(f1).read() != open(f2).read()))
+    os.remove(f1)
+    os.remove(f2)
+    os.rmdir(tmpdir)
@@ -0,0 +1,173 @@
+from __future__ import print_function
+
+'''
+Benchmarks for the hot paths of the DLM code. The classes follow the
+airspeed velocity (asv) conventions: setup() is called before the
+timed methods named time_*, params/param_names define the
+parameterized cases and the track_* methods return a value that is
+recorded instead of timed. The suite can be run with asv or offline
+with run_benchmarks.py.
+'''
+
+import os
+import tempfile
+import numpy as np
+import dlm
+from dlm4py.DLM import DLM
+from .accuracy import computeBlair, computeRodden, computeErrors
+
+def createWing(nspan, nchord, is_symmetric=1):
+    '''Create a rectangular wing with nspan x nchord panels'''
+
+    solver = DLM(is_symmetric=is_symmetric)
+    solver.addMeshSegment(nspan, nchord, 5.0, 1.0)
+
+    return solver
+
+def setModes(solver, nvecs):
+    '''
+    Set random modes, and the corresponding normal wash, as the
+    reduced basis of the solver
+    '''
+
+    np.random.seed(0)
+    solver.Kr = np.diag(np.linspace(1.0, 10.0, nvecs)**2)
+    solver.omega = np.linspace(1.0, 10.0, nvecs)
+    solver.Qm_modes = 1e-2*np.random.uniform(size=(3*solver.nnodes, nvecs))
+    solver.Qm_vwash = np.zeros((solver.npanels, nvecs))
+    solver.Qm_dwash = np.zeros((solver.npanels, nvecs))
+    for k in range(nvecs):
+        mode = solver.Qm_modes[:,k].reshape(-1, 3)
+        solver.Qm_vwash[:,k], solver.Qm_dwash[:,k] = solver.getModeBCs(mode)
+
+    return
+
+class KernelIntegrals:
+    '''Throughput of the approximate kernel integrals'''
+
+    def setup(self):
+        self.u1 = np.linspace(0.0, 10.0, 100)
+        self.k1 = np.linspace(0.0, 5.0, 100)
+        return
+
+    def time_approxKernelIntegrals(self):
+        for u1 in self.u1:
+            for k1 in self.k1:
+                dlm.approxkernelintegrals(u1, k1)
+        return
+
+class InfluenceMatrix:
+    '''Scaling of the AIC evaluation with the number of panels'''
+
+    params = ([(10, 5), (20, 10), (40, 10), (40, 20)], [0, 1])
+    param_names = ['mesh', 'is_symmetric']
+
+    def setup(self, mesh, is_symmetric):
+        self.solver = createWing(mesh[0], mesh[1], is_symmetric)
+        return
+
+    def time_computeInfluenceMatrix(self, mesh, is_symmetric):
+        self.solver.computeInfluenceMatrix(1.0, 0.5, 0.5)
+        return
+
+class Solve:
+    '''The frequency-domain solution for a pitching wing'''
+
+    params = [(20, 10), (40, 20)]
+    param_names = ['mesh']
+
+    def setup(self, mesh):
+        self.solver = createWing(mesh[0], mesh[1])
+        return
+
+    def time_solve(self, mesh):
+        self.solver.solve(1.0, omega=0.5, Mach=0.5)
+        return
+
+class FlutterMat:
+    '''The reduced flutter matrix with different numbers of modes'''
+
+    params = [4, 8, 16, 32]
+    param_names = ['nvecs']
+
+    def setup(self, nvecs):
+        self.solver = createWing(20, 10)
+        setModes(self.solver, nvecs)
+        return
+
+    def time_computeFlutterMat(self, nvecs):
+        s = self.solver
+        s.computeFlutterMat(10.0, -0.1 + 2.0j, 50.0, 0.5, nvecs,
+                            s.Kr, s.Qm_vwash, s.Qm_dwash, s.Qm_modes)
+        return
+
+class ModeTransfer:
+    '''The Fortran force integration and mode boundary conditions'''
+
+    def setup(self):
+        self.solver = createWing(200, 50)
+        setModes(self.solver, 1)
+        self.mode = self.solver.Qm_modes[:,0].reshape(-1, 3)
+        self.Cp = (np.random.uniform(size=self.solver.npanels) +
+                   1j*np.random.uniform(size=self.solver.npanels))
+        return
+
+    def time_addcpforces(self):
+        self.solver.addAeroForces(50.0, self.Cp)
+        return
+
+    def time_getmodebcs(self):
+        self.solver.getModeBCs(self.mode)
+        return
+
+class Output:
+    '''The output of a solution on a 10000 panel mesh'''
+
+    def setup(self):
+        self.solver = createWing(200, 50)
+        self.Cp = (np.random.uniform(size=self.solver.npanels) +
+                   1j*np.random.uniform(size=self.solver.npanels))
+        self.tmpdir = tempfile.mkdtemp()
+        return
+
+    def teardown(self):
+        for name in os.listdir(self.tmpdir):
+            os.remove(os.path.join(self.tmpdir, name))
+        os.rmdir(self.tmpdir)
+        return
+
+    def time_writeToFile(self):
+        self.solver.writeToFile(self.Cp,
+                                os.path.join(self.tmpdir, 'solution.dat'))
+        return
+
+    def time_writeToVTK(self):
+        self.solver.writeToVTK(self.Cp,
+                               os.path.join(self.tmpdir, 'solution.vtu'))
+        return
+
+class Accuracy:
+    '''
+    The errors in the accuracy test cases. These are tracked
+    so that a change in the results is visible next to the timings.
+    '''
+
+    def track_blair_error(self):
+        return float(computeErrors('blair'))
+
+    def track_regression_error(self):
+        return float(computeErrors('regression'))
+
+    def track_gust_error(self):
+        return float(computeErrors('gust'))
+
+    def track_gust_lift_error(self):
+        return float(computeErrors('gust_lift'))
+
+    def time_blair(self):
+        computeBlair()
+        return
+
+    def time_rodden(self):
+        computeRodden()
+        return
@@ -0,0 +1,107 @@
+from __future__ import print_function
+
+'''
+Run the benchmarks in benchmarks.py without asv. Each timed method is
+run once to warm up and then repeated, and the best time is reported.
+The accuracy checks are always run, and the script exits with a
+non-zero status if any of them fail.
+
+Usage: python run_benchmarks.py [--repeat n] [--filter pattern]
+                                [--output results.json]
+'''
+
+import os
+import re
+import sys
+import json
+import time
+import inspect
+import argparse
+import itertools
+
+# Import the suite as a package, as asv does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import benchmarks
+from benchmarks.accuracy import checkAccuracy
+
+def getCases(cls):
+    '''Get the list of parameter tuples for a benchmark class'''
+
+    params = getattr(cls, 'params', None)
+    if params is None:
+        return [()]
+    if not isinstance(params, tuple):
+        params = (params,)
+
+    return list(itertools.product(*params))
+
+def runBenchmark(cls, name, args, repeat):
+    '''
+    Set up a benchmark instance and run a single method for one set
+    of parameters. Returns the best time, or the tracked value for
+    track_* methods.
+    '''
+
+    obj = cls()
+    if hasattr(obj, 'setup'):
+        obj.setup(*args)
+
+    try:
+        func = getattr(obj, name)
+        if name.startswith('track_'):
+            return func(*args)
+
+        # Warm up and then time the method
+        func(*args)
+        best = None
+        for i in range(repeat):
+            t0 = time.time()
+            func(*args)
+            t = time.time() - t0
+            if best is None or t < best:
+                best = t
+    finally:
+        if hasattr(obj, 'teardown'):
+            obj.teardown(*args)
+
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--filter', type=str, default=None)
+    parser.add_argument('--output', type=str, default=None)
+    args = parser.parse_args()
+
+    results = {}
+    print('%-56s %14s'%('Benchmark', 'Time (s)/Value'))
+    for cname, cls in inspect.getmembers(benchmarks, inspect.isclass):
+        if cls.__module__ != benchmarks.__name__:
+            continue
+
+        names = [name for name in sorted(dir(cls))
+                 if name.startswith('time_') or name.startswith('track_')]
+        for name in names:
+            for case in getCases(cls):
+                label = '%s.%s'%(cname, name)
+                if len(case) > 0:
+                    label += '(%s)'%(', '.join([str(c) for c in case]))
+                if args.filter is not None and not re.search(args.filter,
+                                                            label):
+                    continue
+
+                value = runBenchmark(cls, name, case, args.repeat)
+                results[label] = value
+                print('%-56s %14.4e'%(label, value))
+
+    # Always check the accuracy
+    print()
+    errors, passed = checkAccuracy()
+
+    if args.output is not None:
+        with open(args.output, 'w') as fp:
+            json.dump({'results': results,
+                       'errors': errors, 'passed': passed}, fp, indent=2)
+
+    if not passed:
+        sys.exit(1)
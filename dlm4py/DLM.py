@@ -5,11 +5,45 @@ This is the python-level interface for the dlm code.
 '''
 
 import numpy as np
+import os
 import sys
-from tacs import TACS
-from funtofem import FUNtoFEM
-from mpi4py import MPI
+import time
+import json
+import functools
+import threading
 import dlm
+from .output import writeVTU, writePVD, writeNPZ, getSolutionArrays
+from .results import SweepResults
+
+# The arrays written by DLM.save
+_SAVED_ARRAYS = ['Xi', 'Xo', 'Xr', 'dXav', 'X', 'conn',
+                 'Kr', 'omega', 'Qm_modes', 'Qm_vwash', 'Qm_dwash']
+
+def _profiled(func):
+    '''
+    Accumulate the wall time and the number of calls of a DLM method
+    when profiling is enabled. The times of nested calls are included
+    in the time of the calling method. The update is guarded by the
+    profile lock since the methods may run in threads.
+    '''
+
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not self.profile:
+            return func(self, *args, **kwargs)
+
+        t0 = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            dt = time.perf_counter() - t0
+            with self.profile_lock:
+                self.timers[name] = self.timers.get(name, 0.0) + dt
+                self.calls[name] = self.calls.get(name, 0) + 1
+
+    return wrapper
 
 class JDVec:
     def __init__(self, xr, xc=None):
@@ -110,15 +144,19 @@ class JDVec:
         return
 
 class GMRES:
-    def __init__(self, mat, pc, msub):
+    def __init__(self, mat, pc, msub, rtol=1e-2):
         '''
-        Initialize the GMRES object for the Jacobi--Davidson method
+        Initialize the GMRES object for the Jacobi--Davidson method.
+        The mat and pc objects must implement mult(x, y) and
+        apply(x, y), respectively, and mat must implement createVec()
+        to allocate the subspace vectors.
         '''
 
         # Copy over the problem definitions
         self.mat = mat
         self.pc = pc
         self.msub = msub
+        self.rtol = rtol
 
         # Allocate the Hessenberg - this allocates a full matrix
         self.H = np.zeros((self.msub+1, self.msub), dtype=np.complex)
@@ -133,22 +171,36 @@ class GMRES:
         # Allocate the subspaces
         self.W = []
         self.Z = []
+        for i in range(self.msub+1):
+            self.W.append(self.mat.createVec())
+        for i in range(self.msub):
+            self.Z.append(self.mat.createVec())
 
         return
 
     def solve(self, b, x):
         '''
-        Solve the linear system
+        Solve the linear system using right-preconditioned GMRES. The
+        iteration stops once the residual norm is reduced by the
+        factor rtol, or after msub iterations.
         '''
 
         # Perform the initialization: copy over b to W[0] and
         # normalize the result - store the entry in res[0]
+        self.res[:] = 0.0
         self.W[0].copy(b)
-        self.res[0] = np.sqrt(self.W[0].dot(self.W[0]))
+        self.res[0] = np.sqrt(self.W[0].dot(self.W[0]).real)
+        x.zero()
+        if self.res[0] == 0.0:
+            return 0
         self.W[0].scale(1.0/self.res[0])
+        rnorm0 = abs(self.res[0])
 
         # Perform the matrix-vector products
+        niters = 0
         for i in range(self.msub):
+            niters = i+1
+
             # Apply the preconditioner
             self.pc.apply(self.W[i], self.Z[i])
 
@@ -162,48 +214,113 @@ class GMRES:
 
             # Compute the norm of the orthogonalized vector and
             # normalize it
-            self.H[i+1,i] = np.sqrt(self.W[i+1].dot(self.W[i+1]))
-            self.W[i+1].scale(1.0/H[i+1,i])
+            self.H[i+1,i] = np.sqrt(self.W[i+1].dot(self.W[i+1]).real)
+            if self.H[i+1,i] != 0.0:
+                self.W[i+1].scale(1.0/self.H[i+1,i])
 
             # Apply the Givens rotations
             for j in range(i):
                 h1 = self.H[j, i]
                 h2 = self.H[j+1, i]
-                self.H[j, i] = h1*self.Qcos[j] + h2*self.Qsin[j]
+                self.H[j, i] = h1*self.Qcos[j].conjugate() + h2*self.Qsin[j]
                 self.H[j+1, i] = -h1*self.Qsin[j] + h2*self.Qcos[j]
 
             # Compute the contribution to the Givens rotation
-            # for the current entry
+            # for the current entry. H[i+1,i] is real so that the
+            # sine is real and the cosine is complex (Saad pg. 193)
             h1 = self.H[i, i]
             h2 = self.H[i+1, i]
-
-            # Modification for complex from Saad pg. 193
-            sq = np.sqrt(abs(h1)**2 + h2*h2)
+            sq = np.sqrt(abs(h1)**2 + abs(h2)**2)
             self.Qsin[i] = h2/sq
             self.Qcos[i] = h1/sq
 
             # Apply the newest Givens rotation to the last entry
-            self.H[i, i] = h1*self.Qcos[i] + h2*self.Qsin[i]
-            self.H[i+1, i] = -h1*self.Qsin[i] + h2*self.Qcos[i]
+            self.H[i, i] = h1*self.Qcos[i].conjugate() + h2*self.Qsin[i]
+            self.H[i+1, i] = 0.0
 
             # Update the residual
-            h1 = res[i]
-            res[i] = h1*self.Qcos[i]
-            res[i+1] = -h1*self.Qsin[i]
+            h1 = self.res[i]
+            self.res[i] = h1*self.Qcos[i].conjugate()
+            self.res[i+1] = -h1*self.Qsin[i]
+
+            if abs(self.res[i+1]) < self.rtol*rnorm0:
+                break
 
         # Compute the linear combination
         for i in range(niters-1, -1, -1):
             for j in range(i+1, niters):
-                res[i] -= self.H[i, j]*res[j]
-            res[i] /= self.H[i, i]
+                self.res[i] -= self.H[i, j]*self.res[j]
+            self.res[i] /= self.H[i, i]
 
         # Form the linear combination
         x.zero()
         for i in range(niters):
-            x.axpy(res[i], self.Z[i])
+            x.axpy(self.res[i], self.Z[i])
 
         return niters
 
+class JDCorrection:
+    def __init__(self, solver, U, qinf, Mach):
+        '''
+        The operator and preconditioner for the Jacobi--Davidson
+        correction equation of the nonlinear flutter problem:
+
+        (I - w*u^{H}/(u^{H}*w))*T(p)*(I - u*u^{H})*t = -r
+
+        where w = T'(p)*u and t is orthogonal to u. The
+        preconditioner K_s = K - sigma*M is projected in the same way,
+        so that the GMRES iterates remain orthogonal to u.
+        '''
+
+        self.solver = solver
+        self.U = U
+        self.qinf = qinf
+        self.Mach = Mach
+
+        # Temporary vectors
+        self.w = self.createVec()
+        self.ut = self.createVec()
+
+        return
+
+    def createVec(self):
+        '''Create a vector for the GMRES subspace'''
+        return self.solver.createJDVec()
+
+    def setVectors(self, p, u):
+        '''
+        Set the eigenvalue estimate p and the normalized eigenvector
+        estimate u. The factored preconditioner must already be set.
+        '''
+
+        self.p = p
+        self.u = u
+
+        # Compute w = T'(p)*u and ut = K_s^{-1}*w
+        self.solver.multFlutterMat(self.U, p, self.qinf, self.Mach,
+                                   u, self.w, deriv=True)
+        self.uw = u.dot(self.w)
+        self.solver.applyShiftInvert(self.w, self.ut)
+        self.uut = u.dot(self.ut)
+
+        return
+
+    def mult(self, x, y):
+        '''Compute y = (I - w*u^{H}/(u^{H}*w))*T(p)*x'''
+
+        self.solver.multFlutterMat(self.U, self.p, self.qinf, self.Mach, x, y)
+        y.axpy(-self.u.dot(y)/self.uw, self.w)
+
+        return
+
+    def apply(self, x, y):
+        '''Compute y = (I - ut*u^{H}/(u^{H}*ut))*K_s^{-1}*x'''
+
+        self.solver.applyShiftInvert(x, y)
+        y.axpy(-self.u.dot(y)/self.uut, self.ut)
+
+        return
+
 class DLM:
     def __init__(self, is_symmetric=1, epstol=1e-12):
         '''
@@ -216,8 +333,10 @@ class DLM:
         self.use_steady_kernel = True
         self.epstol = epstol
         
-        # The influence coefficient matrix
+        # The influence coefficient matrix and its derivative w.r.t.
+        # the frequency
         self.Dtrans = None
+        self.dDtrans = None
 
         # The total number of panels and nodes
         self.npanels = 0
@@ -237,6 +356,183 @@ class DLM:
         # Set placeholder objects for flutter objects
         self.temp = None
         self.Vm = None
+        self.MVm = None
+        self.Qm = None
+
+        # The shift-invert solves used to build the last subspace and
+        # the last subspace built without a warm start
+        self.nsubspace_solves = 0
+        self.nsubspace_cold_solves = None
+
+        # The number of modes that converged in the last subspace and
+        # whether all the requested modes converged
+        self.subspace_nconv = 0
+        self.subspace_converged = False
+
+        # The factored full-order AIC used by the Jacobi--Davidson
+        # method and the shift of the factored preconditioner
+        self.jd_aic = None
+        self.jd_sigma = None
+
+        # Cached reduced aerodynamic matrices for the current
+        # subspace. The oldest entries are discarded once the cached
+        # arrays exceed aero_cache_bytes.
+        self.aero_cache = {}
+        self.aero_cache_bytes = 2**28
+        self.aero_cache_lock = threading.Lock()
+
+        # The number of flutter matrix evaluations
+        self.nflutter_evals = 0
+
+        # The optional profiling data: the wall time and number of
+        # calls of the main methods and the event counters
+        self.profile = False
+        self.profile_memory = False
+        self.timers = {}
+        self.calls = {}
+        self.counters = {}
+        self.worker_peak_memory = None
+        self.profile_lock = threading.Lock()
+
+        # Print the iteration history, and call the optional function
+        # iteration_callback(method, info) at each iteration
+        self.verbose = True
+        self.iteration_callback = None
+
+        return
+
+    def enableProfiling(self, memory=False):
+        '''
+        Enable the accumulation of the wall time spent in the main
+        methods. If memory is True, the peak memory of the Python and
+        numpy allocations is also traced with tracemalloc. This slows
+        down the allocations.
+        '''
+
+        self.profile = True
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.profile_memory = True
+
+        return
+
+    def disableProfiling(self):
+        '''Stop the profiling. The data is retained until reset.'''
+
+        if self.profile_memory:
+            import tracemalloc
+            tracemalloc.stop()
+        self.profile = False
+        self.profile_memory = False
+
+        return
+
+    def resetProfile(self):
+        '''Reset the timers, counters and the peak memory'''
+
+        self.timers = {}
+        self.calls = {}
+        self.counters = {}
+        self.nflutter_evals = 0
+        self.worker_peak_memory = None
+        if self.profile_memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+
+        return
+
+    def getProfile(self):
+        '''
+        Get the profiling data as a dictionary with the entries:
+
+        'time':        the wall time in each method
+        'calls':       the number of calls to each method
+        'counters':    the number of AIC assemblies, AIC factorizations
+                       and solves, aerodynamic cache hits/misses and
+                       flutter matrix evaluations
+        'peak_memory': the peak traced memory in bytes (None if the
+                       memory is not traced)
+
+        The counters are always accumulated, the times only when
+        profiling is enabled. The data of the process pool workers is
+        merged by mergeWorkerProfile: the times and counts are summed
+        over the workers, and the peak memory is the largest peak of
+        this process and of any worker.
+        '''
+
+        counters = dict(self.counters)
+        counters['flutter_evals'] = self.nflutter_evals
+
+        peak = None
+        if self.profile_memory:
+            import tracemalloc
+            peak = tracemalloc.get_traced_memory()[1]
+            if self.worker_peak_memory is not None:
+                peak = max(peak, self.worker_peak_memory)
+
+        return {'time': dict(self.timers), 'calls': dict(self.calls),
+                'counters': counters, 'peak_memory': peak}
+
+    def addCount(self, *names):
+        '''Increment the named counters. This is safe to call from threads.'''
+
+        with self.profile_lock:
+            for name in names:
+                self.counters[name] = self.counters.get(name, 0) + 1
+
+        return
+
+    def addFlutterEvals(self, n):
+        '''Add n to the number of flutter matrix evaluations'''
+
+        with self.profile_lock:
+            self.nflutter_evals += n
+
+        return
+
+    def mergeWorkerProfile(self, profile, log):
+        '''
+        Merge the profiling data returned by a process pool worker
+        and pass its iteration data to the iteration callback.
+
+        Input:
+        profile:  the worker data from getProfile
+        log:      the list of (method, info) logged by the worker
+        '''
+
+        with self.profile_lock:
+            for name in profile['time']:
+                self.timers[name] = (self.timers.get(name, 0.0) +
+                                     profile['time'][name])
+            for name in profile['calls']:
+                self.calls[name] = (self.calls.get(name, 0) +
+                                    profile['calls'][name])
+            for name in profile['counters']:
+                if name == 'flutter_evals':
+                    self.nflutter_evals += profile['counters'][name]
+                else:
+                    self.counters[name] = (self.counters.get(name, 0) +
+                                           profile['counters'][name])
+            if profile['peak_memory'] is not None:
+                self.worker_peak_memory = max(self.worker_peak_memory or 0,
+                                              profile['peak_memory'])
+
+        for method, info in log:
+            self.logIteration(method, **info)
+
+        return
+
+    def logIteration(self, method, **info):
+        '''
+        Pass the iteration data to the iteration callback, if one is
+        set. The callback is called as iteration_callback(method, info)
+        where info is a dictionary.
+        '''
+
+        if self.iteration_callback is not None:
+            self.iteration_callback(method, info)
 
         return
 
@@ -301,23 +597,27 @@ class DLM:
         self.npanels = self.Xi.shape[0]
         self.nnodes = self.X.shape[0]
 
+        # Any cached aerodynamic matrices are now out of date
+        self.aero_cache = {}
+
         return
 
+    @_profiled
     def computeFlutterMat(self, U, p, qinf, Mach,
                           nvecs, Kr, vwash, dwash, modes):
         '''
         Compute the (reduced) flutter matrix given as follows:
 
-        Fr(p) = p**2*Ir + Kr - qinf*modes^{T}*D^{-1}*wash  
+        Fr(p) = p**2*Ir + Kr + qinf*Gm*D^{-T}*wash
         '''
 
+        self.addFlutterEvals(1)
+
         # Compute the contribution from the reduced structural problem
-        F = np.zeros((nvecs, nvecs), dtype=np.complex)
-        F[:,:] = Kr[:,:]
+        F = np.array(Kr, dtype=np.complex)
 
         # Add the term I*p**2 from the M-orthonormal subspace
-        for i in range(nvecs):
-            F[i, i] += p**2
+        F[np.diag_indices(nvecs)] += p**2
 
         # Compute the influence coefficient matrix
         self.computeInfluenceMatrix(U, p.imag, Mach)
@@ -328,17 +628,12 @@ class DLM:
 
         # Solve for the normal wash due to the motion of the wing
         # through the flutter mode
+        self.addCount('aic_factorizations', 'aic_solves')
         Cp = np.linalg.solve(self.Dtrans.T, wash)
 
-        # Compute the forces due to the flutter motion
-        forces = np.zeros((self.nnodes, 3), dtype=np.complex)
+        # Add the generalized forces due to the flutter motion
+        F += qinf*np.dot(self.computeModalForceMat(modes), Cp)
 
-        # Add the forces to the vector
-        for i in range(nvecs):
-            forces[:,:] = 0.j
-            dlm.addcpforces(qinf, Cp[:,i], self.X.T, self.conn.T, forces.T)
-            F[:,i] += np.dot(modes.T, forces.flatten())
-            
         return F
 
     def computeFlutterDet(self, U, p, qinf, Mach,
@@ -354,9 +649,177 @@ class DLM:
 
         F = self.computeFlutterMat(U, p, qinf, Mach, nvecs, 
                                    Kr, vwash, dwash, modes)
-        return np.linalg.det(F)/(omega**(2*nvecs))
+        sign, logdet = np.linalg.slogdet(F)
+        return sign*np.exp(logdet - 2*nvecs*np.log(omega))
+
+    @_profiled
+    def computeFlutterMats(self, U, ps, qinf, Mach,
+                           nvecs, Kr, vwash, dwash, modes,
+                           output='mat', analytic=False, omega_tol=1e-10):
+        '''
+        Compute the flutter matrix at a series of points ps. The AIC
+        only depends on the frequency Im(p), so the points are grouped
+        by frequency and the AIC is computed and factored once per
+        group. Within a group the flutter matrix is quadratic in p:
+
+        Fr(p) = p**2*Ir + Kr + qinf*Gm*(p*Cv + Cd)
+
+        where D^{T}*Cv = vwash/U and D^{T}*Cd = dwash.
+
+        With analytic=True, the flutter matrix from
+        computeAnalyticFlutterMat is computed instead. The AIC and its
+        derivative are still computed once per group, but the
+        continued AIC depends on Re(p) and is factored at each point.
+
+        Input:
+        ps:        the array of points in the p-plane
+        output:    'mat', 'det' or 'slogdet'
+        analytic:  use the analytic continuation of the AIC
+        omega_tol: the relative tolerance for grouping frequencies
+
+        Output:
+        F:            the flutter matrices, shape (len(ps), nvecs, nvecs)
+        or det:       det Fr(p) for each point
+        or sign, logdet: the sign and log of |det Fr(p)| for each
+                      point. Unlike the determinant, these do not
+                      overflow for large frequencies or many modes.
+        '''
+
+        ps = np.atleast_1d(np.asarray(ps, dtype=np.complex))
+        F = np.zeros((len(ps), nvecs, nvecs), dtype=np.complex)
+
+        # Compute the generalized forces
+        Gm = qinf*self.computeModalForceMat(modes)
+
+        # Group the points by frequency
+        order = np.argsort(ps.imag)
+        groups = []
+        for i in order:
+            if (len(groups) > 0 and
+                abs(ps[i].imag - ps[groups[-1][0]].imag) <=
+                omega_tol*max(1.0, abs(ps[i].imag))):
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+
+        for group in groups:
+            self.addFlutterEvals(len(group))
+            omega = ps[group[0]].imag
+
+            if analytic:
+                # Solve for the Cp at each point with the continued AIC
+                self.computeInfluenceMatrix(U, omega, Mach, deriv=True)
+                for i in group:
+                    D = self.Dtrans.T - 1j*ps[i].real*self.dDtrans.T
+                    self.addCount('aic_factorizations', 'aic_solves')
+                    Cp = np.linalg.solve(D, ps[i]*vwash/U + dwash)
+                    F[i] = np.dot(Gm, Cp)
+            else:
+                # Factor the AIC once and solve for both wash terms
+                self.computeInfluenceMatrix(U, omega, Mach)
+                self.addCount('aic_factorizations', 'aic_solves')
+                Cp = np.linalg.solve(self.Dtrans.T,
+                                     np.hstack((vwash/U, dwash)))
+                Av = np.dot(Gm, Cp[:,:nvecs])
+                Ad = np.dot(Gm, Cp[:,nvecs:])
+                for i in group:
+                    F[i] = ps[i]*Av + Ad
+
+        # Add the structural contributions
+        F += Kr
+        F[:,np.arange(nvecs),np.arange(nvecs)] += (ps**2)[:,np.newaxis]
+
+        if output == 'det':
+            return np.linalg.det(F)
+        elif output == 'slogdet':
+            return np.linalg.slogdet(F)
+
+        return F
     
     
+    @_profiled
+    def computeFlutterMatDeriv(self, U, p, qinf, Mach,
+                               nvecs, Kr, vwash, dwash, modes):
+        '''
+        Compute the flutter matrix and its derivative with respect to
+        p using a single factorization of the influence matrix:
+
+        Fr(p) = p**2*Ir + Kr + qinf*Gm*Cp
+        dFr/dp = 2*p*Ir + qinf*Gm*dCp/dp
+
+        where D^{T}*Cp = p*vwash/U + dwash. The influence matrix and
+        its analytic frequency derivative are computed together. The
+        AIC is extended analytically from the frequency omega = Im(p)
+        so that dD/dp = -j*dD/domega and
+
+        D^{T}*dCp/dp = vwash/U + j*dD^{T}/domega*Cp
+
+        Output:
+        F:     the flutter matrix Fr(p)
+        dFdp:  the derivative dFr/dp
+        '''
+
+        from scipy.linalg import lu_factor, lu_solve
+
+        self.addFlutterEvals(1)
+
+        # Compute the influence matrix and its derivative
+        self.computeInfluenceMatrix(U, p.imag, Mach, deriv=True)
+        self.addCount('aic_factorizations')
+        lu = lu_factor(self.Dtrans.T)
+
+        # Compute the Cp due to the wash and its derivative w.r.t. p
+        wash = p*vwash/U + dwash
+        self.addCount('aic_solves')
+        Cp = lu_solve(lu, wash)
+        self.addCount('aic_solves')
+        dCp = lu_solve(lu, vwash/U + 1j*np.dot(self.dDtrans.T, Cp))
+
+        # Compute the generalized forces
+        Gm = self.computeModalForceMat(modes)
+
+        F = np.array(Kr, dtype=np.complex) + qinf*np.dot(Gm, Cp)
+        F[np.diag_indices(nvecs)] += p**2
+        dFdp = qinf*np.dot(Gm, dCp)
+        dFdp[np.diag_indices(nvecs)] += 2.0*p
+
+        return F, dFdp
+
+    @_profiled
+    def computeAnalyticFlutterMat(self, U, p, qinf, Mach,
+                                  nvecs, Kr, vwash, dwash, modes):
+        '''
+        Compute the flutter matrix using a first-order analytic
+        continuation of the AIC off the imaginary axis:
+
+        D(p) = D(omega) - j*Re(p)*dD/domega,   omega = Im(p)
+
+        computeFlutterMat evaluates the AIC at Im(p) only, so that
+        Fr(p) is not an analytic function of p. Contour-integral
+        methods require an analytic matrix function. The continued
+        matrix agrees with Fr(p) on the imaginary axis and to second
+        order in Re(p) near it.
+        '''
+
+        self.addFlutterEvals(1)
+
+        # Compute the influence matrix and its derivative
+        self.computeInfluenceMatrix(U, p.imag, Mach, deriv=True)
+        D = self.Dtrans.T - 1j*p.real*self.dDtrans.T
+
+        # Solve for the Cp due to the wash
+        wash = p*vwash/U + dwash
+        self.addCount('aic_factorizations', 'aic_solves')
+        Cp = np.linalg.solve(D, wash)
+
+        # Compute the generalized forces
+        Gm = self.computeModalForceMat(modes)
+
+        F = np.array(Kr, dtype=np.complex) + qinf*np.dot(Gm, Cp)
+        F[np.diag_indices(nvecs)] += p**2
+
+        return F
+
     def computeRigidMat(self, U, rho, Mach, aoa, omega, cref, m, Iyy, xcm, theta_0=0.0, W0=0.0):
         '''
         Compute 'A' matrix for rigid a/c motion
@@ -494,48 +957,254 @@ class DLM:
         return dF_vec
 
     def computeElasticMotion(self, U, omega, qinf, Mach,
-                            nvecs, Kr, vwash, dwash, modes,
-                            W0,
-                            aoa=0.0, tol=1e-4, max_iters=100):
+                             nvecs, Kr, vwash, dwash, modes,
+                             W0, aoa=0.0, tol=1e-8):
         '''
-        Compute the forced motion q due to sinusoidal gust
+        Compute the forced motion q due to sinusoidal gust. The
+        coupled aeroelastic problem is linear in q, so the response is
+        found directly from
+
+        (Kr - omega**2*Ir + qinf*Qr)*q = -qinf*fr
+
+        where Qr = Gm*D^{-T}*(j*omega*vwash/U + dwash) is the reduced
+        aerodynamic matrix and fr = Gm*D^{-T}*wg is the gust
+        force. The sign of the aerodynamic terms is the same as in the
+        flutter matrix computed by computeFlutterMat. Both are formed
+        from a single multi-RHS solve with the influence coefficient
+        matrix.
+
+        Input:
+        U:      the free-stream velocity
+        omega:  the gust frequency
+        qinf:   the dynamic pressure
+        Mach:   the Mach number
+        nvecs:  the number of modes
+        Kr:     the reduced stiffness matrix
+        vwash:  the normal wash due to velocities of each mode
+        dwash:  the normal wash due to the rotation of each mode
+        modes:  the surface mode shapes
+        W0:     the gust amplitude
+        aoa:    the angle of attack
+        tol:    the relative tolerance on the residual
+
+        Output:
+        q:      the mode coefficients
         '''
+
         # Compute the influence coefficient matrix
         self.computeInfluenceMatrix(U, omega, Mach)
 
-        # Set the mode coefficients
-        q = np.zeros(nvecs, dtype=np.complex)
-        
         # Compute the boundary condition: -1/U*(dh/dt + U*dh/dx)
         # dwash = -dh/dx, vwash = -dh/dt
         mode_wash = 1j*omega*vwash/U + dwash
         
         aoa_total = 1j*omega*W0/U + aoa
 
-        for k in range(max_iters):
+        # Set the right-hand-sides: the first column is the gust wash,
+        # the remaining columns are the wash due to each mode
+        wash = np.zeros((self.npanels, nvecs+1), dtype=np.complex)
+        wash[:,0] = aoa_total
+        wash[:,1:] = mode_wash
 
-            # Compute the wash as a function of time
-            wash = aoa_total + np.dot(mode_wash, q)
-                                       
-            # Solve for the normal wash due to the motion of the wing
-            # through the flutter mode
-            Cp = np.linalg.solve(self.Dtrans.T, wash)
+        # Solve for the Cp values for all right-hand-sides at once
+        self.addCount('aic_factorizations', 'aic_solves')
+        Cp = np.linalg.solve(self.Dtrans.T, wash)
 
-            # Compute the forces due to the flutter motion
-            forces = np.zeros((self.nnodes, 3), dtype=np.complex)
+        # Compute the generalized aerodynamic forces per unit qinf
+        Ga = np.dot(self.computeModalForceMat(modes), Cp)
 
-            # Add the forces to the vector
-            dlm.addcpforces(qinf, Cp, self.X.T, self.conn.T, forces.T)
+        # Form the coupled system and solve for the mode coefficients
+        A = Kr - omega**2*np.eye(nvecs) + qinf*Ga[:,1:]
+        q = self.solveCoupledSystem(A, -qinf*Ga[:,0], tol)
 
-            # Compute the aerodynamic forces
-            Fa = np.dot(modes.T, forces.flatten())
+        return q
 
-            A = Kr - omega**2*np.eye(nvecs)
+    @_profiled
+    def computeGustAeroMats(self, U, omega, Mach, x0=None, panel=False):
+        '''
+        Compute the reduced aerodynamic matrices per unit dynamic
+        pressure for the modes stored in Qm_vwash/Qm_dwash/Qm_modes:
 
-            # Solve for the new values of q
-            q = np.linalg.solve(A, Fa)                                       
+        Qv = Gm*D^{-T}*Qm_vwash
+        Qd = Gm*D^{-T}*Qm_dwash
+        g = Gm*D^{-T}*wg
 
-        return q
+        where wg is the normal wash due to a unit gust. The AIC only
+        depends on omega/U, so the results are cached with the key
+        (omega/U, Mach, x0) and the kernel settings. The panel Cp
+        values are cached as well when they are computed. The oldest
+        entries are discarded once the cache exceeds aero_cache_bytes.
+        This function allocates its own AIC so that it can be called
+        concurrently for different frequencies.
+
+        Input:
+        U:      the free-stream velocity
+        omega:  the frequency
+        Mach:   the Mach number
+        x0:     gust reference position (None for a uniform gust)
+        panel:  also return the panel Cp values for each right-hand-side
+
+        Output:
+        Qv, Qd, g: the reduced aerodynamic matrices and gust force
+        Cp:        the Cp for the [wg, vwash, dwash] right-hand-sides
+        '''
+
+        key = (omega/U, Mach, x0, self.is_symmetric,
+               self.use_steady_kernel, self.epstol)
+        with self.aero_cache_lock:
+            entry = self.aero_cache.get(key)
+        if entry is not None and (not panel or entry[3] is not None):
+            self.addCount('aero_cache_hits')
+            if panel:
+                return entry
+            return entry[:3] + (None,)
+        self.addCount('aero_cache_misses')
+
+        # Compute the influence coefficient matrix
+        self.addCount('aic_assemblies')
+        D = np.zeros((self.npanels, self.npanels), dtype=np.complex)
+        dlm.computeinfluencematrix(D.T, omega, U, Mach,
+                                   self.Xi.T, self.Xo.T, self.Xr.T, self.dXav,
+                                   self.is_symmetric, self.use_steady_kernel,
+                                   self.epstol)
+
+        # Set the right-hand-sides: the gust wash and the wash due to
+        # the mode displacements and velocities
+        nvecs = self.Qm_vwash.shape[1]
+        wash = np.zeros((self.npanels, 2*nvecs+1), dtype=np.complex)
+        if x0 is None:
+            wash[:,0] = 1.0
+        else:
+            # Include the convective delay of the gust front
+            wash[:,0] = np.exp(-1j*(omega/U)*(self.Xr[:,0] - x0))
+        wash[:,1:nvecs+1] = self.Qm_vwash
+        wash[:,nvecs+1:] = self.Qm_dwash
+
+        # Solve for all right-hand-sides at once
+        self.addCount('aic_factorizations', 'aic_solves')
+        Cp = np.linalg.solve(D.T, wash)
+        Ga = np.dot(self.computeModalForceMat(self.Qm_modes), Cp)
+
+        mats = (Ga[:,1:nvecs+1], Ga[:,nvecs+1:], Ga[:,0])
+        if not panel:
+            Cp = None
+        self.addAeroCacheEntry(key, mats + (Cp,))
+
+        return mats + (Cp,)
+
+    def addAeroCacheEntry(self, key, entry):
+        '''
+        Add an entry to the reduced aerodynamic cache and discard the
+        oldest entries until the size of the cached arrays is within
+        aero_cache_bytes. The newest entry is always kept.
+        '''
+
+        with self.aero_cache_lock:
+            self.aero_cache.pop(key, None)
+            self.aero_cache[key] = entry
+
+            # The entries are kept in the order they were added
+            nbytes = 0
+            for k in reversed(list(self.aero_cache.keys())):
+                nbytes += sum(a.nbytes for a in self.aero_cache[k]
+                              if a is not None)
+                if nbytes > self.aero_cache_bytes and k != key:
+                    del self.aero_cache[k]
+
+        return
+
+    def getAeroThreads(self, nthreads, ntasks, max_memory=None):
+        '''
+        Get the number of threads for a pool that calls
+        computeGustAeroMats. Each thread holds its own AIC and its
+        factorization, so the number of threads is limited such that
+        these fit in max_memory bytes (None = half the available
+        physical memory). The default nthreads=None is the cpu count.
+        '''
+
+        if nthreads is None:
+            nthreads = os.cpu_count() or 1
+        if max_memory is None:
+            max_memory = _getAvailableMemory()
+            if max_memory is not None:
+                max_memory = max_memory//2
+        if max_memory is not None:
+            nbytes = 2*np.dtype(np.complex).itemsize*self.npanels**2
+            nthreads = min(nthreads, max_memory//nbytes)
+
+        return int(max(1, min(nthreads, ntasks)))
+
+    @_profiled
+    def computeGustFRF(self, U, Mach, omegas, qinf,
+                       W0=0.0, aoa=1.0, x0=None, panel=True,
+                       nthreads=None, tol=1e-8, max_memory=None):
+        '''
+        Compute the frequency response of the modal coordinates and
+        the panel Cp values due to a sinusoidal gust over the
+        frequency grid omegas. The gust wash is
+
+        wash = (aoa + j*omega*W0/U)*wg
+
+        so that the default aoa=1, W0=0 gives the response per unit
+        gust angle wg/U. The modes stored in Kr, Qm_vwash, Qm_dwash and
+        Qm_modes are used. The frequencies are evaluated in a thread
+        pool and the reduced aerodynamic matrices are cached for later
+        calls. Each thread holds its own AIC and factorization, so the
+        number of threads is limited by max_memory.
+
+        Input:
+        U:        the free-stream velocity
+        Mach:     the Mach number
+        omegas:   the array of frequencies
+        qinf:     the dynamic pressure
+        W0:       the gust amplitude
+        aoa:      the angle of attack
+        x0:       gust reference position (None for a uniform gust)
+        panel:    compute the panel Cp response as well
+        nthreads: the number of worker threads (None = cpu count)
+        tol:      the relative tolerance on the coupled residual
+        max_memory: the memory for the AICs of all the threads in
+                  bytes (None = half the available physical memory)
+
+        Output:
+        R:        complex array of shape (len(omegas), nvecs + npanels)
+                  where R[:,:nvecs] are the mode coefficients and
+                  R[:,nvecs:] are the panel Cp values (if panel=True)
+        '''
+
+        omegas = np.atleast_1d(omegas)
+        nvecs = self.Kr.shape[0]
+        ncols = nvecs
+        if panel:
+            ncols += self.npanels
+
+        # Allocate the contiguous output array
+        R = np.zeros((len(omegas), ncols), dtype=np.complex)
+
+        def evalFrequency(i):
+            omega = omegas[i]
+            Qv, Qd, g, Cp = self.computeGustAeroMats(U, omega, Mach, x0, panel)
+
+            # Form and solve the coupled system for the modes
+            aoa_total = 1j*omega*W0/U + aoa
+            A = self.Kr - omega**2*np.eye(nvecs) + qinf*(1j*omega*Qv/U + Qd)
+            q = self.solveCoupledSystem(A, -qinf*aoa_total*g, tol)
+            R[i,:nvecs] = q
+
+            if panel:
+                # Cp = Cp_g*aoa_total + (j*omega/U*Cp_v + Cp_d)*q
+                R[i,nvecs:] = (aoa_total*Cp[:,0] +
+                               np.dot(1j*omega*Cp[:,1:nvecs+1]/U +
+                                      Cp[:,nvecs+1:], q))
+            return
+
+        nthreads = self.getAeroThreads(nthreads, len(omegas), max_memory)
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=nthreads) as pool:
+            list(pool.map(evalFrequency, range(len(omegas))))
+
+        return R
 
     def computeRigidMotion(self, U, rho, qinf, Mach, omega,
                            aoa, cref, m, Iyy, xcm,
@@ -550,7 +1219,8 @@ class DLM:
         xdot = np.dot(A, x) + f
 
         for i in range(max_iters):
-            w = self.computeRigidDownwash(U, cref, omega, x, xdot, xcm)
+            w = self.computeRigidDownwash(U, cref, omega, x, xcm, W0=W0,
+                                          xdot=xdot)
             f = self.computeRigidForceVec(U, rho, Mach, omega, aoa, m, Iyy, xcm, theta_0=theta_0, W0=W0, w=w)
             x = np.linalg.solve(1j*omega*np.eye(6) - A, x0 + f)
             xdot = np.dot(A, x) + f
@@ -558,59 +1228,111 @@ class DLM:
         return x, xdot
 
     def computeFullMotion(self, U, qinf, Mach, omega, m, I, xcm,
-                                   aoa, W0, Kr, modes, nvecs,
-                                   vwash, dwash, max_iters=10):
+                          aoa, W0, Kr, modes, nvecs,
+                          vwash, dwash, tol=1e-8):
+        '''
+        Compute the forced motion of the elastic modes coupled with the
+        rigid plunge (z0) and pitch (a0) motion due to a sinusoidal
+        gust. The coupled problem is linear in x = [q, z0, a0]:
 
-        g = 9.81
-        # Set the mode coefficients
-        q = np.zeros(nvecs, dtype=np.complex)
-        
-        # Compute the boundary condition: -1/U*(dh/dt + U*dh/dx)
-        # dwash = -dh/dx, vwash = -dh/dt
-        mode_wash = 1j*omega*vwash/U + dwash
-       
-        aoa_total = 1j*omega*W0/U + aoa
+        (Kr - omega**2*Ir)*q = Fa
+        -omega**2*z0 = force/m - g
+        -omega**2*a0 = moment/I
 
-        for i in range(max_iters):
+        where the aerodynamic loads Fa = -qinf*Gm*Cp, force and moment
+        use the same sign as the flutter matrix and Cp is computed
+        from the wash
 
-            Cp = self.solve(U, aoa=aoa_total, omega=omega, Mach=Mach)
-            forces = self.addAeroForces(qinf, Cp)
-            force = np.sum(forces)
-            moment = self.computeCGMoment(qinf, Cp, xcm)
+        wash = aoa + j*omega*W0/U + j*omega*z0/U**2 + a0 + mode_wash*q
 
-            z0 = (-1.0/omega**2)*((force/m)-g)
-            a0 = (-1.0/omega**2)*(moment/I)       
+        The system is assembled from a single multi-RHS solve with the
+        influence coefficient matrix and solved directly.
+        '''
 
-            dzdt = 1j*omega*z0/U
-            dzdx = a0
+        g = 9.81
 
-            aoa_total = 1j*omega*W0/U + aoa + dzdt/U + a0 # check this
-            
-            mode_wash = 1j*omega*vwash/U + dwash + dzdt/U + dzdx
+        # Compute the influence coefficient matrix
+        self.computeInfluenceMatrix(U, omega, Mach)
 
-            # Compute the wash as a function of time
-            wash = aoa_total + np.dot(mode_wash, q)
-                                       
-            # Solve for the normal wash due to the motion of the wing
-            # through the flutter mode
-            #Cp = self.solve(U, aoa=aoa, omega=omega, Mach=Mach)
+        # Compute the boundary condition: -1/U*(dh/dt + U*dh/dx)
+        # dwash = -dh/dx, vwash = -dh/dt
+        mode_wash = 1j*omega*vwash/U + dwash
 
-            # Compute the forces due to the flutter motion
-            forces = np.zeros((self.nnodes, 3), dtype=np.complex)
+        # The gust, plunge and pitch contributions are all uniform
+        # over the panels, so they share the first right-hand-side
+        aoa_total = 1j*omega*W0/U + aoa
+        zwash = 1j*omega/U**2
 
-            # Add the forces to the vector
-            dlm.addcpforces(qinf, Cp, self.X.T, self.conn.T, forces.T)
+        wash = np.zeros((self.npanels, nvecs+1), dtype=np.complex)
+        wash[:,0] = 1.0
+        wash[:,1:] = mode_wash
 
-            # Compute the aerodynamic forces
-            Fa = np.dot(modes.T, forces.flatten())
+        # Solve for the Cp values for all right-hand-sides at once
+        self.addCount('aic_factorizations', 'aic_solves')
+        Cp = np.linalg.solve(self.Dtrans.T, wash)
 
-            A = Kr - omega**2*np.eye(nvecs)
+        # Compute the generalized forces, total force and moment per
+        # unit qinf for each right-hand-side
+        Ga = np.dot(self.computeModalForceMat(modes), Cp)
+        normals = self.computePanelNormals()
+        fz = 0.5*np.dot(np.sum(normals, axis=1), Cp)
+        xarm = np.sum(self.X[self.conn, 0] - xcm, axis=1)
+        my = 0.125*np.dot(normals[:,2]*xarm, Cp)
+
+        # Assemble the coupled system for x = [q, z0, a0]
+        A = np.zeros((nvecs+2, nvecs+2), dtype=np.complex)
+        b = np.zeros(nvecs+2, dtype=np.complex)
+
+        # The elastic equations
+        A[:nvecs,:nvecs] = Kr - omega**2*np.eye(nvecs) + qinf*Ga[:,1:]
+        A[:nvecs,nvecs] = qinf*zwash*Ga[:,0]
+        A[:nvecs,nvecs+1] = qinf*Ga[:,0]
+        b[:nvecs] = -qinf*aoa_total*Ga[:,0]
+
+        # The plunge equation
+        A[nvecs,:nvecs] = -qinf*fz[1:]/m
+        A[nvecs,nvecs] = omega**2 - qinf*zwash*fz[0]/m
+        A[nvecs,nvecs+1] = -qinf*fz[0]/m
+        b[nvecs] = g + qinf*aoa_total*fz[0]/m
+
+        # The pitch equation
+        A[nvecs+1,:nvecs] = -qinf*my[1:]/I
+        A[nvecs+1,nvecs] = -qinf*zwash*my[0]/I
+        A[nvecs+1,nvecs+1] = omega**2 - qinf*my[0]/I
+        b[nvecs+1] = qinf*aoa_total*my[0]/I
+
+        # Solve the coupled system
+        x = self.solveCoupledSystem(A, b, tol)
+
+        return x[:nvecs]
+
+    def solveCoupledSystem(self, A, b, tol=1e-8):
+        '''
+        Solve the coupled frequency-response system A*x = b and check
+        the residual. If the relative residual exceeds the tolerance,
+        apply a single step of iterative refinement and log the
+        residual after the refinement. This may be called from the
+        threads of computeGustFRF.
+        '''
 
-            # Solve for the new values of q
-            q = np.linalg.solve(A, Fa)
+        x = np.linalg.solve(A, b)
 
-        return q
+        # Check the residual of the solution
+        bnrm = np.sqrt(np.sum(abs(b)**2))
+        res = b - np.dot(A, x)
+        if np.sqrt(np.sum(abs(res)**2)) > tol*bnrm:
+            # Apply a step of iterative refinement
+            x += np.linalg.solve(A, res)
+            res = b - np.dot(A, x)
+            rnrm = np.sqrt(np.sum(abs(res)**2))
+            self.logIteration('solveCoupledSystem', residual=rnrm/bnrm,
+                              converged=(rnrm <= tol*bnrm))
+            if rnrm > tol*bnrm and self.verbose:
+                print('Warning: coupled solve residual %10.3e'%(rnrm/bnrm))
 
+        return x
+
+    @_profiled
     def computeStaticLoad(self, aoa, U, qinf, Mach, nvecs,
                           omega, modes, filename=None):
         '''
@@ -628,6 +1350,7 @@ class DLM:
         dlm.computeperiodicbc(w, aoa, omega_aero, self.Xi.T, self.Xo.T)
 
         # Solve the resulting right-hand-side
+        self.addCount('aic_factorizations', 'aic_solves')
         Cp = np.linalg.solve(self.Dtrans.T, w)
 
         # Compute the forces
@@ -645,28 +1368,53 @@ class DLM:
         
         return
 
-    def computeInfluenceMatrix(self, U, omega_aero, Mach):
+    @_profiled
+    def computeInfluenceMatrix(self, U, omega_aero, Mach, deriv=False):
         '''
-        Compute the influence coefficient matrix
+        Compute the influence coefficient matrix. If deriv is True,
+        the derivative of the influence coefficient matrix with
+        respect to the frequency is computed in the same pass and
+        stored in dDtrans.
         '''
 
         if self.Dtrans is None or self.Dtrans.shape[0] < self.npanels:
             # Allocate the influence coefficient matrix
             self.Dtrans = np.zeros((self.npanels, self.npanels), dtype=np.complex)
 
+        if deriv:
+            if self.dDtrans is None or self.dDtrans.shape[0] < self.npanels:
+                self.dDtrans = np.zeros((self.npanels, self.npanels),
+                                        dtype=np.complex)
+
+            # Compute the influence coefficient matrix and its derivative
+            self.addCount('aic_assemblies')
+            dlm.computeinfluencematrixderiv(self.Dtrans.T, self.dDtrans.T,
+                                            omega_aero, U, Mach,
+                                            self.Xi.T, self.Xo.T, self.Xr.T,
+                                            self.dXav, self.is_symmetric,
+                                            self.use_steady_kernel,
+                                            self.epstol)
+            return
+
         # Compute the influence coefficient matrix
+        self.addCount('aic_assemblies')
         dlm.computeinfluencematrix(self.Dtrans.T, omega_aero, U, Mach,
                                    self.Xi.T, self.Xo.T, self.Xr.T, self.dXav,
                                    self.is_symmetric, self.use_steady_kernel, 
                                    self.epstol)
         return
 
-    def computeRigidDownwash(self, U, cref, omega, x, xcm, W0=0.0):
+    def computeRigidDownwash(self, U, cref, omega, x, xcm, W0=0.0,
+                             xdot=None):
         '''
         Compute downwash vector for a given rigid body motion
         where:
         x = [u w q theta x z]
         xdot = (d/dt)x_cm
+
+        If xdot is not provided, zdot is computed from the kinematic
+        relation in the last row of the rigid-body matrix from
+        computeRigidMat with theta_0 = 0: zdot = w - W0*theta.
         '''
 
         u = x[0]
@@ -674,25 +1422,20 @@ class DLM:
         q = x[2]
         theta = x[3]
 
-        # better way to solve for xdot?
-        A = self.computeRigidMat(U, rho, Mach, aoa, omega, cref, m, Iyy, xcm, W0=W0)
-        xdot = np.dot(A, x)
-        
-        zdot = xdot[5]
-        
-        #k = (cref*omega)/(2*U)
-        w = np.zeros(self.npanels, dtype=np.complex)
-        #D1jk = np.array([0, 0, 0, 0, 1, 0], dtype=np.complex)
-        
-        for i in range(self.npanels):
-            #D2jk = (-2.0/self.dXav[i])*np.array([0, 0, 1, 0, -self.dXav[i]/4.0, 0], dtype=np.complex)
-            #w[i] = np.dot((D1jk + 1j*k*D2jk), x_cm)
-            xbar = xcm - self.Xr[i, 0]
-            w[i] = -zdot - q*xbar - (U+u)*theta
-            w[i] += W0*(-1.0 - 1j*(omega/U)*self.Xr[i, 0]) # sinusoidal gust term, check this
-            
+        if xdot is None:
+            zdot = w - W0*theta
+        else:
+            zdot = xdot[5]
+
+        # Compute the downwash at the receiving points, including the
+        # sinusoidal gust term
+        xr = self.Xr[:,0]
+        w = np.array(-zdot - q*(xcm - xr) - (U+u)*theta, dtype=np.complex)
+        w += W0*(-1.0 - 1j*(omega/U)*xr)
+
         return w
     
+    @_profiled
     def solve(self, U, aoa=0.0, omega=0.0, Mach=0.0, w=None): # aoa not used?
         '''
         Solve the linear system (in the frequency domain)
@@ -702,13 +1445,10 @@ class DLM:
         self.computeInfluenceMatrix(U, omega, Mach)
 
         if w is None:
-            # Evaluate the right-hand-side
-            w = np.zeros(self.npanels, dtype=np.complex)
-            
-            # Compute the normalized downwash
-            for i in range(self.npanels):
-                w[i] = -1.0 - 1j*(omega/U)*self.Xr[i, 0]
+            # Evaluate the normalized downwash at the receiving points
+            w = -1.0 - 1j*(omega/U)*self.Xr[:,0]
 
+        self.addCount('aic_factorizations', 'aic_solves')
         Cp = np.linalg.solve(self.Dtrans.T, w)
 
         return Cp
@@ -736,6 +1476,43 @@ class DLM:
 
         return forces
 
+    def computePanelNormals(self):
+        '''
+        Compute the (un-normalized) normal n = a x b for each panel
+        where a and b are the panel diagonals. The norm of n is twice
+        the area of the panel. This is the same normal used in
+        addCpForces.
+        '''
+
+        a = self.X[self.conn[:,2],:] - self.X[self.conn[:,0],:]
+        b = self.X[self.conn[:,3],:] - self.X[self.conn[:,1],:]
+
+        return np.cross(a, b)
+
+    def computeModalForceMat(self, modes):
+        '''
+        Compute the matrix Gm that maps the panel Cp values to the
+        generalized forces for a unit dynamic pressure such that
+
+        modes^{T}*forces = qinf*Gm*Cp
+
+        Each panel distributes 1/8 of qinf*Cp*n to each of its nodes,
+        consistent with addCpForces.
+        '''
+
+        nvecs = modes.shape[1]
+        normals = self.computePanelNormals()
+
+        # Sum the mode shapes over the nodes of each panel
+        msum = np.zeros((self.npanels, 3, nvecs), dtype=modes.dtype)
+        m3 = modes.reshape(self.nnodes, 3, nvecs)
+        for j in range(4):
+            msum += m3[self.conn[:,j]]
+
+        Gm = 0.125*np.einsum('ikv,ik->vi', msum, normals)
+
+        return Gm
+
     def computeCGForces(self, qinf, Cp):
         '''
         Compute total aero forces about cg
@@ -785,83 +1562,141 @@ class DLM:
             fp.write('varlocation=([4,5]=cellcentered)\n')
 
             # Write out the panel locations
-            if u is None:
-                for j in range(3):
-                    for i in range(self.nnodes):
-                        fp.write('%e\n'%(self.X[i, j]))
-            else:
-                for j in range(3):
-                    for i in range(self.nnodes):
-                        fp.write('%e\n'%(self.X[i, j] + u[i, j]))
+            X = self.X
+            if u is not None:
+                X = self.X + u
+            vals = X.T.flatten().tolist()
+            fp.write(('%e\n'*len(vals))%tuple(vals))
 
             # Write out the real/imaginary Cp values
-            for i in range(self.npanels):
-                fp.write('%e\n'%(Cp[i].real))
-            for i in range(self.npanels):
-                fp.write('%e\n'%(Cp[i].imag))
-
-            for i in range(self.npanels):
-                fp.write('%d %d %d %d\n'%(
-                        self.conn[i,0]+1, self.conn[i,1]+1,
-                        self.conn[i,2]+1, self.conn[i,3]+1))
+            Cp = np.asarray(Cp)
+            vals = np.hstack((Cp.real, Cp.imag)).tolist()
+            fp.write(('%e\n'*len(vals))%tuple(vals))
+
+            # Write out the connectivity
+            vals = (self.conn+1).flatten().tolist()
+            fp.write(('%d %d %d %d\n'*self.npanels)%tuple(vals))
             
             fp.close()
 
         return
     
+    def writeToVTK(self, Cp, filename='solution.vtu', u=None, times=None):
+        '''
+        Write one or more Cp solutions to binary VTK unstructured grid
+        files with the cell arrays Re(Cp) and Im(Cp) and, if provided,
+        the nodal displacement array u that can be used to warp the
+        surface. A single solution is written to filename. Several
+        solutions are written as a time series: solution k is written
+        to the file name with the suffix _k (e.g. solution_0003.vtu)
+        and a .pvd collection with the same base name lists the files.
+
+        Input:
+        Cp:        the Cp solution or the solutions as columns
+        filename:  the name of the .vtu file
+        u:         the displacements, shape (nnodes, 3) or (nsol, nnodes, 3)
+        times:     the frequency, velocity or time for each solution
+                   (defaults to the solution index)
+        '''
+
+        Cp, u = getSolutionArrays(Cp, u, self.nnodes, self.npanels)
+        nsol = Cp.shape[0]
+
+        if times is None:
+            times = np.arange(nsol)
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        if len(times) != nsol:
+            raise ValueError('times must have one value per solution')
+
+        # Set the file name of each solution
+        base = os.path.splitext(filename)[0]
+        files = [filename]
+        if nsol > 1:
+            files = ['%s_%04d.vtu'%(base, k) for k in range(nsol)]
+
+        for k in range(nsol):
+            cell_data = [('Re(Cp)', Cp[k].real), ('Im(Cp)', Cp[k].imag)]
+            point_data = []
+            if u is not None:
+                point_data.append(('u', u[min(k, u.shape[0]-1)].real))
+
+            writeVTU(files[k], self.X, self.conn, cell_data=cell_data,
+                     point_data=point_data,
+                     field_data=[('TimeValue', times[k])])
+
+        # List the solutions in the time series
+        if nsol > 1:
+            writePVD(base + '.pvd', files, times)
+
+        return
+
+    def writeToNPZ(self, Cp, filename='solution.npz', u=None, times=None):
+        '''
+        Write one or more Cp solutions to a compressed numpy archive
+        with the arrays X, conn, Cp of shape (nsol, npanels), and
+        optionally u of shape (nsol, nnodes, 3) and times.
+
+        Input:
+        Cp:        the Cp solution or the solutions as columns
+        filename:  the name of the .npz file
+        u:         the displacements, shape (nnodes, 3) or (nsol, nnodes, 3)
+        times:     the frequency, velocity or time for each solution
+        '''
+
+        Cp, u = getSolutionArrays(Cp, u, self.nnodes, self.npanels)
+        writeNPZ(filename, self.X, self.conn, Cp=Cp, u=u, times=times)
+
+        return
+
     def testMatDeriv(self, x, dh=1e-6):
         '''
-        Test the derivatives within TACS with respect to the mass and
-        stiffness matrices 
+        Test the derivatives of the structural backend with respect to
+        the mass and stiffness matrices 
         '''
 
         # Set the design variables and create a random perturbation
         # vector
-        self.tacs.setDesignVars(x)
+        self.struct.setDesignVars(x)
         p = np.random.uniform(size=x.shape)
 
         # Form random vectors
-        ur = self.tacs.createVec()
-        vr = self.tacs.createVec()
+        ur = self.struct.createVec()
+        vr = self.struct.createVec()
         ur.setRand(-1.0, 1.0)
         vr.setRand(-1.0, 1.0)
-        self.tacs.applyBCs(ur)
-        self.tacs.applyBCs(vr)
+        self.struct.applyBCs(ur)
+        self.struct.applyBCs(vr)
 
         # Assemble the stiffness and mass matrices
-        self.tacs.assembleJacobian(1.0, 0.0, 0.0, None, self.kmat)
-        self.tacs.assembleMatType(TACS.PY_MASS_MATRIX,
-                                  self.mmat, TACS.PY_NORMAL)
+        self.struct.assemble()
 
         # Compute the inner product: vr^{T}*K*ur
-        self.kmat.mult(ur, self.temp)
+        self.struct.multK(ur, self.temp)
         k1 = self.temp.dot(vr)
 
-        self.mmat.mult(ur, self.temp)
+        self.struct.multM(ur, self.temp)
         m1 = self.temp.dot(vr)
 
         # Compute the derivatives w.r.t. the mass/stiffness matrix
         krr = np.zeros(x.shape)
         mrr = np.zeros(x.shape)
-        mtype = TACS.PY_STIFFNESS_MATRIX
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vr, ur, krr)
-        mtype = TACS.PY_MASS_MATRIX
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vr, ur, mrr)
+        mtype = 'stiffness'
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vr, ur, krr)
+        mtype = 'mass'
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vr, ur, mrr)
         
         # Evaluate the stiffness matrix at the new point
         xnew = x + dh*p
-        self.tacs.setDesignVars(xnew)
+        self.struct.setDesignVars(xnew)
 
         # Assemble the stiffness and mass matrices
-        self.tacs.assembleJacobian(1.0, 0.0, 0.0, None, self.kmat)
-        self.tacs.assembleMatType(TACS.PY_MASS_MATRIX,
-                                  self.mmat, TACS.PY_NORMAL)
+        self.struct.assemble()
         
         # Compute the inner product: vr^{T}*K*ur
-        self.kmat.mult(ur, self.temp)
+        self.struct.multK(ur, self.temp)
         k2 = self.temp.dot(vr)
 
-        self.mmat.mult(ur, self.temp)
+        self.struct.multM(ur, self.temp)
         m2 = self.temp.dot(vr)
 
         # Form the approximate directional derivatives
@@ -881,69 +1716,68 @@ class DLM:
 
         return
 
-    def initStructure(self, tacs):
+    def initStructure(self, tacs, num_nearest=25, transfer='rbf'):
         '''
-        Set up the load and displacement transfer object for a general
-        TACS finite-element model.
+        Set up the structural backend and the load and displacement
+        transfer for a general TACS finite-element model. The transfer
+        is 'rbf', 'rigid', 'nearest' or 'funtofem' (see
+        TACSStructure).
         '''
 
-        # Get the communicator from the TACSAssembler object
-        self.tacs = tacs
-        comm = MPI.COMM_WORLD
+        # Import the TACS backend here so that TACS is only required
+        # when it is used
+        from .tacs_structure import TACSStructure
+        self.setStructure(TACSStructure(tacs, num_nearest, transfer))
 
-        # Now, set up the load and displacement transfer object
-        struct_root = 0
-        aero_root = 0
+        return
 
-        # Get the aerodynamic mesh connectivity
-        aero_pts = self.X.flatten()
-        aero_conn = self.conn.flatten()
+    def setStructure(self, struct):
+        '''
+        Set the structural model used for the flutter analysis. This
+        must be an implementation of the Structure interface, for
+        instance SparseStructure or TACSStructure.
+        '''
 
-        # Specify the load/displacement transfer data
-        isymm = -1
-        self.funtofem = FUNtoFEM.pyFUNtoFEM(comm, comm, struct_root,
-                                            comm, aero_root,
-                                            FUNtoFEM.PY_LINEAR, isymm)
-        self.funtofem.setAeroNodes(aero_pts)
+        self.struct = struct
 
-        # Set the structural points into FUNtoFEM
-        X = self.tacs.createNodeVec()
-        self.tacs.getNodes(X)
-        self.funtofem.setStructNodes(X.getArray())
+        # Set up the load and displacement transfer
+        self.struct.setAeroNodes(self.X)
 
-        # Initialize the load/displacement transfer
-        num_nearest = 25
-        self.funtofem.initialize(num_nearest)
-            
-        # Set up the matrices/pc/Krylov solver that will be required
-        # for the flutter analysis
-        self.mat = tacs.createFEMat()
+        # Create a temporary structural vector
+        self.temp = self.struct.createVec()
 
-        # The raw stiffness/mass matrices 
-        self.kmat = tacs.createFEMat()
-        self.mmat = tacs.createFEMat()
+        return
 
-        # Create the preconditioner and the solver object.  Note that
-        # these settings are best for a shell-type finite-element
-        # model.
-        self.pc = TACS.Pc(self.mat)
-
-        # Create the GMRES object 
-        gmres_iters = 10
-        nrestart = 0
-        self.ksm = TACS.KSM(self.mat, self.pc, gmres_iters, nrestart)
-
-        # Create a temporary tacs vector
-        self.temp = self.tacs.createVec()
-
-        return
-
-    def setUpSubspace(self, m, r, sigma=0.0, tol=1e-12,
-                      max_iters=5, use_modes=False):
-        '''
-        Build a subspace for the flutter analysis using a Lanczos
-        method. You can specify to either use the Lanczos subspace
-        basis or use the eigenvector basis.
+    @_profiled
+    def setUpSubspace(self, m, r, sigma=0.0, tol=1e-12,
+                      max_iters=5, use_modes=False, ortho='mgs',
+                      block_size=1, warm_start=False):
+        '''
+        Build a subspace for the flutter analysis using a
+        thick-restart Lanczos method. You can specify to either use the
+        Lanczos subspace basis or use the eigenvector basis.
+
+        When the r lowest modes have not converged, the Lanczos method
+        is restarted with the Ritz vectors of the lowest modes and the
+        last Lanczos vector, so that the Krylov information is retained
+        across restarts. Converged Ritz vectors are locked. When new
+        modes are locked, the shift is moved up to the lowest mode
+        that has not converged and the locked vectors are kept. A
+        restart requires m >= r + 3, otherwise only a single pass is
+        made. The number of converged modes is stored in
+        subspace_nconv, and subspace_converged is False (and a warning
+        is printed) if fewer than r modes converged.
+
+        When block_size > 1, a block Lanczos method is used instead.
+        This converges clustered or repeated frequencies faster and
+        performs the shift-invert solves and mass-matrix products on
+        blocks of vectors.
+
+        When warm_start is True, the Lanczos method is started from
+        the subspace of the previous call (for instance at the previous
+        design point) instead of a random vector. The starting vector
+        is the sum of the Ritz vectors of the lowest modes from a
+        Rayleigh-Ritz projection onto the previous subspace.
 
         Input:
         m:         the size of the Lanczos subspace
@@ -952,12 +1786,14 @@ class DLM:
         tol:       tolerance for the eigenvector solution
         max_iters: maximum number of iterations to use
         use_modes: reduce the subspace to the eigenvectors
+        ortho:     the Lanczos orthogonalization 'mgs', 'cgs2' or
+                   'selective'
+        block_size: the block size for the block Lanczos method
+        warm_start: start from the previous subspace
         '''
 
         # Assemble the mass and stiffness matrices
-        self.tacs.assembleJacobian(1.0, 0.0, 0.0, None, self.kmat)
-        self.tacs.assembleMatType(TACS.PY_MASS_MATRIX,
-                                  self.mmat, TACS.PY_NORMAL)
+        self.struct.assemble()
         
         # Create a list of vectors
         if self.Vm is None:
@@ -967,52 +1803,144 @@ class DLM:
         if len(self.Vm) < m:
             lvm = len(self.Vm)
             for i in range(lvm, m):
-                self.Vm.append(self.tacs.createVec())
-
-        # Initialize Vm as a random set of initial vectors
-        self.Vm[0].setRand(-1.0, 1.0)
-
-        # Iterate until we have sufficient accuracy
-        eigvecs = np.zeros((m-1, m-1))
-        for i in range(max_iters):
-            alpha, beta = self.lanczos(self.Vm, sigma)
-
-            # Compute the final coefficient
-            b0 = beta[-1]
+                self.Vm.append(self.struct.createVec())
 
-            # Compute the eigenvalues and eigenvectors
-            info = dlm.tridiageigvecs(alpha, beta, eigvecs.T)
-            
-            if info != 0:
-                print('Error in the tri-diagonal eigenvalue solver')
+        # Count the shift-invert solves used to build the subspace
+        self.nsubspace_solves = 0
 
-            # Compute the true eigenvalues/vectors
-            omega = np.sqrt(1.0/alpha + sigma)
-            
-            # Argsort the array, and test for convergence of the
-            # r-lowest eigenvalues
-            indices = np.argsort(omega)
-            omega = omega[indices]
-            eigvecs = eigvecs[indices,:]
-
-            convrg = True
-            for j in range(r):
-                if np.fabs(b0*eigvecs[j,-1]) > tol:
-                    convrg = False
-
-            if convrg:
-                break
-            else:
-                # Make a better guess for sigma
-                sigma = 0.95*omega[0]**2
-                
-                # Form a linear combination of the best r eigenvectors
-                weights = np.sum(eigvecs[:r,:], axis=0)
-                self.Vm[0].scale(weights[0])
-                for j in range(m-1):
-                    self.Vm[0].axpy(weights[j], self.Vm[j])
+        # Form the starting vectors from the previous subspace
+        warm = (warm_start and self.Qm is not None and
+                len(self.Qm) >= r)
+        if warm:
+            self.warmStartSubspace(r, block_size)
 
-                self.tacs.applyBCs(Vm[0])
+        if block_size > 1:
+            eigvecs, omega, nvecs, nconv = self.blockLanczosSubspace(
+                m, r, sigma, tol, max_iters, block_size, warm)
+        else:
+            # The size of the projected eigenvalue problem
+            n = m-1
+            if n < r:
+                raise ValueError('The subspace size must be at least r + 1')
+
+            # Initialize Vm as a random set of initial vectors
+            if not warm:
+                self.Vm[0].setRand(-1.0, 1.0)
+
+            # The number of Ritz vectors retained at each restart
+            nkeep = min(r + (n - r)//2, n-2)
+
+            # The retained Ritz values and their coupling to the residual
+            # vector after a restart
+            start = 0
+            nlocked = 0
+            theta_keep = np.zeros(0)
+            s_keep = np.zeros(0)
+            theta_lanczos = None
+
+            # Iterate until we have sufficient accuracy
+            for i in range(max_iters):
+                alpha, beta = self.lanczos(self.Vm, sigma, ortho, start,
+                                           theta_lanczos, s_keep)
+
+                # Compute the final coefficient
+                b0 = beta[-1]
+
+                # Form the projected matrix. After a restart, this has an
+                # arrowhead block for the retained Ritz vectors.
+                T = np.zeros((n, n))
+                T[:start,:start] = np.diag(theta_keep)
+                T[start,:start] = s_keep
+                T[:start,start] = s_keep
+                for j in range(start, n):
+                    T[j,j] = alpha[j]
+                for j in range(start, n-1):
+                    T[j,j+1] = beta[j]
+                    T[j+1,j] = beta[j]
+
+                # Compute the eigenvalues and eigenvectors
+                theta, Z = np.linalg.eigh(T)
+
+                # Compute the true eigenvalues, sort them and compute the
+                # residual of each Ritz pair
+                lam = sigma + 1.0/theta
+                indices = np.argsort(lam)
+                lam = lam[indices]
+                theta = theta[indices]
+                Z = Z[:,indices]
+                res = np.fabs(b0*Z[-1,:])
+                omega = np.sqrt(np.fabs(lam))
+
+                # Count the lowest modes that have converged
+                nconv = 0
+                while nconv < r and res[nconv] <= tol:
+                    nconv += 1
+
+                self.logIteration('setUpSubspace', iteration=i,
+                                  nconv=nconv, r=r, sigma=sigma,
+                                  res=res[:r], omega=omega[:r])
+                if self.verbose:
+                    print('Lanczos iteration %2d: %2d of %2d modes converged, '
+                          'sigma = %12.5e'%(i, nconv, r, sigma))
+
+                # The subspace must be large enough to retain the Ritz
+                # vectors of the r lowest modes to restart
+                if nconv == r or i == max_iters-1 or nkeep < r:
+                    break
+
+                # Form the retained Ritz vectors and their products with
+                # the mass matrix
+                Y = []
+                MY = []
+                for k in range(nkeep):
+                    y = self.struct.createVec()
+                    my = self.struct.createVec()
+                    for j in range(n):
+                        y.axpy(Z[j,k], self.Vm[j])
+                        my.axpy(Z[j,k], self.MVm[j])
+                    Y.append(y)
+                    MY.append(my)
+
+                if nconv > nlocked and 0.95*lam[nconv] > sigma:
+                    # Lock the converged vectors and move the shift to the
+                    # lowest mode that has not converged. The remaining
+                    # Ritz vectors are combined into the new starting
+                    # vector, which is M-orthogonal to the locked vectors.
+                    sigma = 0.95*lam[nconv]
+                    nlocked = nconv
+                    start = nconv
+                    theta_keep = 1.0/(lam[:nconv] - sigma)
+                    s_keep = np.zeros(nconv)
+                    theta_lanczos = None
+
+                    for k in range(nconv+1, r):
+                        Y[nconv].axpy(1.0, Y[k])
+                        MY[nconv].axpy(1.0, MY[k])
+                    b = np.sqrt(Y[nconv].dot(MY[nconv]))
+                    Y[nconv].scale(1.0/b)
+                    MY[nconv].scale(1.0/b)
+                    for k in range(nconv+1):
+                        self.Vm[k].copyValues(Y[k])
+                        self.MVm[k].copyValues(MY[k])
+                else:
+                    # Restart with the retained Ritz vectors, followed by
+                    # the last Lanczos vector
+                    nlocked = nconv
+                    start = nkeep
+                    theta_keep = theta[:nkeep]
+                    s_keep = b0*Z[-1,:nkeep]
+                    theta_lanczos = theta_keep
+                    self.Vm[nkeep].copyValues(self.Vm[n])
+                    self.MVm[nkeep].copyValues(self.MVm[n])
+                    for k in range(nkeep):
+                        self.Vm[k].copyValues(Y[k])
+                        self.MVm[k].copyValues(MY[k])
+
+            # The projected eigenvectors
+            eigvecs = Z.T
+
+            # The number of M-orthonormal vectors in Vm
+            nvecs = m
 
         # Now that we've built Vm, compute the inner product with the
         # K matrix for later useage
@@ -1024,8 +1952,8 @@ class DLM:
                 eigvecs[i,:] /= np.sqrt(np.sum(eigvecs[i,:]**2))
             
                 # Compute the full eigenvector
-                qr = self.tacs.createVec()
-                for j in range(m-1):
+                qr = self.struct.createVec()
+                for j in range(eigvecs.shape[1]):
                     qr.axpy(eigvecs[i,j], self.Vm[j])
                 self.Qm.append(qr)
 
@@ -1037,32 +1965,28 @@ class DLM:
                 self.Kr[k,k] = omega[k]**2
         else:
             # Set the stiffness matrix
-            self.Kr = np.zeros((m,m))
+            self.Kr = np.zeros((nvecs,nvecs))
 
-            for i in range(m):
-                self.kmat.mult(self.Vm[i], self.temp)
+            for i in range(nvecs):
+                self.struct.multK(self.Vm[i], self.temp)
                 for j in range(i+1):
                     self.Kr[i,j] = self.temp.dot(self.Vm[j])
                     self.Kr[j,i] = self.Kr[i,j]
 
             # Set the Qm as the subspace
-            self.Qm = self.Vm
+            self.Qm = self.Vm[:nvecs]
 
-        # Get the surface modes and the corresponding normal wash
+        # Get the surface modes and the corresponding normal wash. The
+        # cached aerodynamic matrices are no longer valid.
+        self.aero_cache = {}
         self.Qm_modes = np.zeros((3*self.nnodes, len(self.Qm)))
         self.Qm_vwash = np.zeros((self.npanels, len(self.Qm)))
         self.Qm_dwash = np.zeros((self.npanels, len(self.Qm)))
 
         # Extract the natural frequencies of vibration
         for k in range(len(self.Qm)):
-            # Transfer the eigenvector to the aerodynamic surface
-            self.funtofem.transferDisps(self.Qm[k].getArray())
-            disp = self.funtofem.getAeroDisps()
-
-            # Compute the normal wash on the aerodynamic mesh
-            vk, dk = self.getModeBCs(disp.reshape(self.nnodes, 3))
-    
             # Store the normal wash and the surface displacement
+            disp, vk, dk = self.computeModeWash(self.Qm[k])
             self.Qm_vwash[:,k] = vk
             self.Qm_dwash[:,k] = dk
             self.Qm_modes[:,k] = disp
@@ -1070,73 +1994,839 @@ class DLM:
         # Set the values of omega
         self.omega = omega[:r]
 
-        print('omega = ', self.omega[:r])
+        # Record whether the requested modes converged
+        self.subspace_nconv = nconv
+        self.subspace_converged = (nconv >= r)
+        if not self.subspace_converged and self.verbose:
+            print('Warning: only %d of %d modes converged in setUpSubspace'%(
+                nconv, r))
+
+        if self.verbose:
+            print('omega = ', self.omega[:r])
+
+        # Record the solves used and compare the warm start against
+        # the last subspace built from scratch
+        if not warm:
+            self.nsubspace_cold_solves = self.nsubspace_solves
+        elif self.nsubspace_cold_solves is not None and self.verbose:
+            print('Warm start used %d solves, %d solves saved'%(
+                self.nsubspace_solves,
+                self.nsubspace_cold_solves - self.nsubspace_solves))
 
         return
 
-    def lanczos(self, Vm, sigma):
+    @_profiled
+    def lanczos(self, Vm, sigma, ortho='mgs', start=0,
+                theta=None, s=None):
         '''
         Build an M-orthogonal Lanczos subspace using full
         orthogonalization. The full-orthogonalization makes this
         equivalent to Arnoldi, but only the tridiagonal coefficients
         are retained.
 
+        With ortho='selective', each new vector is only orthogonalized
+        against the previous two vectors. The loss of orthogonality
+        against the remaining vectors is estimated without any inner
+        products using the omega-recurrence of Paige and Simon. When
+        the estimate exceeds sqrt(eps), the new vector and the next
+        vector are orthogonalized against the full basis (partial
+        reorthogonalization). Locked eigenvectors do not satisfy the
+        recurrence once the shift has changed, so each new vector is
+        always orthogonalized against them.
+
+        The products M*V[j] are stored in MVm and M*v is updated
+        alongside v during the orthogonalization, so that each step
+        requires only a single mass-matrix product.
+
+        When start > 0, the vectors Vm[:start+1] and their products
+        with the mass matrix MVm[:start+1] must already be
+        M-orthonormal, and the iteration continues from Vm[start].
+        This is used for restarts.
+
         Input:
         Vm:     list of vectors empty vectors except for Vm[0]
         sigma:  estimate of the first natural frequency
+        ortho:  the orthogonalization: 'mgs' for modified Gram-Schmidt,
+                'cgs2' for two-pass classical Gram-Schmidt or
+                'selective' to orthogonalize against the full basis
+                only when orthogonality is lost
+        start:  the index of the vector to start from
+        theta:  the Ritz values of Vm[:start] after a restart, or
+                None if Vm[:start] are locked eigenvectors
+        s:      the coupling of Vm[:start] to Vm[start] after a restart
 
         Output:
         Vm:     an M-orthogonal subspace
         '''
 
+        if ortho not in ('mgs', 'cgs2', 'selective'):
+            raise ValueError('Unknown orthogonalization %s'%(ortho))
+
         # Allocate space for the symmetric tri-diagonal system
         alpha = np.zeros(len(Vm)-1)
         beta = np.zeros(len(Vm)-1)
 
-        # Compute (K - sigma*M)
-        self.mat.copyValues(self.kmat)
-        self.mat.axpy(-sigma, self.mmat)
-        
+        # Allocate the vectors that store the products M*V
+        if self.MVm is None:
+            self.MVm = []
+        for k in range(len(self.MVm), len(Vm)):
+            self.MVm.append(self.struct.createVec())
+        MVm = self.MVm
+
+        # The tolerance for the loss of orthogonality used by the
+        # selective orthogonalization
+        eps = np.finfo(np.float64).eps
+        eta = np.sqrt(eps)
+
+        # The projected matrix T and the estimates W[i,j] of the inner
+        # products Vm[i]^{T}*M*Vm[j] for the omega-recurrence. The
+        # vectors Vm[:start+1] are M-orthonormal, and after a restart
+        # T has an arrowhead block for the retained Ritz vectors.
+        T = np.zeros((len(Vm), len(Vm)))
+        W = eps*np.ones((len(Vm), len(Vm)))
+        W[np.diag_indices(len(Vm))] = 1.0
+        nlocked = 0
+        if start > 0 and theta is None:
+            nlocked = start
+        elif start > 0:
+            T[:start,:start] = np.diag(theta)
+            T[start,:start] = s
+            T[:start,start] = s
+        reortho = False
+
         # Factor the stiffness matrix (K - sigma*M)
-        self.pc.factor()
+        self.struct.factorShift(sigma)
 
-        # Apply the boundary conditions to make sure that the 
-        # initial vector satisfies them
-        self.tacs.applyBCs(Vm[0])
+        if start == 0:
+            # Apply the boundary conditions to make sure that the 
+            # initial vector satisfies them
+            self.struct.applyBCs(Vm[0])
 
-        # Scale the initial vector
-        self.mmat.mult(Vm[0], self.temp)
-        b0 = np.sqrt(Vm[0].dot(self.temp))
-        Vm[0].scale(1.0/b0)
+            # Scale the initial vector
+            self.struct.multM(Vm[0], MVm[0])
+            b0 = np.sqrt(Vm[0].dot(MVm[0]))
+            Vm[0].scale(1.0/b0)
+            MVm[0].scale(1.0/b0)
 
         # Execute the orthogonalization
-        for i in range(len(Vm)-1):
+        for i in range(start, len(Vm)-1):
             # Compute V[i+1] = (K - sigma*M)^{-1}*M*V[i]
-            self.mmat.mult(Vm[i], self.temp)
-            self.ksm.solve(self.temp, Vm[i+1])
+            self.struct.solveShift(MVm[i], Vm[i+1])
+            self.nsubspace_solves += 1
             
             # Make sure that the boundary conditions are enforced
             # fully
-            self.tacs.applyBCs(Vm[i+1])
-
-            # Perform full modified Gram-Schmidt orthogonalization
-            # with mass-matrix inner products
-            for j in range(i, -1, -1):
-                # Compute the inner product
-                self.mmat.mult(Vm[i+1], self.temp)
-                h = Vm[j].dot(self.temp)
-                Vm[i+1].axpy(-h, Vm[j])
-
-                if i == j:
-                    alpha[i] = h
-            
+            self.struct.applyBCs(Vm[i+1])
+
+            # Compute the product M*V[i+1] that is updated during
+            # the orthogonalization
+            self.struct.multM(Vm[i+1], MVm[i+1])
+
+            if ortho == 'cgs2':
+                # Perform two passes of classical Gram-Schmidt
+                for npass in range(2):
+                    h = np.zeros(i+1)
+                    for j in range(i+1):
+                        h[j] = Vm[j].dot(MVm[i+1])
+                    for j in range(i+1):
+                        Vm[i+1].axpy(-h[j], Vm[j])
+                        MVm[i+1].axpy(-h[j], MVm[j])
+                    alpha[i] += h[i]
+            else:
+                # Perform modified Gram-Schmidt orthogonalization with
+                # mass-matrix inner products. The selective variant
+                # only orthogonalizes against the last two vectors,
+                # except directly after a restart.
+                jend = -1
+                if ortho == 'selective' and i > start:
+                    jend = max(i-2, -1)
+                for j in range(i, jend, -1):
+                    h = Vm[j].dot(MVm[i+1])
+                    Vm[i+1].axpy(-h, Vm[j])
+                    MVm[i+1].axpy(-h, MVm[j])
+
+                    if i == j:
+                        alpha[i] = h
+
+            if ortho == 'selective' and i > start:
+                # Orthogonalize against the locked eigenvectors
+                for j in range(nlocked):
+                    h = Vm[j].dot(MVm[i+1])
+                    Vm[i+1].axpy(-h, Vm[j])
+                    MVm[i+1].axpy(-h, MVm[j])
+
             # Compute the inner product w.r.t. itself
-            self.mmat.mult(Vm[i+1], self.temp)
-            beta[i] = np.sqrt(Vm[i+1].dot(self.temp))
+            beta[i] = np.sqrt(Vm[i+1].dot(MVm[i+1]))
+
+            T[i,i] = alpha[i]
+            if ortho == 'selective':
+                # The estimate of the rounding error in the new vector
+                # relative to its norm
+                tnorm = max(np.fabs(T[:i+1,:i+1]).max(), beta[i])
+                psi = eps*tnorm/beta[i]
+
+                if i > start:
+                    # Update the estimates of the inner products of
+                    # the new vector with the previous vectors from
+                    # beta[i]*Vm[i+1] = OP*Vm[i] - sum_l T[l,i]*Vm[l]
+                    w = (np.dot(T[:i+1,:i].T, W[i,:i+1]) -
+                         np.dot(W[:i+1,:i].T, T[:i+1,i]))
+                    W[i+1,:i] = (w + np.sign(w)*eps*tnorm)/beta[i]
+                    W[i+1,:nlocked] = psi
+                    W[i+1,i] = psi
+
+                    if reortho or np.max(np.fabs(W[i+1,:i])) > eta:
+                        # Orthogonalize against the full basis. This is
+                        # repeated for the next vector.
+                        self.addCount('lanczos_reorthogonalizations')
+                        for j in range(i+1):
+                            h = Vm[j].dot(MVm[i+1])
+                            Vm[i+1].axpy(-h, Vm[j])
+                            MVm[i+1].axpy(-h, MVm[j])
+                        beta[i] = np.sqrt(Vm[i+1].dot(MVm[i+1]))
+                        W[i+1,:i+1] = eps*tnorm/beta[i]
+                        reortho = not reortho
+                else:
+                    # The first vector after a restart is orthogonalized
+                    # against the full basis
+                    W[i+1,:i+1] = psi
+                W[:i+1,i+1] = W[i+1,:i+1]
+
+            T[i,i+1] = beta[i]
+            T[i+1,i] = beta[i]
+
             Vm[i+1].scale(1.0/beta[i])
+            MVm[i+1].scale(1.0/beta[i])
 
         return alpha, beta
 
+    def warmStartSubspace(self, r, bsize=1):
+        '''
+        Form the starting vectors for the Lanczos method from the
+        previous subspace Qm. The lowest r modes of the current
+        stiffness and mass matrices are approximated by a Rayleigh-Ritz
+        projection onto the previous subspace, and the Ritz vectors are
+        summed into bsize starting vectors stored in Vm[:bsize]. No
+        shift-invert solves are required.
+
+        Input:
+        r:      the number of eigenvectors that must converge
+        bsize:  the number of starting vectors
+        '''
+
+        # Copy the previous subspace since Qm may share vectors with
+        # the Lanczos subspace
+        V = []
+        MV = []
+        for q in self.Qm:
+            v = self.struct.createVec()
+            v.copyValues(q)
+            self.struct.applyBCs(v)
+            mv = self.struct.createVec()
+            self.struct.multM(v, mv)
+            V.append(v)
+            MV.append(mv)
+
+        # M-orthonormalize the subspace
+        self.orthonormalizeBlock(V, MV, 0, len(V))
+
+        # Project the stiffness matrix onto the subspace
+        nb = len(V)
+        Kq = np.zeros((nb, nb))
+        for k in range(nb):
+            self.struct.multK(V[k], self.temp)
+            for j in range(k+1):
+                Kq[k,j] = self.temp.dot(V[j])
+                Kq[j,k] = Kq[k,j]
+
+        # Compute the Ritz vectors for the lowest modes and add them
+        # to the starting vectors
+        lam, Z = np.linalg.eigh(Kq)
+        for k in range(bsize):
+            self.Vm[k].zeroEntries()
+        for k in range(r):
+            for j in range(nb):
+                self.Vm[k % bsize].axpy(Z[j,k], V[j])
+
+        return
+
+    def blockLanczosSubspace(self, m, r, sigma, tol, max_iters, bsize,
+                             warm=False):
+        '''
+        Compute the lowest r modes with a thick-restart block Lanczos
+        method. The Ritz vectors of the lowest modes and the last
+        block of Lanczos vectors are retained across restarts and
+        converged Ritz vectors are locked.
+
+        Input:
+        m:         the size of the Lanczos subspace
+        r:         the number of eigenvectors that must converge
+        sigma:     estimate of the frequency
+        tol:       tolerance for the eigenvector solution
+        max_iters: maximum number of iterations to use
+        bsize:     the block size
+        warm:      use the starting block stored in Vm
+
+        Output:
+        eigvecs:   the projected eigenvectors stored by row
+        omega:     the natural frequencies
+        nvecs:     the number of M-orthonormal vectors in Vm
+        nconv:     the number of the lowest modes that converged
+        '''
+
+        if m < r + 2*bsize:
+            raise ValueError(
+                'The subspace size must be at least r + 2*block_size')
+
+        # Initialize the first block with random vectors
+        if not warm:
+            for k in range(bsize):
+                self.Vm[k].setRand(-1.0, 1.0)
+
+        # The number of Ritz vectors retained at each restart
+        nkeep = min(r + (m - bsize - r)//2, m - 2*bsize)
+
+        # The projected matrix. After a restart, the leading block
+        # contains the retained Ritz values and their coupling to the
+        # last block of Lanczos vectors.
+        H = np.zeros((m, m))
+
+        start = 0
+        nlocked = 0
+        for i in range(max_iters):
+            nproj = self.blockLanczos(self.Vm, sigma, bsize, H, start)
+
+            # Symmetrize the projected matrix and extract the coupling
+            # to the residual block
+            T = 0.5*(H[:nproj,:nproj] + H[:nproj,:nproj].T)
+            R = H[nproj:nproj+bsize, nproj-bsize:nproj]
+
+            # Compute the Ritz values and sort the true eigenvalues
+            theta, Z = np.linalg.eigh(T)
+            lam = sigma + 1.0/theta
+            indices = np.argsort(lam)
+            lam = lam[indices]
+            theta = theta[indices]
+            Z = Z[:,indices]
+            S = np.dot(R, Z[nproj-bsize:,:])
+            res = np.sqrt(np.sum(S**2, axis=0))
+            omega = np.sqrt(np.fabs(lam))
+
+            # Count the lowest modes that have converged
+            nconv = 0
+            while nconv < r and res[nconv] <= tol:
+                nconv += 1
+
+            self.logIteration('setUpSubspace', iteration=i, nconv=nconv,
+                              r=r, sigma=sigma, res=res[:r], omega=omega[:r])
+            if self.verbose:
+                print('Lanczos iteration %2d: %2d of %2d modes converged, '
+                      'sigma = %12.5e'%(i, nconv, r, sigma))
+
+            if nconv == r or i == max_iters-1:
+                break
+
+            # Form the retained Ritz vectors and their products with
+            # the mass matrix
+            Y = []
+            MY = []
+            for k in range(nkeep):
+                y = self.struct.createVec()
+                my = self.struct.createVec()
+                for j in range(nproj):
+                    y.axpy(Z[j,k], self.Vm[j])
+                    my.axpy(Z[j,k], self.MVm[j])
+                Y.append(y)
+                MY.append(my)
+
+            H[:,:] = 0.0
+            if (nconv > nlocked and nconv + bsize <= nkeep and
+                0.95*lam[nconv] > sigma):
+                # Lock the converged vectors, move the shift to the
+                # lowest mode that has not converged and start from the
+                # next block of Ritz vectors
+                sigma = 0.95*lam[nconv]
+                start = nconv
+                H[:nconv,:nconv] = np.diag(1.0/(lam[:nconv] - sigma))
+                for k in range(nconv + bsize):
+                    self.Vm[k].copyValues(Y[k])
+                    self.MVm[k].copyValues(MY[k])
+            else:
+                # Restart with the retained Ritz vectors, followed by
+                # the last block of Lanczos vectors
+                start = nkeep
+                H[:nkeep,:nkeep] = np.diag(theta[:nkeep])
+                H[nkeep:nkeep+bsize,:nkeep] = S[:,:nkeep]
+                for k in range(bsize):
+                    self.Vm[nkeep+k].copyValues(self.Vm[nproj+k])
+                    self.MVm[nkeep+k].copyValues(self.MVm[nproj+k])
+                for k in range(nkeep):
+                    self.Vm[k].copyValues(Y[k])
+                    self.MVm[k].copyValues(MY[k])
+            nlocked = nconv
+
+        return Z.T, omega, nproj + bsize, nconv
+
+    @_profiled
+    def blockLanczos(self, Vm, sigma, bsize, H, start=0):
+        '''
+        Build an M-orthogonal block Lanczos subspace using full
+        orthogonalization. The shift-invert solves and the
+        mass-matrix products are performed on blocks of vectors so
+        that the structural backend can use multiple right-hand-side
+        solves. Each block is orthogonalized with two passes of
+        classical Gram-Schmidt using the stored products M*V.
+
+        When start > 0, the vectors Vm[:start+bsize] and their
+        products MVm[:start+bsize] must already be M-orthonormal and
+        H[:start+bsize,:start] must contain the projected matrix for
+        the retained vectors.
+
+        Input:
+        Vm:     list of vectors
+        sigma:  estimate of the first natural frequency
+        bsize:  the block size
+        H:      the projected matrix
+        start:  the index of the block to start from
+
+        Output:
+        Vm:     an M-orthogonal subspace
+        H:      the projected matrix
+        nproj:  the size of the projected problem
+        '''
+
+        # Allocate the vectors that store the products M*V
+        if self.MVm is None:
+            self.MVm = []
+        for k in range(len(self.MVm), len(Vm)):
+            self.MVm.append(self.struct.createVec())
+        MVm = self.MVm
+
+        # Factor the stiffness matrix (K - sigma*M)
+        self.struct.factorShift(sigma)
+
+        if start == 0:
+            # Apply the boundary conditions and M-orthonormalize the
+            # initial block
+            for k in range(bsize):
+                self.struct.applyBCs(Vm[k])
+            self.struct.multMVecs(Vm[:bsize], MVm[:bsize])
+            self.orthonormalizeBlock(Vm, MVm, 0, bsize)
+
+        # Execute the orthogonalization
+        i = start
+        while i + 2*bsize <= len(Vm):
+            # Compute V[i+b:i+2b] = (K - sigma*M)^{-1}*M*V[i:i+b]
+            self.struct.solveShiftVecs(MVm[i:i+bsize],
+                                       Vm[i+bsize:i+2*bsize])
+            self.nsubspace_solves += bsize
+            for k in range(i+bsize, i+2*bsize):
+                self.struct.applyBCs(Vm[k])
+            self.struct.multMVecs(Vm[i+bsize:i+2*bsize],
+                                  MVm[i+bsize:i+2*bsize])
+
+            # Orthogonalize the new block and store the coefficients
+            h, R = self.orthonormalizeBlock(Vm, MVm, i+bsize, bsize)
+            H[:i+bsize,i:i+bsize] = h
+            H[i+bsize:i+2*bsize,i:i+bsize] = R
+
+            i += bsize
+
+        return i
+
+    def orthonormalizeBlock(self, Vm, MVm, i, bsize):
+        '''
+        M-orthonormalize the block Vm[i:i+bsize] against Vm[:i] and
+        within the block using two passes of classical Gram-Schmidt.
+        The products MVm are updated alongside the vectors. Vectors
+        that become linearly dependent are replaced by random vectors.
+
+        Output:
+        h:      the coefficients against Vm[:i]
+        R:      the upper triangular coefficients within the block
+        '''
+
+        h = np.zeros((i, bsize))
+        R = np.zeros((bsize, bsize))
+        for c in range(bsize):
+            v = Vm[i+c]
+            mv = MVm[i+c]
+            for npass in range(2):
+                if npass == 0:
+                    vnorm0 = np.sqrt(abs(v.dot(mv)))
+
+                # Orthogonalize against the previous vectors
+                hc = np.zeros(i+c)
+                for j in range(i+c):
+                    hc[j] = Vm[j].dot(mv)
+                for j in range(i+c):
+                    v.axpy(-hc[j], Vm[j])
+                    mv.axpy(-hc[j], MVm[j])
+                h[:,c] += hc[:i]
+                R[:c,c] += hc[i:]
+
+            # Normalize the vector
+            vnorm = np.sqrt(abs(v.dot(mv)))
+            if vnorm <= 1e-10*vnorm0 or vnorm == 0.0:
+                # Replace the vector with a random vector that is
+                # orthogonal to the previous vectors
+                v.setRand(-1.0, 1.0)
+                self.struct.applyBCs(v)
+                self.struct.multM(v, mv)
+                for npass in range(2):
+                    for j in range(i+c):
+                        hj = Vm[j].dot(mv)
+                        v.axpy(-hj, Vm[j])
+                        mv.axpy(-hj, MVm[j])
+                vnorm = np.sqrt(abs(v.dot(mv)))
+                v.scale(1.0/vnorm)
+                mv.scale(1.0/vnorm)
+            else:
+                R[c,c] = vnorm
+                v.scale(1.0/vnorm)
+                mv.scale(1.0/vnorm)
+
+        return h, R
+
+    def computeModeWash(self, vec):
+        '''
+        Transfer a structural vector to the aerodynamic surface and
+        compute the normal wash on the aerodynamic mesh.
+
+        Output:
+        disp:   the surface displacements
+        vwash:  the normal wash due to the velocity
+        dwash:  the normal wash due to the displacement
+        '''
+
+        # Transfer the vector to the aerodynamic surface
+        disp = self.struct.transferDisps(vec)
+
+        # Compute the normal wash on the aerodynamic mesh
+        vwash, dwash = self.getModeBCs(disp.reshape(self.nnodes, 3))
+
+        return disp, vwash, dwash
+
+    def createJDVec(self):
+        '''Create a complex vector for the Jacobi--Davidson method'''
+        return JDVec(self.struct.createVec(), self.struct.createVec())
+
+    def addSubspaceVectors(self, vecs, tol=1e-8):
+        '''
+        Add the vectors to the M-orthonormal subspace stored in Qm and
+        update the reduced stiffness matrix Kr and the reduced surface
+        modes and normal wash. Each vector is orthogonalized twice
+        against the subspace with classical Gram-Schmidt. Vectors that
+        are linearly dependent on the subspace are discarded.
+
+        Output:
+        nadded:  the number of vectors added to the subspace
+        '''
+
+        nadded = 0
+        for vec in vecs:
+            # Copy the vector so that the subspace owns it
+            q = self.struct.createVec()
+            q.copyValues(vec)
+            self.struct.applyBCs(q)
+
+            self.struct.multM(q, self.temp)
+            qnorm0 = np.sqrt(abs(q.dot(self.temp)))
+            if qnorm0 == 0.0:
+                continue
+
+            # Orthogonalize twice against the subspace
+            for k in range(2):
+                self.struct.multM(q, self.temp)
+                h = [qj.dot(self.temp) for qj in self.Qm]
+                for j in range(len(self.Qm)):
+                    q.axpy(-h[j], self.Qm[j])
+
+            self.struct.multM(q, self.temp)
+            qnorm = np.sqrt(abs(q.dot(self.temp)))
+            if qnorm < tol*qnorm0:
+                continue
+            q.scale(1.0/qnorm)
+            self.Qm.append(q)
+            nadded += 1
+
+            # Add the row/column to the reduced stiffness matrix
+            n = len(self.Qm)
+            self.struct.multK(q, self.temp)
+            Kr = np.zeros((n, n))
+            Kr[:n-1,:n-1] = self.Kr
+            for j in range(n):
+                Kr[j,n-1] = self.Qm[j].dot(self.temp)
+                Kr[n-1,j] = Kr[j,n-1]
+            self.Kr = Kr
+
+            # Add the surface displacement and normal wash
+            disp, vk, dk = self.computeModeWash(q)
+            self.Qm_modes = np.column_stack((self.Qm_modes, disp))
+            self.Qm_vwash = np.column_stack((self.Qm_vwash, vk))
+            self.Qm_dwash = np.column_stack((self.Qm_dwash, dk))
+
+        if nadded > 0:
+            self.aero_cache = {}
+
+        return nadded
+
+    def restartSubspace(self, C):
+        '''
+        Replace the subspace Qm with Qm*C, where C has orthonormal
+        columns so that the new subspace is still M-orthonormal. The
+        reduced matrices are updated without any new full-order
+        products.
+        '''
+
+        Qm = []
+        for i in range(C.shape[1]):
+            q = self.struct.createVec()
+            for j in range(C.shape[0]):
+                q.axpy(C[j,i], self.Qm[j])
+            Qm.append(q)
+
+        self.Qm = Qm
+        self.Kr = np.dot(C.T, np.dot(self.Kr, C))
+        self.Qm_modes = np.dot(self.Qm_modes, C)
+        self.Qm_vwash = np.dot(self.Qm_vwash, C)
+        self.Qm_dwash = np.dot(self.Qm_dwash, C)
+        self.aero_cache = {}
+
+        return
+
+    def multFlutterMat(self, U, p, qinf, Mach, x, y, deriv=False):
+        '''
+        Compute the product of the full-order flutter matrix, or its
+        derivative w.r.t. p, with a complex vector:
+
+        T(p)*x = (p**2*M + K)*x + L^{T}*f(Cp(L*x))
+        T'(p)*x = 2*p*M*x + L^{T}*f(dCp/dp(L*x))
+
+        where L is the displacement transfer and f are the
+        aerodynamic forces. The factored AIC and its frequency
+        derivative are stored and reused while Im(p) is unchanged.
+        '''
+
+        from scipy.linalg import lu_factor, lu_solve
+
+        # Compute the structural contributions
+        if deriv:
+            y.zero()
+            alpha = 2.0*p
+        else:
+            self.struct.multK(x.xr, y.xr)
+            self.struct.multK(x.xc, y.xc)
+            alpha = p**2
+
+        self.struct.multM(x.xr, self.temp)
+        y.xr.axpy(alpha.real, self.temp)
+        y.xc.axpy(alpha.imag, self.temp)
+        self.struct.multM(x.xc, self.temp)
+        y.xc.axpy(alpha.real, self.temp)
+        y.xr.axpy(-alpha.imag, self.temp)
+
+        # Factor the AIC at the current frequency
+        key = (U, p.imag, Mach)
+        if self.jd_aic is None or self.jd_aic[0] != key:
+            self.computeInfluenceMatrix(U, p.imag, Mach, deriv=True)
+            self.addCount('aic_factorizations')
+            self.jd_aic = (key, lu_factor(self.Dtrans.T),
+                           np.array(self.dDtrans))
+        lu = self.jd_aic[1]
+        dDtrans = self.jd_aic[2]
+
+        # Compute the normal wash due to the real/complex parts
+        dr, vr, wr = self.computeModeWash(x.xr)
+        dc, vc, wc = self.computeModeWash(x.xc)
+        vwash = vr + 1j*vc
+        dwash = wr + 1j*wc
+
+        # Solve for the Cp or its derivative w.r.t. p
+        self.addCount('aic_solves')
+        Cp = lu_solve(lu, p*vwash/U + dwash)
+        if deriv:
+            self.addCount('aic_solves')
+            Cp = lu_solve(lu, vwash/U + 1j*np.dot(dDtrans.T, Cp))
+
+        # Compute the aerodynamic forces and transfer them to the
+        # structure
+        forces = np.zeros((self.nnodes, 3), dtype=np.complex)
+        dlm.addcpforces(qinf, Cp, self.X.T, self.conn.T, forces.T)
+
+        self.struct.transferLoads(forces.real.flatten(), self.temp)
+        y.xr.axpy(1.0, self.temp)
+        self.struct.transferLoads(forces.imag.flatten(), self.temp)
+        y.xc.axpy(1.0, self.temp)
+
+        self.struct.applyBCs(y.xr)
+        self.struct.applyBCs(y.xc)
+
+        return
+
+    def setShiftInvert(self, sigma):
+        '''
+        Factor the preconditioner K - sigma*M used by the
+        Jacobi--Davidson method. The structural backend keeps the
+        factorization while the shift is unchanged.
+        '''
+
+        self.struct.factorShift(sigma)
+        self.jd_sigma = sigma
+
+        return
+
+    def applyShiftInvert(self, x, y):
+        '''Apply the factored K - sigma*M to a complex vector'''
+
+        self.struct.solveShift(x.xr, y.xr)
+        self.struct.solveShift(x.xc, y.xc)
+        self.struct.applyBCs(y.xr)
+        self.struct.applyBCs(y.xc)
+
+        return
+
+    @_profiled
+    def solveFlutterJD(self, rho, Uval, Mach, nmodes, pinit=None,
+                       tol=1e-6, max_iters=20, max_size=None,
+                       gmres_iters=10, gmres_tol=1e-2, shift_tol=0.2):
+        '''
+        Solve the full-order nonlinear flutter eigenvalue problem
+
+        T(p)*u = (p**2*M + K)*u + L^{T}*f(Cp(L*u)) = 0
+
+        for the first nmodes modes using a Jacobi--Davidson method.
+        The subspace Qm from setUpSubspace is used as the initial
+        search space. At each iteration, the projected problem is
+        solved for all the modes with trackFlutterModes, and the
+        full-order residual r = T(p)*u is computed for each mode. For
+        the unconverged modes, the correction equation is solved
+        approximately with GMRES using the preconditioner
+        K - sigma*M with sigma = -Re(p**2). The real and imaginary
+        parts of each correction are added to the real M-orthonormal
+        search space, so that the projected problem retains the form
+        used elsewhere in this class.
+
+        When the subspace exceeds max_size, it is restarted with the
+        real and imaginary parts of the current eigenvectors of all
+        the modes, including the converged ones.
+
+        On exit, Qm, Kr and the reduced aerodynamic matrices hold the
+        enriched subspace, and can be used for further analysis.
+
+        Input:
+        rho:         the density
+        Uval:        the velocity
+        Mach:        the Mach number
+        nmodes:      the number of modes
+        pinit:       the initial estimates of the roots (optional)
+        tol:         the tolerance on ||T(p)*u||/||K*u||
+        max_iters:   the max. number of Jacobi--Davidson iterations
+        max_size:    the max. subspace size before a restart
+        gmres_iters: the max. number of GMRES iterations
+        gmres_tol:   the relative GMRES tolerance
+        shift_tol:   the relative change in the shift before the
+                     preconditioner is refactored
+
+        Output:
+        p:       the roots
+        res:     the relative residuals
+        '''
+
+        qinf = 0.5*rho*Uval**2
+
+        # The structural backend may have been factored with a
+        # different shift since the last call
+        self.jd_sigma = None
+
+        # Copy the subspace, since Qm may be the Lanczos vectors
+        self.Qm = list(self.Qm)
+        if max_size is None:
+            max_size = len(self.Qm) + 6*nmodes
+
+        # Create the correction operator and the GMRES object
+        corr = JDCorrection(self, Uval, qinf, Mach)
+        gmres = GMRES(corr, corr, gmres_iters, gmres_tol)
+        u = self.createJDVec()
+        r = self.createJDVec()
+        t = self.createJDVec()
+
+        # Solve the initial projected problem
+        pvals, vecs = self.trackFlutterModes(rho, [Uval], Mach, nmodes,
+                                             pinit=pinit)
+        p = pvals[:,0]
+        Y = vecs[:,0,:]
+
+        res = np.zeros(nmodes)
+        if self.verbose:
+            print('%4s %4s %4s %15s %15s %10s %6s'%(
+                'Iter', 'Mode', 'Size', 'Re(p)', 'Im(p)', 'Res', 'GMRES'))
+
+        for i in range(max_iters):
+            new_vecs = []
+            for k in range(nmodes):
+                # Form the eigenvector estimate u = Qm*y
+                u.zero()
+                for j in range(len(self.Qm)):
+                    u.xr.axpy(Y[k,j].real, self.Qm[j])
+                    u.xc.axpy(Y[k,j].imag, self.Qm[j])
+                u.scale(1.0/np.sqrt(u.dot(u).real))
+
+                # Compute the residual and its relative size
+                self.multFlutterMat(Uval, p[k], qinf, Mach, u, r)
+                self.struct.multK(u.xr, self.temp)
+                knorm = self.temp.dot(self.temp)
+                self.struct.multK(u.xc, self.temp)
+                knorm = np.sqrt(knorm + self.temp.dot(self.temp))
+                res[k] = np.sqrt(r.dot(r).real)/knorm
+
+                niters = 0
+                if res[k] >= tol:
+                    # Solve the correction equation with -r as the
+                    # right-hand-side
+                    sigma = -(p[k]**2).real
+                    if (self.jd_sigma is None or
+                        abs(sigma - self.jd_sigma) > shift_tol*abs(sigma)):
+                        self.setShiftInvert(sigma)
+                    corr.setVectors(p[k], u)
+                    r.scale(-1.0)
+                    niters = gmres.solve(r, t)
+
+                    for x in [t.xr, t.xc]:
+                        vec = self.struct.createVec()
+                        vec.copyValues(x)
+                        new_vecs.append(vec)
+
+                self.logIteration('solveFlutterJD', iteration=i, mode=k,
+                                  size=len(self.Qm), p=p[k], res=res[k],
+                                  gmres_iters=niters)
+                if self.verbose:
+                    print('%4d %4d %4d %15.10f %15.10f %10.3e %6d'%(
+                        i, k, len(self.Qm), p[k].real, p[k].imag, res[k],
+                        niters))
+
+            if len(new_vecs) == 0:
+                break
+
+            # Restart with the current eigenvectors of all the modes
+            if len(self.Qm) + len(new_vecs) > max_size:
+                C, svals, Wh = np.linalg.svd(
+                    np.column_stack((Y.real.T, Y.imag.T)), full_matrices=False)
+                C = C[:,svals > 1e-12*svals[0]]
+                self.restartSubspace(C)
+                Y = np.dot(Y, C)
+
+            # Expand the subspace and solve the projected problem
+            self.addSubspaceVectors(new_vecs)
+            Z = np.zeros((nmodes, len(self.Qm)), dtype=np.complex)
+            Z[:,:Y.shape[1]] = Y
+            pvals, vecs = self.trackFlutterModes(rho, [Uval], Mach, nmodes,
+                                                 pinit=p, zinit=Z)
+            p = pvals[:,0]
+            Y = vecs[:,0,:]
+
+        return p, res
+
     def computeFrozenDeriv(self, rho, Uval, Mach, p, 
                            num_design_vars, ortho_check=True):
         '''
@@ -1150,11 +2840,12 @@ class DLM:
         the eigenvalue closest to zero.
         '''
 
-        # Evaluate the flutter matrix
+        # Evaluate the flutter matrix and its derivative w.r.t. p
         qinf = 0.5*rho*Uval**2
-        Fr = self.computeFlutterMat(Uval, p, qinf, Mach, len(self.Qm), 
-                                    self.Kr, self.Qm_vwash, self.Qm_dwash, 
-                                    self.Qm_modes)
+        Fr, dFdp = self.computeFlutterMatDeriv(Uval, p, qinf, Mach,
+                                               len(self.Qm), self.Kr,
+                                               self.Qm_vwash, self.Qm_dwash, 
+                                               self.Qm_modes)
 
         # Duplicate the values stored in the matrix Fr
         Fr_destroyed = np.array(Fr)
@@ -1174,24 +2865,24 @@ class DLM:
 
         # Using the eigenvectors compute the real/complex left
         # eigenvectors
-        vr = self.tacs.createVec()
-        vc = self.tacs.createVec()
+        vr = self.struct.createVec()
+        vc = self.struct.createVec()
         for i in range(m):
             vr.axpy(zl[i].real, self.Qm[i])
             vc.axpy(zl[i].imag, self.Qm[i])
 
         # Compute the linear combination for the right eigenvector
-        ur = self.tacs.createVec()
-        uc = self.tacs.createVec()
+        ur = self.struct.createVec()
+        uc = self.struct.createVec()
         for i in range(m):
             ur.axpy(zr[i].real, self.Qm[i])
             uc.axpy(zr[i].imag, self.Qm[i])
 
         # Do an error check here - is this any good???
         if ortho_check:
-            self.mmat.mult(vr, self.temp)
+            self.struct.multM(vr, self.temp)
             err = ur.dot(self.temp) + 1j*self.temp.dot(uc)
-            self.mmat.mult(vc, self.temp)
+            self.struct.multM(vc, self.temp)
             err += uc.dot(self.temp) + 1j*self.temp.dot(ur)
             err -= 1.0
             print('Orthogonality error ', err)
@@ -1201,33 +2892,23 @@ class DLM:
         krc = np.zeros(num_design_vars)
         kcr = np.zeros(num_design_vars)        
         kcc = np.zeros(num_design_vars)
-        mtype = TACS.PY_STIFFNESS_MATRIX
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vr, ur, krr)
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vc, ur, kcr)
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vr, uc, krc)
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vc, uc, kcc)
+        mtype = 'stiffness'
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vr, ur, krr)
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vc, ur, kcr)
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vr, uc, krc)
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vc, uc, kcc)
 
         # Compute all of the derivatives
         mrr = np.zeros(num_design_vars)
         mrc = np.zeros(num_design_vars)
         mcr = np.zeros(num_design_vars)        
         mcc = np.zeros(num_design_vars)
-        mtype = TACS.PY_MASS_MATRIX
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vr, ur, mrr)
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vc, ur, mcr)
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vr, uc, mrc)
-        self.tacs.addMatDVSensInnerProduct(1.0, mtype, vc, uc, mcc)
+        mtype = 'mass'
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vr, ur, mrr)
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vc, ur, mcr)
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vr, uc, mrc)
+        self.struct.addMatDVSensInnerProduct(1.0, mtype, vc, uc, mcc)
         
-        # Evaluate the (approximate) derivative of F(p) w.r.t. p
-        dh = 1e-5
-        F1 = self.computeFlutterMat(Uval, p + dh, qinf, Mach, len(self.Qm), 
-                                    self.Kr, self.Qm_vwash, self.Qm_dwash, 
-                                    self.Qm_modes)
-        F2 = self.computeFlutterMat(Uval, p - dh, qinf, Mach, len(self.Qm), 
-                                    self.Kr, self.Qm_vwash, self.Qm_dwash, 
-                                    self.Qm_modes)
-        dFdp = 0.5*((F1.real - F2.real)/dh + 1j*(F1.imag - F2.imag)/dh)
-
         # Compute the inner product of the left and right reduced
         # eigenvectors
         fact = np.dot(zl.conjugate(), np.dot(dFdp, zr))
@@ -1238,6 +2919,7 @@ class DLM:
 
         return deriv
 
+    @_profiled
     def computeFlutterMode(self, rho, Uval, Mach, 
                            kmode, pinit=None, 
                            max_iters=20, tol=1e-12):
@@ -1260,11 +2942,11 @@ class DLM:
 
         # Compute the flutter determinant
         det1 = self.computeFlutterDet(Uval, p1, qinf, Mach,
-                                      len(self.Qm), self.Kr,
+                                      self.Kr.shape[0], self.Kr,
                                       self.Qm_vwash, self.Qm_dwash, 
                                       self.Qm_modes, self.omega[kmode])
         det2 = self.computeFlutterDet(Uval, p2, qinf, Mach,
-                                      len(self.Qm), self.Kr,
+                                      self.Kr.shape[0], self.Kr,
                                       self.Qm_vwash, self.Qm_dwash, 
                                       self.Qm_modes, self.omega[kmode])
 
@@ -1281,25 +2963,29 @@ class DLM:
             # Move pnew to p2 and compute pnew
             p2 = 1.0*pnew
             det2 = self.computeFlutterDet(Uval, p2, qinf, Mach,
-                                          len(self.Qm), self.Kr,
+                                          self.Kr.shape[0], self.Kr,
                                           self.Qm_vwash, self.Qm_dwash, 
                                           self.Qm_modes, self.omega[kmode])
                     
             # Print out the iteration history for impaitent people
-            if k == 0:
-                print('%4s %10s %15s %15s'%(
-                    'Iter', 'Det', 'Re(p)', 'Im(p)'))
-            print('%4d %10.2e %15.10f %15.10f'%(
-                k, abs(det2), p2.real, p2.imag))
+            self.logIteration('computeFlutterMode', iteration=k,
+                              mode=kmode, det=abs(det2), p=p2)
+            if self.verbose:
+                if k == 0:
+                    print('%4s %10s %15s %15s'%(
+                        'Iter', 'Det', 'Re(p)', 'Im(p)'))
+                print('%4d %10.2e %15.10f %15.10f'%(
+                    k, abs(det2), p2.real, p2.imag))
 
             if abs(det2) < tol*abs(det0):
                 break
 
         return p2
 
+    @_profiled
     def computeFlutterModeEig(self, rho, Uval, Mach, 
                               kmode, pinit=None, 
-                              max_iters=20, tol=1e-8, dh=1e-5):
+                              max_iters=20, tol=1e-8):
         '''
         Given the density, velocity, and Mach number, compute the
         frequency/damping of the k-th flutter mode using an eigenvalue
@@ -1312,6 +2998,9 @@ class DLM:
 
         eig_{k}(F(p)) = 0
         d(eig_{k})/dp = - zl^{H}*dF/dp*zr
+
+        The flutter matrix and its analytic derivative dF/dp are
+        computed from a single factorization of the AIC.
         '''
 
         # Provide an initial estimate of the frequency
@@ -1324,17 +3013,18 @@ class DLM:
         qinf = 0.5*rho*Uval**2
 
         # Allocate space fot the eigenvalue problem
-        m = len(self.Qm)
+        m = self.Kr.shape[0]
         eigs = np.zeros(m, dtype=np.complex) 
         Zl = np.zeros((m, m), dtype=np.complex) 
         Zr = np.zeros((m, m), dtype=np.complex) 
 
         # Iterate until convergence
         for i in range(max_iters):
-            # Compute the flutter matrix at the current point
-            F1 = self.computeFlutterMat(Uval, p, qinf, Mach,
-                                        m, self.Kr, self.Qm_vwash, 
-                                        self.Qm_dwash, self.Qm_modes)
+            # Compute the flutter matrix and its derivative at the
+            # current point
+            F1, dFdp = self.computeFlutterMatDeriv(Uval, p, qinf, Mach,
+                                                   m, self.Kr, self.Qm_vwash, 
+                                                   self.Qm_dwash, self.Qm_modes)
             
             # Solve the eigenvalue problem
             dlm.alleigvecs((F1.transpose()).T, eigs, Zl.T, Zr.T)
@@ -1348,11 +3038,14 @@ class DLM:
             k = np.argsort(abs(eigs))[kmode]
 
             # Print out the iteration history for impaitent people
-            if i == 0:
-                print('%4s %10s %15s %15s'%(
-                    'Iter', 'Eig', 'Re(p)', 'Im(p)')) 
-            print('%4d %10.2e %15.10f %15.10f'%(
-                i, abs(eigs[k]), p.real, p.imag))
+            self.logIteration('computeFlutterModeEig', iteration=i,
+                              mode=kmode, eig=abs(eigs[k]), p=p)
+            if self.verbose:
+                if i == 0:
+                    print('%4s %10s %15s %15s'%(
+                        'Iter', 'Eig', 'Re(p)', 'Im(p)'))
+                print('%4d %10.2e %15.10f %15.10f'%(
+                    i, abs(eigs[k]), p.real, p.imag))
 
             if abs(eigs[k]) < tol:
                 return p
@@ -1361,12 +3054,6 @@ class DLM:
             zl = Zl[k,:]
             zr = Zr[k,:]
 
-            # Compute the derivative of the flutter matrix w.r.t. p
-            F2 = self.computeFlutterMat(Uval, p + dh, qinf, Mach,
-                                        m, self.Kr, self.Qm_vwash, 
-                                        self.Qm_dwash, self.Qm_modes)
-            dFdp = (F2 - F1)/dh
-            
             # Compute the derivative of the eigenvalue
             deigdp = np.dot(zl.conjugate(), np.dot(dFdp, zr)) 
 
@@ -1375,90 +3062,1107 @@ class DLM:
 
         return p
 
-    def velocitySweep(self, rho, Uvals, Mach, nmodes):
+    @_profiled
+    def solveFlutterPoint(self, rho, Uval, Mach, kmode, p1, p2,
+                          max_iters=50, tol=1e-6):
+        '''
+        Solve for the flutter root at a single velocity using the
+        secant (determinant) iteration starting from p1 and p2.
+
+        Output:
+        p:      the converged root
+        niters: the number of iterations
+        convrg: flag indicating whether the iteration converged
+        '''
+
+        qinf = 0.5*rho*Uval**2
+        nvecs = self.Kr.shape[0]
+
+        # Compute the flutter determinant
+        det1 = self.computeFlutterDet(Uval, p1, qinf, Mach,
+                                      nvecs, self.Kr,
+                                      self.Qm_vwash, self.Qm_dwash, 
+                                      self.Qm_modes, self.omega[kmode])
+        det2 = self.computeFlutterDet(Uval, p2, qinf, Mach,
+                                      nvecs, self.Kr,
+                                      self.Qm_vwash, self.Qm_dwash, 
+                                      self.Qm_modes, self.omega[kmode])
+
+        # Perform the flutter determinant iteration
+        det0 = 1.0*det1
+        for k in range(max_iters):
+            # Compute the new value of p
+            pnew = (p2*det1 - p1*det2)/(det1 - det2)
+
+            # Move p2 to p1
+            p1 = 1.0*p2
+            det1 = 1.0*det2
+
+            # Move pnew to p2 and compute pnew
+            p2 = 1.0*pnew
+            det2 = self.computeFlutterDet(Uval, p2, qinf, Mach,
+                                          nvecs, self.Kr,
+                                          self.Qm_vwash, self.Qm_dwash, 
+                                          self.Qm_modes, self.omega[kmode])
+
+            # Print out the iteration history for impaitent people
+            self.logIteration('solveFlutterPoint', iteration=k,
+                              mode=kmode, U=Uval, det=abs(det2), p=p2)
+            if self.verbose:
+                if k == 0:
+                    print('%4s %10s %10s %10s'%(
+                        'Iter', 'Det', 'Re(p)', 'Im(p)'))
+                print('%4d %10.2e %10.6f %10.6f'%(
+                    k, abs(det2), p2.real, p2.imag))
+
+            if abs(det2) < tol*abs(det0):
+                return p2, k+1, True
+
+        return p2, max_iters, False
+
+    def computeFlutterTangent(self, rho, Uval, Mach, p,
+                              F=None, dFdp=None, zl=None, zr=None):
+        '''
+        Compute the sensitivity of the root dp/dU using the implicit
+        function theorem applied to the eigenvalue of the flutter
+        matrix that is zero at the root:
+
+        dp/dU = -(zl^{H}*dF/dU*zr)/(zl^{H}*dF/dp*zr)
+
+        The aerodynamic contribution only depends on U through qinf
+        and the ratio p/U, F(p, U) = p**2*Ir + Kr + 0.5*rho*U**2*A(p/U),
+        so that
+
+        dF/dU = 2/U*(F - p**2*Ir - Kr) - p/U*(dF/dp - 2*p*Ir)
+
+        and no additional evaluations of the flutter matrix are
+        required beyond F and dF/dp. These, and the left/right
+        eigenvectors, can be passed in if they are already available.
+        '''
+
+        qinf = 0.5*rho*Uval**2
+        nvecs = self.Kr.shape[0]
+        I = np.eye(nvecs)
+
+        if F is None or dFdp is None:
+            F, dFdp = self.computeFlutterMatDeriv(Uval, p, qinf, Mach, nvecs,
+                                                  self.Kr, self.Qm_vwash,
+                                                  self.Qm_dwash, self.Qm_modes)
+
+        if zl is None or zr is None:
+            # Find the eigenvector associated with the eigenvalue
+            # closest to zero
+            eigs = np.zeros(nvecs, dtype=np.complex)
+            Zl = np.zeros((nvecs, nvecs), dtype=np.complex)
+            Zr = np.zeros((nvecs, nvecs), dtype=np.complex)
+            dlm.alleigvecs((F.transpose()).T, eigs, Zl.T, Zr.T)
+            k = np.argmin(abs(eigs))
+            zl = Zl[k,:]
+            zr = Zr[k,:]
+
+        # Compute the derivative of the flutter matrix w.r.t. U
+        dFdU = (2.0/Uval)*(F - p**2*I - self.Kr) - (p/Uval)*(dFdp - 2.0*p*I)
+
+        dpdU = -(np.dot(zl.conjugate(), np.dot(dFdU, zr))/
+                 np.dot(zl.conjugate(), np.dot(dFdp, zr)))
+
+        return dpdU
+
+    @_profiled
+    def correctFlutterRoot(self, rho, Uval, Mach, p,
+                           max_iters=10, tol=1e-6):
+        '''
+        Starting from a predicted root p, apply Newton's method to the
+        eigenvalue of the flutter matrix closest to zero. The
+        iteration stops once the relative Newton update is less than
+        tol. Since the convergence is quadratic, the error in the
+        final root is roughly tol**2. If the iteration converged, the
+        root sensitivity dp/dU is computed from the last flutter
+        matrix, its derivative and the eigenvectors without any further
+        evaluations. These are taken at the last iterate, which is
+        within tol*|p| of the returned root. Otherwise the last update
+        may be large, so the flutter matrix is evaluated once more at
+        the returned root to compute dp/dU.
+
+        Output:
+        p:      the root
+        dpdU:   the sensitivity of the root w.r.t. U
+        niters: the number of Newton iterations
+        convrg: flag indicating whether the iteration converged
+        '''
+
+        qinf = 0.5*rho*Uval**2
+        nvecs = self.Kr.shape[0]
+
+        eigs = np.zeros(nvecs, dtype=np.complex)
+        Zl = np.zeros((nvecs, nvecs), dtype=np.complex)
+        Zr = np.zeros((nvecs, nvecs), dtype=np.complex)
+
+        convrg = False
+        for i in range(max_iters):
+            F, dFdp = self.computeFlutterMatDeriv(Uval, p, qinf, Mach, nvecs,
+                                                  self.Kr, self.Qm_vwash,
+                                                  self.Qm_dwash, self.Qm_modes)
+
+            # Find the eigenvalue closest to zero
+            dlm.alleigvecs((F.transpose()).T, eigs, Zl.T, Zr.T)
+            k = np.argmin(abs(eigs))
+            zl = Zl[k,:]
+            zr = Zr[k,:]
+
+            # Compute the derivative of the eigenvalue
+            deigdp = (np.dot(zl.conjugate(), np.dot(dFdp, zr))/
+                      np.dot(zl.conjugate(), zr))
+
+            # Apply Newton's method
+            dp = -eigs[k]/deigdp
+            plast = p
+            p = p + dp
+
+            if abs(dp) < tol*abs(p):
+                convrg = True
+                break
+
+        # Compute the tangent at the last iterate if it is close to the
+        # root, otherwise at the returned root
+        if convrg:
+            dpdU = self.computeFlutterTangent(rho, Uval, Mach, plast,
+                                              F, dFdp, zl, zr)
+        else:
+            dpdU = self.computeFlutterTangent(rho, Uval, Mach, p)
+
+        return p, dpdU, i+1, convrg
+
+    @_profiled
+    def sweepMode(self, rho, Uvals, Mach, kmode, predictor='poly',
+                  results=None):
+        '''
+        Trace the root of the k-th mode through the velocities in
+        Uvals.
+
+        With predictor='poly', the initial guess at each velocity is
+        extrapolated from the roots at the previous velocities and
+        the root is found with the secant iteration.
+
+        With predictor='tangent', the initial guess is formed from the
+        root sensitivity dp/dU (a Hermite extrapolation once two
+        tangents are available) and the root is corrected with
+        Newton's method, which typically converges in one or two
+        iterations.
+
+        If a SweepResults store is given, each root is appended to it.
+        The points that already converged in the store are not
+        recomputed and their roots are used to predict the next
+        points. The store is checked against the fingerprint of this
+        model.
+        '''
+
+        nvals = len(Uvals)
+        pvals = np.zeros(nvals, dtype=np.complex)
+        dpdU = np.zeros(nvals, dtype=np.complex)
+
+        if results is not None:
+            results.setModel(self.getModelFingerprint())
+
+        eps = 1e-3
+        for i in range(nvals):
+            # Use the stored root if this point converged
+            if results is not None:
+                rec = results.getRecord(kmode, rho, Mach, Uvals[i])
+                if rec is not None and rec['converged']:
+                    pvals[i] = rec['p']
+                    dpdU[i] = rec['dpdU']
+                    continue
+
+            # Compute an estimate of p based on the lowest natural
+            # frequency
+            if i == 0:
+                p1 = -0.1 + 1j*self.omega[kmode]
+            elif predictor == 'tangent':
+                # Predict the root from the tangent to the root path
+                h = Uvals[i] - Uvals[i-1]
+                p1 = pvals[i-1] + h*dpdU[i-1]
+                if i >= 2:
+                    d2 = (dpdU[i-1] - dpdU[i-2])/(Uvals[i-1] - Uvals[i-2])
+                    p1 += 0.5*h**2*d2
+            elif i == 1:
+                p1 = 1.0*pvals[0]
+
+            # The following code tries to extrapolate the next
+            # point
+            elif i == 2:
+                p1 = 2.0*pvals[i-1] - pvals[i-2]
+            else: 
+                p1 = 3.0*pvals[i-1] - 3.0*pvals[i-2] + pvals[i-3]
+
+            t0 = time.time()
+            if predictor == 'tangent':
+                if i == 0:
+                    # Use the secant method to find the first root
+                    p1, niters, convrg = self.solveFlutterPoint(
+                        rho, Uvals[i], Mach, kmode, p1, p1 + (eps + 1j*eps))
+                pvals[i], dpdU[i], niters, convrg = self.correctFlutterRoot(
+                    rho, Uvals[i], Mach, p1)
+                if not convrg:
+                    # Fall back to the secant iteration
+                    pvals[i], niters, convrg = self.solveFlutterPoint(
+                        rho, Uvals[i], Mach, kmode, p1, p1 + (eps + 1j*eps))
+                    dpdU[i] = self.computeFlutterTangent(rho, Uvals[i], Mach,
+                                                         pvals[i])
+            else:
+                # Store the final value of p
+                p2 = p1 + (eps + 1j*eps)
+                pvals[i], niters, convrg = self.solveFlutterPoint(
+                    rho, Uvals[i], Mach, kmode, p1, p2)
+
+            self.logIteration('sweepMode', mode=kmode, U=Uvals[i],
+                              p=pvals[i], niters=niters, converged=convrg,
+                              time=time.time() - t0)
+            if results is not None:
+                results.append(kmode, rho, Mach, Uvals[i], pvals[i],
+                               dpdU[i], niters, convrg, time.time() - t0)
+
+        if results is not None:
+            results.flush()
+
+        if self.verbose:
+            print('%4s %10s %10s %10s'%(
+                'Mode', 'U', 'Re(p)', 'Im(p)'))
+            for i in range(nvals):
+                print('%4d %10.6f %10.6f %10.6f'%(
+                    kmode, Uvals[i], pvals[i].real, pvals[i].imag))
+
+        return pvals
+
+    @_profiled
+    def velocitySweep(self, rho, Uvals, Mach, nmodes, nprocs=1,
+                      predictor='poly', results=None):
         '''
         Use the basis stored in Qm to perform a sweep of the
-        velocities.
+        velocities. Each mode only depends on the roots at its own
+        previous velocities, so the modes can be swept concurrently in
+        a process pool. The read-only reduced matrices Kr, Qm_vwash,
+        Qm_dwash and Qm_modes are passed to the workers through shared
+        memory.
+
+        Input:
+        rho:     the density
+        Uvals:   the array of velocities
+        Mach:    the Mach number
+        nmodes:  the number of modes to trace
+        nprocs:  the number of processes (1 = serial sweep)
+        predictor: 'poly' or 'tangent', see sweepMode
+        results: a SweepResults store, or the directory name of a
+                 store, to which the computed points are streamed.
+                 A sweep that is restarted with the same store skips
+                 the converged points. The store must not hold
+                 results for a different model.
+
+        Output:
+        pvals:   the roots for each mode and velocity
         '''
 
+        # Open the results store and check that it belongs to this
+        # model
+        if results is not None and not isinstance(results, SweepResults):
+            results = SweepResults(results)
+        if results is not None:
+            results.setModel(self.getModelFingerprint())
+
         # Allocate the eigenvalue at all iterations
         nvals = len(Uvals)
         pvals = np.zeros((nmodes, nvals), dtype=np.complex)
 
-        # Now, evalue the flutter determinant at all iterations
-        for kmode in range(nmodes):
-            for i in range(nvals):
-                qinf = 0.5*rho*Uvals[i]**2
-    
-                # Compute an estimate of p based on the lowest natural
-                # frequency
-                if i == 0:
-                    eps = 1e-3
-                    p1 = -0.1 + 1j*self.omega[kmode]
-                    p2 = p1 + (eps + 1j*eps)
-                elif i == 1:
-                    eps = 1e-3
-                    p1 = 1.0*pvals[kmode,0]
-                    p2 = p1 + (eps + 1j*eps)
-
-                # The following code tries to extrapolate the next
-                # point
-                elif i == 2:
-                    eps = 1e-3
-                    p1 = 2.0*pvals[kmode,i-1] - pvals[kmode,i-2]
-                    p2 = p1 + (eps + 1j*eps)
-                else: 
-                    eps = 1e-3
-                    p1 = (3.0*pvals[kmode,i-1] - 
-                          3.0*pvals[kmode,i-2] + pvals[kmode,i-3])
-                    p2 = p1 + (eps + 1j*eps)
-
-                # Compute the flutter determinant
-                det1 = self.computeFlutterDet(Uvals[i], p1, qinf, Mach,
-                                              len(self.Qm), self.Kr,
-                                              self.Qm_vwash, self.Qm_dwash, 
-                                              self.Qm_modes, self.omega[kmode])
-                det2 = self.computeFlutterDet(Uvals[i], p2, qinf, Mach,
-                                              len(self.Qm), self.Kr,
-                                              self.Qm_vwash, self.Qm_dwash, 
-                                              self.Qm_modes, self.omega[kmode])
-
-                # Perform the flutter determinant iteration
-                max_iters = 50
-                det0 = 1.0*det1
-                for k in range(max_iters):
-                    # Compute the new value of p
-                    pnew = (p2*det1 - p1*det2)/(det1 - det2)
-
-                    # Move p2 to p1
-                    p1 = 1.0*p2
-                    det1 = 1.0*det2
-
-                    # Move pnew to p2 and compute pnew
-                    p2 = 1.0*pnew
-                    det2 = self.computeFlutterDet(U[i], p2, qinf, Mach,
-                                                  len(self.Qm), self.Kr,
-                                                  self.Qm_vwash, self.Qm_dwash, 
-                                                  self.Qm_modes, self.omega[kmode])
-                    
-                    # Print out the iteration history for impaitent people
-                    if k == 0:
-                        print('%4s %10s %10s %10s'%(
-                            'Iter', 'Det', 'Re(p)', 'Im(p)'))
-                    print('%4d %10.2e %10.6f %10.6f'%(
-                        k, abs(det2), p2.real, p2.imag))
+        if nprocs <= 1 or nmodes <= 1:
+            for kmode in range(nmodes):
+                pvals[kmode,:] = self.sweepMode(rho, Uvals, Mach, kmode,
+                                                predictor, results)
+            return pvals
+
+        # The workers open the store in the same directory and write
+        # their own chunks
+        path = None
+        if results is not None:
+            results.flush()
+            path = results.path
+
+        # Create the pool and sweep the modes
+        pool, shared = self.createAeroPool(min(nprocs, nmodes))
+        try:
+            args = [(rho, Uvals, Mach, kmode, predictor, path)
+                    for kmode in range(nmodes)]
+            for kmode, vals, profile, log in pool.imap_unordered(
+                    _sweepModeWorker, args):
+                pvals[kmode,:] = vals
+                self.mergeWorkerProfile(profile, log)
+        finally:
+            self.destroyAeroPool(pool, shared)
+
+        # Read the records written by the workers
+        if results is not None:
+            results.load()
 
-                    if abs(det2) < 1e-6*abs(det0):
-                        break
+        # Return the final values
+        return pvals
 
-                # Store the final value of p
-                pvals[kmode, i] = p2
+    @_profiled
+    def trackFlutterModes(self, rho, Uvals, Mach, nmodes,
+                          max_iters=20, tol=1e-6, mac_tol=0.8,
+                          pinit=None, zinit=None, flutter_mat=None):
+        '''
+        Trace the roots of the first nmodes modes through the
+        velocities in Uvals, advancing all the modes together. Each
+        mode carries its root and its left and right eigenvectors
+        from one velocity to the next.
+
+        At each iteration, every unconverged mode takes a Newton step
+        on an eigenvalue of F(p) selected by the modal assurance
+        criterion (MAC) with the previous eigenvectors, instead of the
+        eigenvalue with the k-th smallest magnitude. The eigenvectors
+        of F(p) are assigned one-to-one to all the traced modes such
+        that the total MAC is maximized, and the mode takes the
+        eigenvector assigned to it. This prevents two modes from
+        selecting the same eigenvector. Since the AIC depends on
+        Im(p), F(p) is evaluated at the root of each unconverged mode,
+        so each iteration requires one evaluation and
+        eigendecomposition per unconverged mode. The root at the next
+        velocity is predicted from the tangent dp/dU, which is
+        computed from the converged eigenvectors without further
+        evaluations.
+
+        Input:
+        rho:       the density
+        Uvals:     the array of velocities
+        Mach:      the Mach number
+        nmodes:    the number of modes to trace
+        max_iters: the max. number of Newton iterations per velocity
+        tol:       the relative tolerance on the Newton update
+        mac_tol:   a warning is printed if the MAC between velocities
+                   drops below this value
+        pinit:     the initial roots (None to start from the
+                   structural frequencies)
+        zinit:     the initial right eigenvectors, shape (nmodes, nvecs)
+        flutter_mat: a function flutter_mat(U, p, qinf) returning F(p)
+                   and dF/dp (None to use computeFlutterMatDeriv)
 
+        Output:
+        pvals:     the roots for each mode and velocity
+        vecs:      the right eigenvectors, shape (nmodes, len(Uvals), nvecs)
+        '''
+
+        from scipy.optimize import linear_sum_assignment
+
+        nvals = len(Uvals)
+        nvecs = self.Kr.shape[0]
+        pvals = np.zeros((nmodes, nvals), dtype=np.complex)
+        vecs = np.zeros((nmodes, nvals, nvecs), dtype=np.complex)
+
+        eigs = np.zeros(nvecs, dtype=np.complex)
+        Zl = np.zeros((nvecs, nvecs), dtype=np.complex)
+        Zr = np.zeros((nvecs, nvecs), dtype=np.complex)
+
+        if flutter_mat is None:
+            def flutter_mat(U, p, qinf):
+                return self.computeFlutterMatDeriv(U, p, qinf, Mach, nvecs,
+                                                   self.Kr, self.Qm_vwash,
+                                                   self.Qm_dwash,
+                                                   self.Qm_modes)
+
+        # Initialize the modes from the structural eigenvectors
+        lam, Q = np.linalg.eigh(0.5*(self.Kr + self.Kr.T))
+        p = np.zeros(nmodes, dtype=np.complex)
+        zl = np.zeros((nmodes, nvecs), dtype=np.complex)
+        zr = np.zeros((nmodes, nvecs), dtype=np.complex)
+        dpdU = np.zeros(nmodes, dtype=np.complex)
+        for k in range(nmodes):
+            p[k] = -0.1 + 1j*np.sqrt(abs(lam[k]))
+            zl[k] = Q[:,k]
+            zr[k] = Q[:,k]
+        if pinit is not None:
+            p[:] = pinit
+        if zinit is not None:
+            zl[:] = zinit
+            zr[:] = zinit
+
+        for j in range(nvals):
+            qinf = 0.5*rho*Uvals[j]**2
+
+            # Predict the roots from the tangent
+            if j > 0:
+                p += (Uvals[j] - Uvals[j-1])*dpdU
+
+            # Advance all the modes together
+            active = np.ones(nmodes, dtype=bool)
+            mac = np.ones(nmodes)
+            zprev = zr.copy()
+            for i in range(max_iters):
+                for k in np.nonzero(active)[0]:
+                    F, dFdp = flutter_mat(Uvals[j], p[k], qinf)
+                    dlm.alleigvecs((F.transpose()).T, eigs, Zl.T, Zr.T)
+
+                    # Assign the eigenvectors one-to-one to the modes
+                    # by the MAC with the previous right eigenvectors
+                    # and select the one assigned to this mode
+                    macs = np.zeros((nvecs, nmodes))
+                    for l in range(nmodes):
+                        macs[:,l] = self.computeMAC(Zr, zprev[l])
+                    rows, cols = linear_sum_assignment(-macs)
+                    m = rows[np.nonzero(cols == k)[0][0]]
+                    mac[k] = macs[m,k]
+                    zl[k] = Zl[m,:]
+                    zr[k] = Zr[m,:]
+
+                    # Take the Newton step on the selected eigenvalue
+                    deigdp = (np.dot(zl[k].conjugate(), np.dot(dFdp, zr[k]))/
+                              np.dot(zl[k].conjugate(), zr[k]))
+                    dp = -eigs[m]/deigdp
+                    p[k] += dp
+
+                    if abs(dp) < tol*abs(p[k]):
+                        active[k] = False
+                        dpdU[k] = self.computeFlutterTangent(
+                            rho, Uvals[j], Mach, p[k], F, dFdp,
+                            zl[k], zr[k])
+
+                if not np.any(active):
+                    break
+
+            pvals[:,j] = p
+            vecs[:,j,:] = zr
+
+            self.logIteration('trackFlutterModes', U=Uvals[j], p=p.copy(),
+                              mac=mac.copy(), converged=~active)
+
+            for k in range(nmodes):
+                if active[k] and self.verbose:
+                    print('Mode %d failed to converge at U = %f'%(
+                        k, Uvals[j]))
+                if j > 0 and mac[k] < mac_tol and self.verbose:
+                    print('Mode %d MAC = %f at U = %f'%(
+                        k, mac[k], Uvals[j]))
+
+        if self.verbose:
             print('%4s %10s %10s %10s'%(
-                'Iter', 'U', 'Re(p)', 'Im(p)'))
-            print('%4d %10.6f %10.6f %10.6f'%(
-                i, U[i], pvals[kmode,i].real, pvals[kmode,i].imag))
+                'Mode', 'U', 'Re(p)', 'Im(p)'))
+            for k in range(nmodes):
+                for j in range(nvals):
+                    print('%4d %10.6f %10.6f %10.6f'%(
+                        k, Uvals[j], pvals[k,j].real, pvals[k,j].imag))
 
-        # Return the final values
-        return pvals
+        return pvals, vecs
+
+    def computeMAC(self, Z, z):
+        '''
+        Compute the modal assurance criterion between each row of Z
+        and the vector z:
+
+        MAC = |Z[i]^{H}*z|**2/((Z[i]^{H}*Z[i])*(z^{H}*z))
+        '''
+
+        num = abs(np.dot(Z.conjugate(), z))**2
+        den = np.sum(abs(Z)**2, axis=1)*np.dot(z.conjugate(), z).real
+
+        return num/den
+
+    def adaptiveVelocitySweep(self, rho, Umin, Umax, Mach, nmodes,
+                              dU=None, min_dU=None, max_dU=None,
+                              ptol=1e-2, Utol=1e-4, max_refine=20):
+        '''
+        Trace the roots of the first nmodes modes from Umin to Umax
+        with an adaptive velocity step and locate the velocities at
+        which the damping Re(p) changes sign.
+
+        The step is chosen so that the curvature of the root path
+        gives an estimated prediction error of ptol*|p|. If the secant
+        iteration fails to converge, the step is halved and the point
+        is recomputed. Once Re(p) changes sign between two points, the
+        crossing is refined with a safeguarded secant (Illinois)
+        iteration on Re(p(U)).
+
+        Input:
+        rho:        the density
+        Umin, Umax: the velocity range
+        Mach:       the Mach number
+        nmodes:     the number of modes to trace
+        dU:         the initial step size
+        min_dU:     the minimum step size
+        max_dU:     the maximum step size
+        ptol:       the relative prediction error used to set the step
+        Utol:       the relative tolerance on the crossing velocity
+        max_refine: the max. number of refinement iterations
+
+        Output:
+        crossings:  list of (kmode, U, omega, direction) where direction
+                    is +1 for a flutter onset and -1 for a recovery
+        nevals:     the number of flutter matrix evaluations
+        '''
+
+        if dU is None:
+            dU = (Umax - Umin)/20.0
+        if min_dU is None:
+            min_dU = 1e-3*(Umax - Umin)
+        if max_dU is None:
+            max_dU = 0.25*(Umax - Umin)
+
+        nevals0 = self.nflutter_evals
+        eps = 1e-3
+        crossings = []
+
+        for kmode in range(nmodes):
+            # Compute the root at the initial velocity
+            p1 = -0.1 + 1j*self.omega[kmode]
+            p, niters, convrg = self.solveFlutterPoint(
+                rho, Umin, Mach, kmode, p1, p1 + (eps + 1j*eps))
+            Us = [Umin]
+            ps = [p]
+            h = 1.0*dU
+
+            while Us[-1] < Umax:
+                Unew = min(Us[-1] + h, Umax)
+
+                # Predict the root by extrapolating the previous points
+                npts = min(len(Us), 3)
+                if npts == 1:
+                    p1 = ps[-1]
+                else:
+                    c = np.polyfit(Us[-npts:], ps[-npts:], npts-1)
+                    p1 = np.polyval(c, Unew)
+
+                p, niters, convrg = self.solveFlutterPoint(
+                    rho, Unew, Mach, kmode, p1, p1 + (eps + 1j*eps))
+
+                if not convrg and h > min_dU:
+                    # Step back and try again with a smaller step
+                    h = max(0.5*h, min_dU)
+                    continue
+
+                Us.append(Unew)
+                ps.append(p)
+
+                # Check for a change in the sign of the damping
+                if ps[-2].real*ps[-1].real <= 0.0 and ps[-2].real != ps[-1].real:
+                    Uf, pf = self.refineFlutterCrossing(
+                        rho, Mach, kmode, Us[-2], ps[-2], Us[-1], ps[-1],
+                        Utol, max_refine)
+                    direction = 1
+                    if ps[-1].real < ps[-2].real:
+                        direction = -1
+                    crossings.append((kmode, Uf, pf.imag, direction))
+                    self.logIteration('adaptiveVelocitySweep', mode=kmode,
+                                      U=Uf, omega=pf.imag,
+                                      direction=direction)
+                    if self.verbose:
+                        print('Mode %d crossing at U = %15.10f '
+                              'omega = %15.10f'%(kmode, Uf, pf.imag))
+
+                # Adjust the step based on the curvature of the path
+                if len(Us) >= 3:
+                    d1 = (ps[-1] - ps[-2])/(Us[-1] - Us[-2])
+                    d0 = (ps[-2] - ps[-3])/(Us[-2] - Us[-3])
+                    d2 = 2.0*abs(d1 - d0)/(Us[-1] - Us[-3])
+                    if d2 > 0.0:
+                        hnew = np.sqrt(2.0*ptol*abs(ps[-1])/d2)
+                    else:
+                        hnew = 2.0*h
+                    h = min(max(hnew, 0.5*h), 2.0*h)
+                h = min(max(h, min_dU), max_dU)
+
+        nevals = self.nflutter_evals - nevals0
+
+        return crossings, nevals
+
+    def refineFlutterCrossing(self, rho, Mach, kmode, Ua, pa, Ub, pb,
+                              Utol=1e-4, max_iters=20):
+        '''
+        Find the velocity where Re(p) = 0 between the bracketing points
+        (Ua, pa) and (Ub, pb) using the Illinois variant of the
+        regula-falsi method. Each new point is initialized by linear
+        interpolation of the root between the bracket.
+        '''
+
+        eps = 1e-3
+        Uf = 0.5*(Ua + Ub)
+        pf = 0.5*(pa + pb)
+        fa = pa.real
+        fb = pb.real
+        side = 0
+
+        for k in range(max_iters):
+            # Compute the new estimate of the crossing velocity
+            Uf = (Ua*fb - Ub*fa)/(fb - fa)
+
+            # Solve for the root at the new velocity
+            t = (Uf - Ua)/(Ub - Ua)
+            p1 = (1.0 - t)*pa + t*pb
+            pf, niters, convrg = self.solveFlutterPoint(
+                rho, Uf, Mach, kmode, p1, p1 + (eps + 1j*eps))
+
+            if abs(Ub - Ua) < Utol*abs(Uf) or pf.real == 0.0:
+                break
+
+            # Update the bracket
+            if pf.real*fb > 0.0:
+                Ub, pb, fb = Uf, pf, pf.real
+                if side == -1:
+                    fa *= 0.5
+                side = -1
+            else:
+                Ua, pa, fa = Uf, pf, pf.real
+                if side == 1:
+                    fb *= 0.5
+                side = 1
+
+            if abs(pf.real) < Utol*abs(pf):
+                break
+
+        return Uf, pf
+
+    @_profiled
+    def computeFlutterRoots(self, rho, Uval, Mach, center, radius,
+                            npts=64, nmoments=2, rank_tol=1e-6,
+                            polish=True, nprocs=1):
+        '''
+        Find all the roots of det F(p) = 0 inside an ellipse in the
+        p-plane using Beyn's contour-integral method. The moments
+
+        A_k = 1/(2*pi*j) * contour integral of z**k*F(p)^{-1} dp
+
+        with z = (p - center)/r are computed with the trapezoid rule
+        on npts points. The eigenvalues of the linear pencil formed
+        from the block-Hankel matrices of the moments are the roots
+        inside the contour. Using nmoments block moments allows up to
+        nmoments*nvecs roots in the region.
+
+        The flutter matrix is evaluated with the analytic continuation
+        of the AIC, see computeAnalyticFlutterMat. With polish=True,
+        each root is then corrected to a root of the flutter matrix
+        from computeFlutterMat with Newton's method, and roots where
+        Newton's method fails are discarded.
+
+        The quadrature points are independent and are evaluated in a
+        process pool when nprocs > 1. The cost is npts/2 AIC
+        evaluations, since the points on the ellipse come in pairs
+        with the same frequency, plus a few for each root when
+        polishing.
+
+        Input:
+        rho:      the density
+        Uval:     the velocity
+        Mach:     the Mach number
+        center:   the center of the ellipse in the p-plane
+        radius:   the radius, or the (real, imaginary) semi-axes
+        npts:     the number of quadrature points
+        nmoments: the number of block moments
+        rank_tol: the relative singular value tolerance for the rank
+        polish:   correct the roots with Newton's method
+        nprocs:   the number of processes
+
+        Output:
+        pvals:    the roots sorted by frequency
+        vecs:     the right eigenvector estimates from the contour
+                  integral, one column per root
+        '''
+
+        qinf = 0.5*rho*Uval**2
+        nvecs = self.Kr.shape[0]
+
+        # Set the points and weights on the ellipse
+        rx, ry = np.broadcast_to(np.asarray(radius, dtype=np.float64), (2,))
+        r = max(rx, ry)
+        theta = 2.0*np.pi*(np.arange(npts) + 0.5)/npts
+        ps = center + rx*np.cos(theta) + 1j*ry*np.sin(theta)
+        dps = (-rx*np.sin(theta) + 1j*ry*np.cos(theta))/(1j*npts)
+        z = (ps - center)/r
+
+        # Evaluate the flutter matrix at the quadrature points. The
+        # points come in pairs with the same frequency, which share
+        # the AIC computation.
+        if nprocs <= 1:
+            F = self.computeFlutterMats(Uval, ps, qinf, Mach, nvecs,
+                                        self.Kr, self.Qm_vwash,
+                                        self.Qm_dwash, self.Qm_modes,
+                                        analytic=True)
+        else:
+            # Split the points into chunks of nearby frequency
+            F = np.zeros((npts, nvecs, nvecs), dtype=np.complex)
+            chunks = np.array_split(np.argsort(ps.imag), min(nprocs, npts))
+            pool, shared = self.createAeroPool(len(chunks))
+            try:
+                args = [(idx, Uval, ps[idx], qinf, Mach) for idx in chunks]
+                for idx, Fi, profile, log in pool.imap_unordered(
+                        _flutterMatWorker, args):
+                    F[idx] = Fi
+                    self.mergeWorkerProfile(profile, log)
+            finally:
+                self.destroyAeroPool(pool, shared)
+
+        # Compute the moments of the inverse
+        Finv = np.linalg.inv(F)
+        A = []
+        for k in range(2*nmoments):
+            A.append(np.einsum('i,ijk->jk', dps*z**k, Finv))
+
+        # Form the block-Hankel matrices
+        B0 = np.block([[A[i+j] for j in range(nmoments)]
+                       for i in range(nmoments)])
+        B1 = np.block([[A[i+j+1] for j in range(nmoments)]
+                       for i in range(nmoments)])
+
+        # Determine the number of roots from the rank of B0
+        V, s, Wh = np.linalg.svd(B0)
+        rank = np.sum(s > rank_tol*s[0])
+        V = V[:,:rank]
+        W = Wh[:rank,:].conjugate().T
+
+        # Compute the eigenvalues of the reduced linear problem
+        B = np.dot(V.conjugate().T, np.dot(B1, W))/s[:rank]
+        eigs, S = np.linalg.eig(B)
+        pvals = center + r*eigs
+        vecs = np.dot(V[:nvecs,:], S)
+        vecs /= np.sqrt(np.sum(abs(vecs)**2, axis=0))
+
+        # Keep the distinct roots inside the contour
+        inside = (((pvals.real - center.real)/rx)**2 +
+                  ((pvals.imag - center.imag)/ry)**2) < 1.0
+
+        if polish:
+            for k in range(len(pvals)):
+                if inside[k]:
+                    pvals[k], dpdU, niters, convrg = self.correctFlutterRoot(
+                        rho, Uval, Mach, pvals[k])
+                    inside[k] = convrg
+            inside &= (((pvals.real - center.real)/rx)**2 +
+                       ((pvals.imag - center.imag)/ry)**2) < 1.0
+
+        keep = []
+        for k in np.argsort(pvals.imag):
+            if not inside[k]:
+                continue
+            if any(abs(pvals[k] - pvals[j]) < 1e-6*(r + abs(pvals[j]))
+                   for j in keep):
+                continue
+            keep.append(k)
+
+        return pvals[keep], vecs[:,keep]
+
+    def createAeroPool(self, nprocs):
+        '''
+        Create a process pool in which each worker holds an
+        aerodynamic-only copy of this object. The read-only reduced
+        matrices Kr, Qm_vwash, Qm_dwash and Qm_modes are passed to the
+        workers through shared memory.
+
+        Output:
+        pool:     the process pool
+        shared:   the shared memory blocks, see destroyAeroPool
+        '''
+
+        # Place the read-only reduced matrices into shared memory
+        shared = []
+        specs = {}
+        try:
+            for name in ['Kr', 'Qm_vwash', 'Qm_dwash', 'Qm_modes']:
+                shm, spec = _createSharedArray(getattr(self, name))
+                shared.append(shm)
+                specs[name] = spec
+
+            import multiprocessing
+            ctx = multiprocessing.get_context()
+            pool = ctx.Pool(nprocs, _initSweepWorker,
+                            (self.getAeroState(), specs))
+        except Exception:
+            self.destroyAeroPool(None, shared)
+            raise
+
+        return pool, shared
+
+    def destroyAeroPool(self, pool, shared):
+        '''
+        Shut down a pool created by createAeroPool and release the
+        shared memory.
+        '''
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+        return
+
+    def getModelFingerprint(self):
+        '''
+        Compute a fingerprint of the reduced model: a hash of the
+        reduced stiffness matrix, the mode shapes and normal wash, and
+        the kernel settings. Results computed with a different model
+        have a different fingerprint.
+        '''
+
+        import hashlib
+
+        h = hashlib.sha1()
+        for a in [self.Kr, self.Qm_modes, self.Qm_vwash, self.Qm_dwash]:
+            a = np.ascontiguousarray(a, dtype=np.float64)
+            h.update(str(a.shape).encode('ascii'))
+            h.update(a.tobytes())
+        h.update(('%d %d %r'%(self.is_symmetric, self.use_steady_kernel,
+                              self.epstol)).encode('ascii'))
+
+        return h.hexdigest()
+
+    def getAeroState(self):
+        '''
+        Get the aerodynamic mesh and settings required to create a
+        copy of this object for aerodynamic analysis only. The
+        structural objects are not included. The output and profiling
+        settings are included. The iteration callback is not: a copy
+        only records whether it should log the iterations, so that the
+        log can be passed to the callback of this object.
+        '''
+
+        state = {'is_symmetric': self.is_symmetric,
+                 'use_steady_kernel': self.use_steady_kernel,
+                 'epstol': self.epstol,
+                 'verbose': self.verbose,
+                 'log_iterations': self.iteration_callback is not None,
+                 'profile': self.profile,
+                 'profile_memory': self.profile_memory,
+                 'Xi': self.Xi, 'Xo': self.Xo, 'Xr': self.Xr,
+                 'dXav': self.dXav, 'X': self.X, 'conn': self.conn,
+                 'omega': getattr(self, 'omega', None)}
+
+        return state
+
+    def save(self, path):
+        '''
+        Save the mesh, the reduced structural operators and the cached
+        reduced aerodynamic matrices to the directory path. Each array
+        is stored in its own .npy file and the settings are stored in
+        model.json. The structural model and the subspace vectors in
+        Qm are not saved.
+
+        Input:
+        path:  the directory name
+        '''
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        # Remove the settings first so that the directory does not
+        # hold a valid model while the arrays are being replaced
+        if os.path.exists(os.path.join(path, 'model.json')):
+            os.remove(os.path.join(path, 'model.json'))
+
+        # Save the mesh and the reduced operators
+        arrays = {}
+        for name in _SAVED_ARRAYS:
+            if getattr(self, name, None) is not None:
+                arrays[name] = getattr(self, name)
+
+        # Stack the cached aerodynamic matrices. The panel Cp values
+        # are not saved.
+        keys = list(self.aero_cache.keys())
+        if len(keys) > 0:
+            for i, name in enumerate(['cache_Qv', 'cache_Qd', 'cache_g']):
+                arrays[name] = np.array([self.aero_cache[key][i]
+                                         for key in keys])
+
+        # Write each array to a new file and move it into place. The
+        # existing files are replaced rather than overwritten, so a
+        # loaded model that memory-maps them keeps its data.
+        for name in arrays:
+            filename = os.path.join(path, name + '.npy')
+            with open(filename + '.tmp', 'wb') as fp:
+                np.save(fp, arrays[name])
+            os.replace(filename + '.tmp', filename)
+
+        # Write the settings last so that a partially written model is
+        # not loaded
+        info = {'is_symmetric': self.is_symmetric,
+                'use_steady_kernel': self.use_steady_kernel,
+                'epstol': self.epstol,
+                'arrays': sorted(arrays.keys()),
+                'cache_keys': [[float(k), float(M),
+                                None if x0 is None else float(x0),
+                                int(sym), int(steady), float(eps)]
+                               for (k, M, x0, sym, steady, eps) in keys]}
+        tmp = os.path.join(path, 'model.json.tmp')
+        with open(tmp, 'w') as fp:
+            json.dump(info, fp, indent=2)
+        os.replace(tmp, os.path.join(path, 'model.json'))
+
+        return
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        '''
+        Create a DLM object from a model written by save. The arrays
+        are memory-mapped by default, so that only the parts that are
+        used are read from disk. Memory-mapped arrays are read-only.
+        The flutter methods that only use the reduced operators can be
+        used directly. A structural model must be set with
+        setStructure or initStructure for the full-order methods.
+
+        Input:
+        path:       the directory name
+        mmap_mode:  the numpy memory-map mode (None to read the arrays)
+
+        Output:
+        solver:     the DLM object
+        '''
+
+        with open(os.path.join(path, 'model.json'), 'r') as fp:
+            info = json.load(fp)
+
+        solver = cls(is_symmetric=info['is_symmetric'],
+                     epstol=info['epstol'])
+        solver.use_steady_kernel = info['use_steady_kernel']
+
+        arrays = {}
+        for name in info['arrays']:
+            arrays[name] = np.load(os.path.join(path, name + '.npy'),
+                                   mmap_mode=mmap_mode)
+
+        # Set the mesh and the reduced operators
+        for name in _SAVED_ARRAYS:
+            if name in arrays:
+                setattr(solver, name, arrays[name])
+        if solver.Xi is not None:
+            solver.npanels = solver.Xi.shape[0]
+            solver.nnodes = solver.X.shape[0]
+
+        # Restore the cached aerodynamic matrices
+        for i, key in enumerate(info['cache_keys']):
+            solver.aero_cache[tuple(key)] = (arrays['cache_Qv'][i],
+                                             arrays['cache_Qd'][i],
+                                             arrays['cache_g'][i], None)
+
+        return solver
+
+def _getAvailableMemory():
+    '''
+    Get the available physical memory in bytes, or None if it cannot
+    be determined on this platform
+    '''
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def _createAeroSolver(state):
+    '''
+    Create an aerodynamic-only DLM object from the output of
+    DLM.getAeroState.
+    '''
+
+    solver = DLM(is_symmetric=state['is_symmetric'],
+                 epstol=state['epstol'])
+    solver.use_steady_kernel = state['use_steady_kernel']
+    for name in ['Xi', 'Xo', 'Xr', 'dXav', 'X', 'conn', 'omega']:
+        setattr(solver, name, state[name])
+    solver.npanels = solver.Xi.shape[0]
+    solver.nnodes = solver.X.shape[0]
+
+    # Copy the output and profiling settings
+    solver.verbose = state['verbose']
+    if state['profile']:
+        solver.enableProfiling(memory=state['profile_memory'])
+
+    return solver
+
+def _createSharedArray(a):
+    '''
+    Copy an array into a new shared memory block. Returns the block
+    and the (name, shape, dtype) spec used to attach to it.
+    '''
+
+    from multiprocessing import shared_memory
+
+    a = np.ascontiguousarray(a)
+    shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+    b = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)
+    b[...] = a
+
+    return shm, (shm.name, a.shape, a.dtype.str)
+
+def _attachSharedArray(spec):
+    '''
+    Attach to a shared memory block created by _createSharedArray.
+    The creating process is responsible for unlinking the block.
+    '''
+
+    from multiprocessing import shared_memory
+
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    a = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    a.flags.writeable = False
+
+    return shm, a
+
+# The per-process solver used by the process pool workers
+_worker = {}
+
+def _initSweepWorker(state, specs):
+    '''Initialize the aerodynamic-only solver in a worker process'''
+
+    solver = _createAeroSolver(state)
+    shared = []
+    for name in specs:
+        shm, a = _attachSharedArray(specs[name])
+        shared.append(shm)
+        setattr(solver, name, a)
+
+    # Record the iterations so that they can be returned with the
+    # results
+    _worker['log'] = []
+    if state['log_iterations']:
+        solver.iteration_callback = \
+            lambda method, info: _worker['log'].append((method, info))
+
+    _worker['solver'] = solver
+    _worker['shared'] = shared
+
+    return
+
+def _getWorkerProfile():
+    '''
+    Get the profiling data and the iteration log accumulated by the
+    worker since the last task, and reset them
+    '''
+
+    solver = _worker['solver']
+    profile = solver.getProfile()
+    solver.resetProfile()
+    log = _worker['log']
+    _worker['log'] = []
+
+    return profile, log
+
+def _sweepModeWorker(args):
+    '''Sweep a single mode in a worker process'''
+
+    rho, Uvals, Mach, kmode, predictor, path = args
+    results = None
+    if path is not None:
+        results = SweepResults(path)
+    pvals = _worker['solver'].sweepMode(rho, Uvals, Mach, kmode, predictor,
+                                        results)
+    profile, log = _getWorkerProfile()
+
+    return kmode, pvals, profile, log
+
+def _flutterMatWorker(args):
+    '''Evaluate the analytic flutter matrices in a worker process'''
+
+    idx, U, ps, qinf, Mach = args
+    solver = _worker['solver']
+    F = solver.computeFlutterMats(U, ps, qinf, Mach,
+                                  solver.Kr.shape[0], solver.Kr,
+                                  solver.Qm_vwash, solver.Qm_dwash,
+                                  solver.Qm_modes, analytic=True)
+    profile, log = _getWorkerProfile()
 
+    return idx, F, profile, log
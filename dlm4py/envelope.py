@@ -0,0 +1,524 @@
+from __future__ import print_function
+
+'''
+Matched-point flutter envelope over Mach number and altitude. The
+reduced aerodynamic matrices only depend on the reduced frequency
+omega/U and the Mach number. They are tabulated once per Mach number
+on a shared grid of reduced frequencies, and all the flutter solutions
+for that Mach number are computed from the interpolated tables without
+any further AIC evaluations.
+'''
+
+import os
+import numpy as np
+from scipy.interpolate import CubicSpline
+from concurrent.futures import ThreadPoolExecutor
+
+def standardAtmosphere(h):
+    '''
+    Compute the density and the speed of sound in the International
+    Standard Atmosphere up to 20 km.
+
+    Input:
+    h:    the geometric altitude in m
+
+    Output:
+    rho:  the density in kg/m^3
+    a:    the speed of sound in m/s
+    '''
+
+    T0 = 288.15
+    p0 = 101325.0
+    L = 0.0065
+    R = 287.05287
+    g = 9.80665
+    gamma = 1.4
+
+    h = np.asarray(h, dtype=np.float64)
+
+    # The troposphere and the isothermal lower stratosphere
+    T = np.where(h < 11000.0, T0 - L*h, T0 - L*11000.0)
+    p11 = p0*((T0 - L*11000.0)/T0)**(g/(L*R))
+    p = np.where(h < 11000.0, p0*(T/T0)**(g/(L*R)),
+                 p11*np.exp(-g*(h - 11000.0)/(R*T)))
+
+    rho = p/(R*T)
+    a = np.sqrt(gamma*R*T)
+
+    return rho, a
+
+class FlutterEnvelope:
+    def __init__(self, solver, kvals, checkpoint=None, nthreads=None):
+        '''
+        Set up the envelope calculation for a DLM object with the
+        subspace already set up.
+
+        Input:
+        solver:     the DLM object
+        kvals:      the reduced frequencies omega/U of the tables. The
+                    grid must cover Im(p)/U for all the roots of interest.
+        checkpoint: the file name of the checkpoint (None for no
+                    checkpoint). If the file exists, the tables and the
+                    completed results are loaded from it, provided
+                    they were computed for the same model.
+        nthreads:   the number of threads used to compute the tables
+        '''
+
+        self.solver = solver
+        self.kvals = np.array(kvals, dtype=np.float64)
+        self.checkpoint = checkpoint
+        self.nthreads = nthreads
+        self.nvecs = self.solver.Kr.shape[0]
+
+        # The fingerprint of the model the tables are computed for
+        self.model = self.solver.getModelFingerprint()
+
+        # The reduced aerodynamic tables and their splines, keyed by
+        # the Mach number
+        self.tables = {}
+        self.splines = {}
+
+        # The completed results, restored from the checkpoint
+        self.results = None
+
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            self.loadCheckpoint()
+
+        return
+
+    def computeAeroTable(self, Mach):
+        '''
+        Compute the reduced aerodynamic matrices per unit dynamic
+        pressure on the grid of reduced frequencies:
+
+        A1(k) = Gm*D(k)^{-T}*Qm_vwash
+        A0(k) = Gm*D(k)^{-T}*Qm_dwash
+
+        The AIC depends only on k = omega/U, so each matrix is computed
+        with U = 1. The table is stored and reused for later calls,
+        and written to its own checkpoint file.
+        '''
+
+        if Mach in self.tables:
+            return self.tables[Mach]
+
+        nk = len(self.kvals)
+        A0 = np.zeros((nk, self.nvecs, self.nvecs), dtype=np.complex)
+        A1 = np.zeros((nk, self.nvecs, self.nvecs), dtype=np.complex)
+
+        def evalFrequency(i):
+            Qv, Qd, g, Cp = self.solver.computeGustAeroMats(1.0, self.kvals[i],
+                                                            Mach)
+            A1[i] = Qv
+            A0[i] = Qd
+            return
+
+        nthreads = self.solver.getAeroThreads(self.nthreads, nk)
+        with ThreadPoolExecutor(max_workers=nthreads) as pool:
+            list(pool.map(evalFrequency, range(nk)))
+
+        self.tables[Mach] = (A0, A1)
+        self.saveTable(Mach)
+
+        return A0, A1
+
+    def interpolateAeroTable(self, Mach, Mach0, Mach1):
+        '''
+        Interpolate the reduced aerodynamic tables linearly in the
+        Mach number between the tables at Mach0 and Mach1. No AICs are
+        computed if these tables already exist.
+        '''
+
+        A00, A10 = self.computeAeroTable(Mach0)
+        A01, A11 = self.computeAeroTable(Mach1)
+        t = (Mach - Mach0)/(Mach1 - Mach0)
+
+        return (1.0 - t)*A00 + t*A01, (1.0 - t)*A10 + t*A11
+
+    def computeFlutterMatDeriv(self, Mach, U, p, qinf):
+        '''
+        Compute the flutter matrix and its derivative from the
+        interpolated tables:
+
+        Fr(p) = p**2*Ir + Kr + qinf*(p/U*A1(k) + A0(k)),  k = -j*p/U
+
+        The tables are interpolated in Im(k) = Im(p)/U and extended
+        analytically, so that dA/dp = -j/U*dA/dk.
+        '''
+
+        if Mach not in self.splines:
+            A0, A1 = self.computeAeroTable(Mach)
+            self.splines[Mach] = (CubicSpline(self.kvals, A0, axis=0),
+                                  CubicSpline(self.kvals, A1, axis=0))
+        S0, S1 = self.splines[Mach]
+
+        k = p.imag/U
+        A0 = S0(k)
+        A1 = S1(k)
+        dA0 = -1j*S0(k, 1)/U
+        dA1 = -1j*S1(k, 1)/U
+
+        I = np.eye(self.nvecs)
+        F = p**2*I + self.solver.Kr + qinf*(p/U*A1 + A0)
+        dFdp = 2.0*p*I + qinf*(A1/U + p/U*dA1 + dA0)
+
+        return F, dFdp
+
+    def computeFlutterSpeed(self, rho, Mach, Uvals, nmodes,
+                            Utol=1e-6, max_refine=20):
+        '''
+        Find the lowest velocity in the range of Uvals at which one of
+        the first nmodes modes becomes unstable at the given density
+        and Mach number. The modes are traced through Uvals from the
+        interpolated tables and the first crossing of Re(p) = 0 is
+        refined with the Illinois variant of regula falsi.
+
+        Output:
+        Uf:      the flutter velocity (nan if there is no crossing)
+        omega:   the flutter frequency
+        kmode:   the mode that becomes unstable (-1 if none)
+        '''
+
+        def flutter_mat(U, p, qinf):
+            return self.computeFlutterMatDeriv(Mach, U, p, qinf)
+
+        pvals, vecs = self.solver.trackFlutterModes(rho, Uvals, Mach, nmodes,
+                                                    flutter_mat=flutter_mat)
+
+        # Find the first onset of flutter over all the modes
+        Uf = np.nan
+        omega = np.nan
+        kmode = -1
+        for k in range(nmodes):
+            j = np.nonzero((pvals[k,:-1].real < 0.0) &
+                           (pvals[k,1:].real >= 0.0))[0]
+            if len(j) == 0 or Uvals[j[0]] >= Uf:
+                continue
+            j = j[0]
+
+            # Refine the crossing between Uvals[j] and Uvals[j+1]
+            Ua, pa = Uvals[j], pvals[k,j]
+            Ub, pb = Uvals[j+1], pvals[k,j+1]
+            z = vecs[k,j]
+            fa, fb = pa.real, pb.real
+            side = 0
+            Uc, pc = Ub, pb
+            for i in range(max_refine):
+                Uc = Ub - fb*(Ub - Ua)/(fb - fa)
+                p0 = pa + (pb - pa)*(Uc - Ua)/(Ub - Ua)
+                pc, zc = self.solver.trackFlutterModes(
+                    rho, [Uc], Mach, 1, pinit=[p0], zinit=[z],
+                    flutter_mat=flutter_mat)
+                pc = pc[0,0]
+                fc = pc.real
+                if abs(Uc - Ub) < Utol*Uc or fc == 0.0:
+                    break
+                if fc*fb < 0.0:
+                    Ua, pa, fa = Ub, pb, fb
+                    side = 0
+                else:
+                    if side == 1:
+                        fa *= 0.5
+                    side = 1
+                Ub, pb, fb = Uc, pc, fc
+
+            Uf = Uc
+            omega = pc.imag
+            kmode = k
+
+        return Uf, omega, kmode
+
+    def computeMatchedPoint(self, rho, a, Mach0, U0, Mach1, U1,
+                            Uvals, nmodes, Mtol=1e-4, max_iters=10):
+        '''
+        Find the matched-point flutter solution at the given density
+        and speed of sound, where the flutter velocity and the Mach
+        number are consistent, U = Mach*a. The solution is bracketed
+        by two table Mach numbers with flutter velocities (U0, U1) on
+        either side of the matched condition. The Mach number is
+        updated with the Illinois variant of regula falsi on
+        g(Mach) = U(Mach)/a - Mach. At each new Mach number, the
+        tables are interpolated between the two bracketing tables, so
+        no new tables are computed.
+
+        Output:
+        Mach:    the matched Mach number
+        Uf:      the flutter velocity
+        omega:   the flutter frequency
+        kmode:   the mode that becomes unstable
+        convrg:  flag indicating whether the iteration converged
+        '''
+
+        # The bracketing table Mach numbers
+        Ma, Mb = Mach0, Mach1
+
+        g0 = U0/a - Mach0
+        g1 = U1/a - Mach1
+        side = 0
+        Mach, Uf, omega, kmode = Mach1, U1, np.nan, -1
+        convrg = False
+        for i in range(max_iters):
+            Mach = Mach1 - g1*(Mach1 - Mach0)/(g1 - g0)
+
+            # Set the splines of the interpolated tables for this Mach
+            # number. These are discarded after use.
+            interp = Mach not in self.tables
+            if interp:
+                A0, A1 = self.interpolateAeroTable(Mach, Ma, Mb)
+                self.splines[Mach] = (CubicSpline(self.kvals, A0, axis=0),
+                                      CubicSpline(self.kvals, A1, axis=0))
+            Uf, omega, kmode = self.computeFlutterSpeed(rho, Mach, Uvals,
+                                                        nmodes)
+            if interp:
+                del self.splines[Mach]
+
+            if np.isnan(Uf):
+                break
+
+            g = Uf/a - Mach
+            if abs(g) < Mtol:
+                convrg = True
+                break
+
+            if g*g1 < 0.0:
+                Mach0, g0 = Mach1, g1
+                side = 0
+            else:
+                if side == 1:
+                    g0 *= 0.5
+                side = 1
+            Mach1, g1 = Mach, g
+
+        return Mach, Uf, omega, kmode, convrg
+
+    def computeEnvelope(self, altitudes, Machs, Uvals, nmodes,
+                        Mtol=1e-4, max_iters=10):
+        '''
+        Compute the matched-point flutter envelope. The tables are
+        computed once for each Mach number in Machs, and the flutter
+        velocity is computed for every density from these tables.
+        The matched point at each altitude is then found between the
+        pair of Mach numbers that brackets U/a = Mach. The results are
+        written to the checkpoint after each completed entry, and the
+        completed entries are skipped when the calculation is resumed
+        with the same model and parameters. If the model of the solver
+        has changed, the tables and the results are recomputed.
+
+        Input:
+        altitudes:  the altitudes in m
+        Machs:      the Mach numbers of the tables
+        Uvals:      the velocities used to trace the modes
+        nmodes:     the number of modes to trace
+        Mtol:       the tolerance on the matched Mach number
+        max_iters:  the max. number of matched-point iterations
+
+        Output:
+        results:    a dictionary with the arrays
+                    'altitude', 'rho', 'a': the atmosphere
+                    'Mach', 'U', 'omega', 'mode', 'converged': the
+                    matched-point solution at each altitude
+                    'grid_U', 'grid_omega', 'grid_mode': the flutter
+                    velocity at each table Mach number and altitude
+                    'Uvals', 'nmodes', 'Mtol', 'max_iters': the
+                    parameters of the calculation
+        '''
+
+        altitudes = np.array(altitudes, dtype=np.float64)
+        Machs = np.array(Machs, dtype=np.float64)
+        nalt = len(altitudes)
+        nmach = len(Machs)
+        rho, a = standardAtmosphere(altitudes)
+        Uvals = np.array(Uvals, dtype=np.float64)
+
+        # Discard the tables and the results if the model has changed
+        model = self.solver.getModelFingerprint()
+        if model != self.model:
+            self.model = model
+            self.tables = {}
+            self.splines = {}
+            self.results = None
+
+        # Restore the results if they match this calculation
+        res = self.results
+        if (res is None or
+            not np.array_equal(res['altitude'], altitudes) or
+            not np.array_equal(res['grid_Mach'], Machs) or
+            not np.array_equal(res['Uvals'], Uvals) or
+            int(res['nmodes']) != nmodes or
+            float(res['Mtol']) != Mtol or
+            int(res['max_iters']) != max_iters):
+            if res is not None and self.solver.verbose:
+                print('Stored results do not match, recomputing them')
+            res = {'altitude': altitudes, 'rho': rho, 'a': a,
+                   'grid_Mach': Machs, 'Uvals': Uvals, 'nmodes': nmodes,
+                   'Mtol': Mtol, 'max_iters': max_iters,
+                   'grid_U': np.zeros((nmach, nalt)),
+                   'grid_omega': np.zeros((nmach, nalt)),
+                   'grid_mode': np.zeros((nmach, nalt), dtype=int),
+                   'grid_done': np.zeros((nmach, nalt), dtype=bool),
+                   'Mach': np.zeros(nalt), 'U': np.zeros(nalt),
+                   'omega': np.zeros(nalt),
+                   'mode': np.zeros(nalt, dtype=int),
+                   'converged': np.zeros(nalt, dtype=bool),
+                   'done': np.zeros(nalt, dtype=bool)}
+        self.results = res
+
+        # Sweep the densities for each table
+        for i in range(nmach):
+            for j in range(nalt):
+                if res['grid_done'][i,j]:
+                    continue
+                Uf, omega, kmode = self.computeFlutterSpeed(rho[j], Machs[i],
+                                                            Uvals, nmodes)
+                res['grid_U'][i,j] = Uf
+                res['grid_omega'][i,j] = omega
+                res['grid_mode'][i,j] = kmode
+                res['grid_done'][i,j] = True
+                self.saveCheckpoint()
+
+        # Find the matched point at each altitude
+        for j in range(nalt):
+            if res['done'][j]:
+                continue
+
+            g = res['grid_U'][:,j]/a[j] - Machs
+            Mach, Uf, omega, kmode, convrg = np.nan, np.nan, np.nan, -1, False
+            for i in range(nmach-1):
+                if not (g[i]*g[i+1] <= 0.0):
+                    continue
+                if g[i] == 0.0 or g[i+1] == 0.0:
+                    # The matched point is on the Mach grid
+                    i0 = i
+                    if g[i+1] == 0.0:
+                        i0 = i+1
+                    Mach = Machs[i0]
+                    Uf = res['grid_U'][i0,j]
+                    omega = res['grid_omega'][i0,j]
+                    kmode = res['grid_mode'][i0,j]
+                    convrg = True
+                else:
+                    Mach, Uf, omega, kmode, convrg = self.computeMatchedPoint(
+                        rho[j], a[j], Machs[i], res['grid_U'][i,j],
+                        Machs[i+1], res['grid_U'][i+1,j],
+                        Uvals, nmodes, Mtol, max_iters)
+                break
+
+            self.solver.logIteration('computeEnvelope',
+                                     altitude=altitudes[j], Mach=Mach,
+                                     U=Uf, omega=omega, mode=kmode,
+                                     converged=convrg)
+            if not convrg and self.solver.verbose:
+                print('No matched point at altitude %f'%(altitudes[j]))
+
+            res['Mach'][j] = Mach
+            res['U'][j] = Uf
+            res['omega'][j] = omega
+            res['mode'][j] = kmode
+            res['converged'][j] = convrg
+            res['done'][j] = True
+            self.saveCheckpoint()
+
+        if self.solver.verbose:
+            print('%12s %10s %12s %12s %6s'%(
+                'Altitude', 'Mach', 'U', 'omega', 'Mode'))
+            for j in range(nalt):
+                print('%12.2f %10.6f %12.6f %12.6f %6d'%(
+                    altitudes[j], res['Mach'][j], res['U'][j],
+                    res['omega'][j], res['mode'][j]))
+
+        return res
+
+    def getTableName(self, Mach):
+        '''Get the file name of the checkpointed table for Mach'''
+        return '%s.table_%s.npz'%(self.checkpoint, repr(float(Mach)))
+
+    def writeCheckpointFile(self, filename, data):
+        '''
+        Write the arrays to a temporary file first and then move it
+        into place, so an interrupted write does not corrupt the file
+        '''
+
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as fp:
+            np.savez(fp, **data)
+        os.replace(tmp, filename)
+
+        return
+
+    def saveTable(self, Mach):
+        '''
+        Write the table for Mach to its own checkpoint file. Each
+        table is only written once, when it is computed.
+        '''
+
+        if self.checkpoint is None:
+            return
+
+        A0, A1 = self.tables[Mach]
+        self.writeCheckpointFile(self.getTableName(Mach),
+                                 {'kvals': self.kvals, 'Mach': Mach,
+                                  'model': self.model,
+                                  'A0': A0, 'A1': A1})
+
+        return
+
+    def saveCheckpoint(self):
+        '''
+        Write the results to the checkpoint file. The tables are
+        stored in separate files by saveTable.
+        '''
+
+        if self.checkpoint is None:
+            return
+
+        data = {'kvals': self.kvals, 'nvecs': self.nvecs,
+                'model': self.model}
+        if self.results is not None:
+            for name in self.results:
+                data['res_' + name] = self.results[name]
+        self.writeCheckpointFile(self.checkpoint, data)
+
+        return
+
+    def loadCheckpoint(self):
+        '''
+        Load the tables and the results from the checkpoint files. The
+        tables and results are only used if they were computed for the
+        same model, see DLM.getModelFingerprint, on the same grid of
+        reduced frequencies. Checkpoints without a fingerprint are
+        ignored.
+        '''
+
+        def matches(data):
+            return ('model' in data.files and
+                    str(data['model']) == self.model and
+                    np.array_equal(data['kvals'], self.kvals))
+
+        # Load the tables written next to the checkpoint
+        dirname = os.path.dirname(os.path.abspath(self.checkpoint))
+        prefix = os.path.basename(self.checkpoint) + '.table_'
+        for name in sorted(os.listdir(dirname)):
+            if not (name.startswith(prefix) and name.endswith('.npz')):
+                continue
+            table = np.load(os.path.join(dirname, name))
+            if matches(table):
+                self.tables[float(table['Mach'])] = (table['A0'],
+                                                     table['A1'])
+
+        data = np.load(self.checkpoint)
+        if not matches(data):
+            self.solver.logIteration('loadCheckpoint',
+                                     checkpoint=self.checkpoint,
+                                     matched=False)
+            if self.solver.verbose:
+                print('Checkpoint %s does not match, ignoring it'%(
+                    self.checkpoint))
+            return
+
+        names = [name[4:] for name in data.files if name.startswith('res_')]
+        if len(names) > 0:
+            self.results = {}
+            for name in names:
+                self.results[name] = data['res_' + name]
+
+        return
@@ -0,0 +1,214 @@
+from __future__ import print_function
+
+'''
+Time-domain discrete gust response computed from the frequency
+response of the reduced aeroelastic model. The frequency response is
+evaluated once on an FFT grid and then reused for any number of gust
+lengths.
+
+The time histories are obtained from a periodic inverse FFT, so they
+are only meaningful if the response is causal and has decayed by the
+end of the window. The gust therefore arrives after a quiet lead time
+and both conditions are checked for each gust.
+'''
+
+import numpy as np
+
+def nextFFTSize(n):
+    '''
+    Find the smallest integer N >= n of the form 2**a*3**b*5**c. These
+    sizes are efficient for the FFT.
+    '''
+
+    N = max(int(n), 1)
+    while True:
+        m = N
+        for f in [2, 3, 5]:
+            while m % f == 0:
+                m //= f
+        if m == 1:
+            return N
+        N += 1
+
+def oneMinusCosine(t, U, H, wg0=1.0):
+    '''
+    Evaluate the 1-cosine gust velocity profile
+
+    wg(t) = 0.5*wg0*(1 - cos(pi*U*t/H))   for 0 <= t <= 2*H/U
+
+    Input:
+    t:    the time values
+    U:    the free-stream velocity
+    H:    the gust gradient distance (half the gust length)
+    wg0:  the peak gust velocity
+
+    Output:
+    wg:   the gust velocity at each time
+    '''
+
+    t = np.asarray(t)
+    wg = 0.5*wg0*(1.0 - np.cos(np.pi*U*t/H))
+    wg[(t < 0.0) | (t > 2.0*H/U)] = 0.0
+
+    return wg
+
+def computeGustTimeGrid(U, Kr, gust_lengths, dt=None, tfinal=None,
+                        tstart=0.0):
+    '''
+    Select the time step and the number of time steps for the gust
+    response. The defaults resolve the shortest gust and the highest
+    natural frequency, and leave time for the response to the longest
+    gust, which arrives at tstart, to decay. The number of steps is
+    rounded up to an efficient FFT size.
+
+    Output:
+    dt:   the time step
+    N:    the number of time steps
+    '''
+
+    # Estimate the highest and lowest natural frequencies
+    lam = np.linalg.eigvalsh(0.5*(Kr + Kr.T))
+    lam = lam[lam > 0.0]
+    omega_max = np.sqrt(lam[-1])
+    omega_min = np.sqrt(lam[0])
+
+    Hmin = np.min(gust_lengths)
+    Hmax = np.max(gust_lengths)
+
+    if dt is None:
+        dt = min(2.0*Hmin/(50.0*U), np.pi/(4.0*omega_max))
+    if tfinal is None:
+        tfinal = tstart + 2.0*Hmax/U + 20.0*2.0*np.pi/omega_min
+
+    N = nextFFTSize(np.ceil(tfinal/dt))
+
+    return dt, N
+
+def checkGustResponse(t, q, tstart, rtol=1e-2):
+    '''
+    Check a gust response time history. The response must vanish
+    before the gust arrives at tstart, otherwise it is not causal, and
+    it must have decayed over the last tenth of the window, otherwise
+    it wraps around the periodic window. A model that is unstable at
+    the flight condition fails both checks.
+
+    Input:
+    t:       the time values
+    q:       the time history, shape (nt,) or (nt, nvecs)
+    tstart:  the time at which the gust arrives
+    rtol:    the tolerance relative to the peak response
+
+    Output:
+    causal:   True if the response before tstart is small
+    decayed:  True if the response at the end of the window is small
+    '''
+
+    qmax = np.absolute(q)
+    if qmax.ndim > 1:
+        qmax = np.max(qmax, axis=1)
+    peak = np.max(qmax)
+
+    causal = True
+    if np.any(t < tstart):
+        causal = bool(np.max(qmax[t < tstart]) <= rtol*peak)
+    tend = t[0] + 0.9*(t[-1] - t[0])
+    decayed = bool(np.max(qmax[t >= tend]) <= rtol*peak)
+
+    return causal, decayed
+
+def computeDiscreteGustResponse(solver, U, Mach, qinf, gust_lengths,
+                                wg0=1.0, dt=None, tfinal=None, x0=None,
+                                panel=False, nthreads=None, tstart=None,
+                                rtol=1e-2):
+    '''
+    Compute the time history of the modal coordinates, the total lift
+    and optionally the panel Cp due to a series of 1-cosine gusts. The
+    frequency response is computed once using DLM.computeGustFRF on
+    the non-negative frequencies of the FFT grid. Since the gust and
+    the response are real signals, the negative frequencies follow
+    from conjugate symmetry. The time history for each gust length is
+    then obtained from an inverse FFT of the product of the frequency
+    response and the spectrum of the gust. Each time history is
+    checked with checkGustResponse and a warning is printed if it is
+    not causal or has not decayed.
+
+    Input:
+    solver:        the DLM object with the subspace set up
+    U:             the free-stream velocity
+    Mach:          the Mach number
+    qinf:          the dynamic pressure
+    gust_lengths:  the gust gradient distances H
+    wg0:           the peak gust velocity
+    dt:            the time step (None for the default)
+    tfinal:        the minimum final time (None for the default)
+    x0:            the x-location of the gust front at t = 0 (defaults
+                   to the most upstream receiving point)
+    panel:         return the panel Cp time histories as well
+    nthreads:      the number of threads used for the frequency sweep
+    tstart:        the time at which the gust front reaches x0
+                   (defaults to the duration of the longest gust)
+    rtol:          the tolerance for the response checks
+
+    Output:
+    t:       the time values
+    q:       the modal coordinates, shape (ngust, nt, nvecs)
+    lift:    the total lift, shape (ngust, nt)
+    Cp:      the panel Cp, shape (ngust, nt, npanels) or None
+    '''
+
+    gust_lengths = np.atleast_1d(gust_lengths)
+    nvecs = solver.Kr.shape[0]
+
+    if x0 is None:
+        x0 = np.min(solver.Xr[:,0])
+
+    # Leave a quiet lead time before the gust arrives
+    if tstart is None:
+        tstart = 2.0*np.max(gust_lengths)/U
+
+    # Set the time and frequency grids
+    dt, N = computeGustTimeGrid(U, solver.Kr, gust_lengths, dt, tfinal,
+                                tstart)
+    t = dt*np.arange(N)
+    omegas = 2.0*np.pi*np.fft.rfftfreq(N, dt)
+
+    # Compute the response per unit gust velocity: wash = wg/U
+    R = solver.computeGustFRF(U, Mach, omegas, qinf, W0=0.0, aoa=1.0/U,
+                              x0=x0, panel=True, nthreads=nthreads)
+
+    # Reduce the panel response to the total lift. Each panel
+    # contributes -1/2*qinf*Cp*n_z where |n| is twice the panel area,
+    # with the same sign as the loads Fa = -qinf*Gm*Cp.
+    normals = solver.computePanelNormals()
+    L = -0.5*qinf*np.dot(R[:,nvecs:], normals[:,2])
+
+    # Allocate the time histories
+    ngust = len(gust_lengths)
+    q = np.zeros((ngust, N, nvecs))
+    lift = np.zeros((ngust, N))
+    Cp = None
+    if panel:
+        Cp = np.zeros((ngust, N, solver.npanels))
+
+    for i, H in enumerate(gust_lengths):
+        # Compute the spectrum of the gust
+        Wg = np.fft.rfft(oneMinusCosine(t - tstart, U, H, wg0))
+
+        # Transform the response back to the time domain
+        q[i] = np.fft.irfft(Wg[:,np.newaxis]*R[:,:nvecs], n=N, axis=0)
+        lift[i] = np.fft.irfft(Wg*L, n=N)
+        if panel:
+            Cp[i] = np.fft.irfft(Wg[:,np.newaxis]*R[:,nvecs:], n=N, axis=0)
+
+        # Check that the response is causal and has decayed
+        causal, decayed = checkGustResponse(t, q[i], tstart, rtol)
+        solver.logIteration('computeDiscreteGustResponse', H=H,
+                            causal=causal, decayed=decayed)
+        if solver.verbose and not causal:
+            print('Warning: the response to the gust H = %g is not '
+                  'causal'%(H))
+        if solver.verbose and not decayed:
+            print('Warning: the response to the gust H = %g has not '
+                  'decayed by t = %g'%(H, t[-1]))
+
+    return t, q, lift, Cp
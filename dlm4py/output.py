@@ -0,0 +1,198 @@
+from __future__ import print_function
+
+'''
+Binary output of the panel solutions. The arrays are written as
+whole blocks, rather than one value at a time, to either a VTK
+unstructured grid file (.vtu) with raw appended binary data or a
+compressed numpy archive (.npz).
+
+Several solutions (frequencies, mode shapes or sweep points) can be
+written together. In a .npz archive, the mesh is stored once and the
+solutions are stacked along the first axis. In VTK format, each
+solution is written to its own .vtu file with its TimeValue, and a
+.pvd collection lists the files with their times, so that ParaView
+and VisIt read them as a time series.
+'''
+
+import os
+import numpy as np
+
+# The VTK cell type for a linear quadrilateral
+_VTK_QUAD = 9
+
+def writeVTU(filename, X, conn, cell_data=None, point_data=None,
+             field_data=None):
+    '''
+    Write a quadrilateral surface mesh and the solution arrays to a
+    VTK XML unstructured grid file with raw appended binary data.
+
+    Input:
+    filename:    the name of the .vtu file
+    X:           the nodal locations, shape (nnodes, 3)
+    conn:        the zero-based connectivity, shape (nelems, 4)
+    cell_data:   a list of (name, array) with arrays of length nelems
+    point_data:  a list of (name, array) with arrays of shape
+                 (nnodes,) or (nnodes, 3)
+    field_data:  a list of (name, array) of global values
+    '''
+
+    X = np.ascontiguousarray(X, dtype='<f8').reshape(-1, 3)
+    conn = np.ascontiguousarray(conn, dtype='<i8').reshape(-1, 4)
+    nnodes = X.shape[0]
+    nelems = conn.shape[0]
+
+    # The arrays that are written to the appended data block
+    blocks = []
+
+    def addArray(name, array, ncomp=None):
+        '''Add the array to the appended data and return the XML tag'''
+
+        offset = sum(len(b) for b in blocks)
+        data = np.ascontiguousarray(array)
+        if data.dtype.kind == 'f':
+            data = data.astype('<f8')
+            vtype = 'Float64'
+        else:
+            data = data.astype('<i8')
+            vtype = 'Int64'
+        if ncomp is None:
+            ncomp = 1
+            if data.ndim > 1:
+                ncomp = data.shape[1]
+
+        raw = data.tobytes()
+        blocks.append(np.array([len(raw)], dtype='<u8').tobytes() + raw)
+
+        tag = '<DataArray type="%s" Name="%s" NumberOfComponents="%d" '%(
+            vtype, name, ncomp)
+        tag += 'format="appended" offset="%d"/>\n'%(offset)
+
+        return tag
+
+    def addArrays(data, size):
+        '''Add a list of named arrays and return the XML tags'''
+
+        tags = ''
+        if data is not None:
+            for name, array in data:
+                array = np.asarray(array)
+                if array.shape[0] != size:
+                    raise ValueError('Array %s has the wrong size'%(name))
+                tags += addArray(name, array)
+
+        return tags
+
+    # Add the global field data, the points and the cells
+    field_tags = ''
+    if field_data is not None:
+        for name, array in field_data:
+            field_tags += addArray(name, np.atleast_1d(array))
+    point_tags = addArray('Points', X, 3)
+    cell_tags = addArray('connectivity', conn.flatten(), 1)
+    cell_tags += addArray('offsets', 4*np.arange(1, nelems+1), 1)
+    cell_tags += addArray('types', _VTK_QUAD*np.ones(nelems, dtype=int), 1)
+
+    # Add the solution arrays
+    pdata_tags = addArrays(point_data, nnodes)
+    cdata_tags = addArrays(cell_data, nelems)
+
+    # Write the XML header. The binary data is appended after it.
+    fp = open(filename, 'wb')
+
+    header = '<?xml version="1.0"?>\n'
+    header += '<VTKFile type="UnstructuredGrid" version="1.0" '
+    header += 'byte_order="LittleEndian" header_type="UInt64">\n'
+    header += '<UnstructuredGrid>\n'
+    if len(field_tags) > 0:
+        header += '<FieldData>\n' + field_tags + '</FieldData>\n'
+    header += '<Piece NumberOfPoints="%d" NumberOfCells="%d">\n'%(
+        nnodes, nelems)
+    header += '<Points>\n' + point_tags + '</Points>\n'
+    header += '<Cells>\n' + cell_tags + '</Cells>\n'
+    header += '<PointData>\n' + pdata_tags + '</PointData>\n'
+    header += '<CellData>\n' + cdata_tags + '</CellData>\n'
+    header += '</Piece>\n'
+    header += '</UnstructuredGrid>\n'
+    header += '<AppendedData encoding="raw">\n_'
+    fp.write(header.encode('ascii'))
+
+    # Write out the binary data in one block per array
+    for b in blocks:
+        fp.write(b)
+
+    fp.write('\n</AppendedData>\n</VTKFile>\n'.encode('ascii'))
+    fp.close()
+
+    return
+
+def writePVD(filename, files, times):
+    '''
+    Write a VTK collection file that lists the files of a time series.
+    The file names are written relative to the directory of the
+    collection file.
+
+    Input:
+    filename:  the name of the .pvd file
+    files:     the names of the .vtu file for each time step
+    times:     the time value for each file
+    '''
+
+    dirname = os.path.dirname(os.path.abspath(filename))
+
+    fp = open(filename, 'w')
+    fp.write('<?xml version="1.0"?>\n')
+    fp.write('<VTKFile type="Collection" version="0.1" '
+             'byte_order="LittleEndian">\n')
+    fp.write('<Collection>\n')
+    for name, t in zip(files, times):
+        name = os.path.relpath(os.path.abspath(name), dirname)
+        fp.write('<DataSet timestep="%.16g" group="" part="0" '
+                 'file="%s"/>\n'%(t, name))
+    fp.write('</Collection>\n')
+    fp.write('</VTKFile>\n')
+    fp.close()
+
+    return
+
+def writeNPZ(filename, X, conn, **arrays):
+    '''
+    Write the mesh and the solution arrays to a compressed numpy
+    archive. The arrays are stored under the given keyword names.
+
+    Input:
+    filename:  the name of the .npz file
+    X:         the nodal locations, shape (nnodes, 3)
+    conn:      the zero-based connectivity, shape (nelems, 4)
+    arrays:    the named solution arrays
+    '''
+
+    data = {}
+    for name in arrays:
+        if arrays[name] is not None:
+            data[name] = np.asarray(arrays[name])
+    np.savez_compressed(filename, X=X, conn=conn, **data)
+
+    return
+
+def getSolutionArrays(Cp, u, nnodes, npanels):
+    '''
+    Convert the solutions to arrays with the solution index first,
+    so that Cp has shape (nsol, npanels) and u has shape
+    (nsol, nnodes, 3). Cp may contain a single solution or the
+    solutions as columns, as returned by the DLM solve.
+    '''
+
+    Cp = np.asarray(Cp)
+    if Cp.ndim == 1:
+        Cp = Cp.reshape(1, -1)
+    else:
+        Cp = Cp.T
+    if Cp.shape[1] != npanels:
+        raise ValueError('Cp must have npanels rows')
+
+    if u is not None:
+        u = np.asarray(u).reshape(-1, nnodes, 3)
+        if u.shape[0] != Cp.shape[0] and u.shape[0] != 1:
+            raise ValueError('Inconsistent number of Cp and u solutions')
+
+    return Cp, u
@@ -0,0 +1,191 @@
+from __future__ import print_function
+
+'''
+An append-only on-disk store for the converged roots of a velocity
+sweep. Each record holds the mode, flow conditions, root, iteration
+count and wall time of one converged point. The records are buffered
+and periodically flushed as numbered .npy chunks in a directory. Each
+chunk is written to a temporary file and then moved into place, so an
+interrupted sweep never leaves a partial chunk behind.
+
+When a store is reopened, the existing chunks are read back. A
+restarted sweep then skips the converged points and uses the stored
+roots to predict the remaining ones. The store records a fingerprint
+of the model, so that a directory reused for a different model is
+detected instead of returning its stale roots.
+'''
+
+import os
+import numpy as np
+
+# The layout of a single record
+RECORD_DTYPE = np.dtype([('mode', np.int64), ('rho', np.float64),
+                         ('Mach', np.float64), ('U', np.float64),
+                         ('p', np.complex128), ('dpdU', np.complex128),
+                         ('niters', np.int64), ('converged', np.bool_),
+                         ('time', np.float64)])
+
+class SweepResults:
+    def __init__(self, path, flush_every=10):
+        '''
+        Open the results store in the directory path, creating it if
+        it does not exist, and read the records already stored there.
+
+        Input:
+        path:         the directory for the chunk files
+        flush_every:  the number of buffered records that triggers a
+                      write of a new chunk
+        '''
+
+        self.path = path
+        self.flush_every = flush_every
+
+        # The records that have not yet been written
+        self.buffer = []
+
+        # The stored records keyed by (mode, rho, Mach, U)
+        self.records = {}
+
+        # The fingerprint of the model, see setModel
+        self.model = None
+
+        # The chunk files are named by the process id so that the
+        # workers of a parallel sweep can share the directory
+        self.prefix = 'chunk_%d_'%(os.getpid())
+        self.nchunks = 0
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.load()
+
+        return
+
+    def load(self):
+        '''Read all the completed chunks in the directory'''
+
+        for name in sorted(os.listdir(self.path)):
+            if name.startswith('chunk_') and name.endswith('.npy'):
+                for rec in np.load(os.path.join(self.path, name)):
+                    # A converged record is not replaced by one that
+                    # did not converge
+                    key = self.getKey(rec['mode'], rec['rho'],
+                                      rec['Mach'], rec['U'])
+                    old = self.records.get(key)
+                    if (old is None or rec['converged'] or
+                        not old['converged']):
+                        self.records[key] = rec
+
+        # Do not overwrite chunks from an earlier process with the
+        # same process id
+        while os.path.exists(self.getChunkName(self.nchunks)):
+            self.nchunks += 1
+
+        return
+
+    def setModel(self, model):
+        '''
+        Set the fingerprint of the model that computes the records.
+        The fingerprint is stored in the directory when the store is
+        first used.
+
+        Input:
+        model:  the fingerprint string, see DLM.getModelFingerprint
+
+        Raises ValueError if the directory holds records from a
+        different model or from a model without a fingerprint.
+        '''
+
+        filename = os.path.join(self.path, 'model.txt')
+        if os.path.exists(filename):
+            with open(filename, 'r') as fp:
+                stored = fp.read().strip()
+            if stored != model:
+                raise ValueError(
+                    'The results in %s are for a different model'%(
+                        self.path))
+        elif len(self.records) > 0:
+            raise ValueError(
+                'The results in %s are for an unknown model'%(self.path))
+        else:
+            tmp = filename + '.tmp'
+            with open(tmp, 'w') as fp:
+                fp.write(model + '\n')
+            os.replace(tmp, filename)
+
+        self.model = model
+
+        return
+
+    def getKey(self, kmode, rho, Mach, U):
+        '''Get the key for a record'''
+        return (int(kmode), float(rho), float(Mach), float(U))
+
+    def getChunkName(self, index):
+        '''Get the file name of a chunk written by this process'''
+        return os.path.join(self.path, self.prefix + '%06d.npy'%(index))
+
+    def append(self, kmode, rho, Mach, U, p, dpdU=0.0, niters=0,
+               converged=True, time=0.0):
+        '''
+        Add a point to the store. The buffer is written to a
+        new chunk once it holds flush_every records.
+        '''
+
+        rec = np.array((kmode, rho, Mach, U, p, dpdU, niters, converged,
+                        time), dtype=RECORD_DTYPE)
+        self.buffer.append(rec)
+        self.records[self.getKey(kmode, rho, Mach, U)] = rec
+
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+        return
+
+    def flush(self):
+        '''Write the buffered records to a new chunk'''
+
+        if len(self.buffer) == 0:
+            return
+
+        filename = self.getChunkName(self.nchunks)
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as fp:
+            np.save(fp, np.array(self.buffer, dtype=RECORD_DTYPE))
+        os.replace(tmp, filename)
+
+        self.nchunks += 1
+        self.buffer = []
+
+        return
+
+    def getRecord(self, kmode, rho, Mach, U):
+        '''Get the stored record for a point, or None if not stored'''
+        return self.records.get(self.getKey(kmode, rho, Mach, U))
+
+    def getRecords(self):
+        '''
+        Get all the stored records as a structured array sorted by the
+        mode, flow conditions and velocity.
+        '''
+
+        recs = np.array(list(self.records.values()), dtype=RECORD_DTYPE)
+        recs = recs[np.lexsort((recs['U'], recs['Mach'], recs['rho'],
+                                recs['mode']))]
+
+        return recs
+
+    def getSweep(self, rho, Mach, nmodes, Uvals):
+        '''
+        Get the stored roots for a sweep, in the layout returned by
+        velocitySweep. The points that have not been computed are NaN.
+        '''
+
+        pvals = np.zeros((nmodes, len(Uvals)), dtype=np.complex128)
+        pvals[:] = np.nan
+        for kmode in range(nmodes):
+            for i, U in enumerate(Uvals):
+                rec = self.getRecord(kmode, rho, Mach, U)
+                if rec is not None:
+                    pvals[kmode,i] = rec['p']
+
+        return pvals
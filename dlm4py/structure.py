@@ -0,0 +1,389 @@
+from __future__ import print_function
+
+'''
+Structural backends for the flutter analysis. The DLM class only
+interacts with the structural model through the Structure interface
+defined here: vector creation, products with the stiffness and mass
+matrices, a factored shift-invert operator and the load/displacement
+transfer to the aerodynamic surface.
+
+SparseStructure implements the interface with scipy.sparse stiffness
+and mass matrices, so that the flutter analysis can be run without
+TACS or FUNtoFEM. The TACS implementation is in tacs_structure.py.
+'''
+
+import numpy as np
+import scipy.sparse as sparse
+from scipy.sparse.linalg import splu
+from .transfer import computeTransferMatrix
+
+class StructureVec:
+    def __init__(self, n):
+        '''
+        A real vector with the subset of the TACS vector interface
+        that is used by the flutter analysis.
+        '''
+
+        self.x = np.zeros(n)
+
+        return
+
+    def getArray(self):
+        '''Get the underlying array of values'''
+        return self.x
+
+    def copyValues(self, vec):
+        '''Copy the values from vec to self'''
+        self.x[:] = vec.x
+        return
+
+    def axpy(self, alpha, vec):
+        '''Add self <- self + alpha*vec'''
+        self.x += alpha*vec.x
+        return
+
+    def scale(self, alpha):
+        '''Scale the vector by alpha'''
+        self.x *= alpha
+        return
+
+    def dot(self, vec):
+        '''Compute the dot product self^{T}*vec'''
+        return np.dot(self.x, vec.x)
+
+    def norm(self):
+        '''Compute the 2-norm of the vector'''
+        return np.sqrt(np.dot(self.x, self.x))
+
+    def zeroEntries(self):
+        '''Zero the values in the array'''
+        self.x[:] = 0.0
+        return
+
+    def setRand(self, lower=-1.0, upper=1.0):
+        '''Set random values in the interval [lower, upper]'''
+        self.x[:] = np.random.uniform(lower, upper, size=self.x.shape)
+        return
+
+class Structure:
+    '''
+    The interface between the flutter analysis and a structural
+    model. The vectors returned by createVec must implement getArray,
+    copyValues, axpy, scale, dot, zeroEntries and setRand.
+    '''
+
+    def createVec(self):
+        '''Create a structural vector'''
+        raise NotImplementedError()
+
+    def applyBCs(self, vec):
+        '''Zero the components of vec associated with the boundary conditions'''
+        raise NotImplementedError()
+
+    def setAeroNodes(self, X):
+        '''Set the aerodynamic surface nodes and set up the transfer'''
+        raise NotImplementedError()
+
+    def assemble(self):
+        '''Assemble the stiffness and mass matrices'''
+        raise NotImplementedError()
+
+    def multK(self, x, y):
+        '''Compute y = K*x'''
+        raise NotImplementedError()
+
+    def multM(self, x, y):
+        '''Compute y = M*x'''
+        raise NotImplementedError()
+
+    def factorShift(self, sigma):
+        '''Factor K - sigma*M'''
+        raise NotImplementedError()
+
+    def solveShift(self, b, x):
+        '''Solve (K - sigma*M)*x = b with the factored matrix'''
+        raise NotImplementedError()
+
+    def multMVecs(self, xs, ys):
+        '''Compute ys[k] = M*xs[k] for a list of vectors'''
+        for x, y in zip(xs, ys):
+            self.multM(x, y)
+        return
+
+    def solveShiftVecs(self, bs, xs):
+        '''Solve (K - sigma*M)*xs[k] = bs[k] for a list of vectors'''
+        for b, x in zip(bs, xs):
+            self.solveShift(b, x)
+        return
+
+    def transferDisps(self, vec):
+        '''
+        Transfer the structural displacements to the aerodynamic
+        surface. Returns the array of nodal displacements of length
+        3*nnodes.
+        '''
+        raise NotImplementedError()
+
+    def transferLoads(self, forces, vec):
+        '''
+        Transfer the aerodynamic nodal forces of length 3*nnodes to
+        the structure and store the loads in vec.
+        '''
+        raise NotImplementedError()
+
+    def setDesignVars(self, x):
+        '''Set the design variable values'''
+        raise NotImplementedError()
+
+    def getDesignVars(self, x):
+        '''Get the design variable values'''
+        raise NotImplementedError()
+
+    def addMatDVSensInnerProduct(self, scale, mtype, psi, phi, dfdx):
+        '''
+        Add the derivative of the inner product psi^{T}*A*phi w.r.t.
+        the design variables to dfdx, where A is the stiffness matrix
+        for mtype = 'stiffness' and the mass matrix for mtype = 'mass'.
+        '''
+        raise NotImplementedError()
+
+class SparseStructure(Structure):
+    def __init__(self, K, M, Xs, vars_per_node=3, bcs=None,
+                 dK=None, dM=None, transfer='rbf', num_nearest=10,
+                 x0=None):
+        '''
+        A structural model defined by sparse stiffness and mass
+        matrices. The shift-invert operator is factored with SuperLU
+        and the factorization is kept until the shift or the matrices
+        change.
+
+        If the derivatives dK and dM are given, the matrices depend
+        linearly on the design variables:
+
+        K(x) = K + sum_i (x_i - x0_i)*dK[i]
+        M(x) = M + sum_i (x_i - x0_i)*dM[i]
+
+        and setDesignVars updates them.
+
+        The load/displacement transfer is a sparse matrix computed by
+        computeTransferMatrix in transfer.py. The load transfer is the
+        transpose of the displacement transfer, so the transfer
+        conserves work.
+
+        Input:
+        K:             the stiffness matrix
+        M:             the mass matrix
+        Xs:            the structural nodes, shape (nnodes, 3)
+        vars_per_node: the variables per node, the first three are
+                       the translations
+        bcs:           the indices of the constrained variables
+        dK, dM:        lists of the derivatives of K and M w.r.t. each
+                       design variable (optional)
+        transfer:      the transfer method 'rbf', 'rigid' or 'nearest'
+        num_nearest:   the number of nodes used by the 'rbf' transfer
+        x0:            the design variables at which K and M are given
+                       (defaults to zero)
+        '''
+
+        self.K = sparse.csr_matrix(K)
+        self.M = sparse.csr_matrix(M)
+        self.Xs = np.array(Xs, dtype=np.float64).reshape(-1, 3)
+        self.vars_per_node = vars_per_node
+        self.size = self.K.shape[0]
+        self.dK = dK
+        self.dM = dM
+        self.transfer = transfer
+        self.num_nearest = num_nearest
+
+        # Set the boundary conditions
+        self.bcs = np.zeros(0, dtype=int)
+        if bcs is not None:
+            self.bcs = np.array(bcs, dtype=int)
+
+        # Set the design variables and the matrices at x0
+        ndv = 0
+        for dA in [dK, dM]:
+            if dA is not None:
+                if ndv > 0 and len(dA) != ndv:
+                    raise ValueError('dK and dM must have the same length')
+                ndv = len(dA)
+        self.x0 = np.zeros(ndv)
+        if x0 is not None:
+            self.x0[:] = x0
+        self.xdv = self.x0.copy()
+        self.K0 = self.K
+        self.M0 = self.M
+
+        # The factored shift-invert operator
+        self.sigma = None
+        self.lu = None
+
+        # The displacement transfer matrix
+        self.L = None
+
+        return
+
+    def createVec(self):
+        '''Create a structural vector'''
+        return StructureVec(self.size)
+
+    def applyBCs(self, vec):
+        '''Zero the constrained components of vec'''
+        vec.x[self.bcs] = 0.0
+        return
+
+    def setAeroNodes(self, X):
+        '''
+        Set up the transfer from the structural nodes to the
+        aerodynamic surface nodes X.
+        '''
+
+        self.L = computeTransferMatrix(self.Xs, X, self.vars_per_node,
+                                       self.transfer, self.num_nearest)
+
+        return
+
+    def assemble(self):
+        '''
+        The matrices are already assembled. Any existing factorization
+        is retained.
+        '''
+        return
+
+    def setMatrices(self, K, M):
+        '''
+        Set new stiffness and mass matrices at the current design
+        variables. This invalidates the factorization.
+        '''
+
+        self.K = sparse.csr_matrix(K)
+        self.M = sparse.csr_matrix(M)
+        self.K0 = self.K
+        self.M0 = self.M
+        self.x0 = self.xdv.copy()
+        self.sigma = None
+        self.lu = None
+
+        return
+
+    def setDesignVars(self, x):
+        '''
+        Set the design variable values and update the matrices with
+        the derivatives dK and dM. This invalidates the factorization.
+        '''
+
+        x = np.asarray(x, dtype=np.float64).flatten()
+        if len(x) != len(self.xdv):
+            raise ValueError('Expected %d design variables, got %d'%(
+                len(self.xdv), len(x)))
+        self.xdv[:] = x
+
+        dx = self.xdv - self.x0
+        self.K = self.K0
+        if self.dK is not None:
+            self.K = self.K0 + sum(dx[i]*self.dK[i]
+                                   for i in range(len(dx)))
+            self.K = sparse.csr_matrix(self.K)
+        self.M = self.M0
+        if self.dM is not None:
+            self.M = self.M0 + sum(dx[i]*self.dM[i]
+                                   for i in range(len(dx)))
+            self.M = sparse.csr_matrix(self.M)
+        self.sigma = None
+        self.lu = None
+
+        return
+
+    def getDesignVars(self, x):
+        '''Get the design variable values'''
+        x[:] = self.xdv
+        return
+
+    def multK(self, x, y):
+        '''Compute y = K*x'''
+        y.x[:] = self.K.dot(x.x)
+        return
+
+    def multM(self, x, y):
+        '''Compute y = M*x'''
+        y.x[:] = self.M.dot(x.x)
+        return
+
+    def factorShift(self, sigma):
+        '''
+        Factor K - sigma*M with SuperLU. The rows and columns of the
+        constrained variables are replaced by the identity. The
+        factorization is reused if the shift has not changed.
+        '''
+
+        if self.lu is not None and self.sigma == sigma:
+            return
+
+        A = (self.K - sigma*self.M).tolil()
+        if len(self.bcs) > 0:
+            A[self.bcs,:] = 0.0
+            A[:,self.bcs] = 0.0
+            A[self.bcs,self.bcs] = 1.0
+        self.lu = splu(A.tocsc())
+        self.sigma = sigma
+
+        return
+
+    def solveShift(self, b, x):
+        '''Solve (K - sigma*M)*x = b with the factored matrix'''
+
+        x.x[:] = self.lu.solve(b.x)
+        x.x[self.bcs] = 0.0
+
+        return
+
+    def multMVecs(self, xs, ys):
+        '''Compute the products with M for a block of vectors'''
+
+        Y = self.M.dot(np.array([x.x for x in xs]).T)
+        for k, y in enumerate(ys):
+            y.x[:] = Y[:,k]
+
+        return
+
+    def solveShiftVecs(self, bs, xs):
+        '''Solve with the factored matrix for a block of right-hand-sides'''
+
+        X = self.lu.solve(np.array([b.x for b in bs]).T)
+        X[self.bcs,:] = 0.0
+        for k, x in enumerate(xs):
+            x.x[:] = X[:,k]
+
+        return
+
+    def transferDisps(self, vec):
+        '''Transfer the displacements to the aerodynamic surface'''
+        return self.L.dot(vec.x)
+
+    def transferLoads(self, forces, vec):
+        '''Transfer the aerodynamic forces to the structure'''
+        vec.x[:] = self.L.T.dot(forces)
+        return
+
+    def addMatDVSensInnerProduct(self, scale, mtype, psi, phi, dfdx):
+        '''
+        Add the derivative of psi^{T}*A*phi using the matrix
+        derivatives dK or dM supplied to the constructor. A matrix
+        without derivatives does not depend on the design variables.
+        '''
+
+        if len(self.xdv) == 0:
+            raise NotImplementedError(
+                'SparseStructure requires dK/dM for the derivatives')
+
+        if mtype == 'stiffness':
+            dA = self.dK
+        else:
+            dA = self.dM
+        if dA is None:
+            return
+
+        for i in range(len(dA)):
+            dfdx[i] += scale*np.dot(psi.x, dA[i].dot(phi.x))
+
+        return
@@ -0,0 +1,190 @@
+from __future__ import print_function
+
+'''
+The TACS implementation of the structural interface used by the
+flutter analysis. The load and displacement transfer uses the sparse
+transfer matrix from transfer.py, or optionally FUNtoFEM.
+'''
+
+import numpy as np
+from tacs import TACS
+from .structure import Structure
+from .transfer import computeTransferMatrix
+
+class TACSStructure(Structure):
+    def __init__(self, tacs, num_nearest=25, transfer='rbf'):
+        '''
+        Set up the matrices, preconditioner and Krylov solver for a
+        general TACS finite-element model.
+
+        Input:
+        tacs:         the TACSAssembler object
+        num_nearest:  the number of nearest nodes used by the transfer
+        transfer:     the transfer method 'rbf', 'rigid', 'nearest' or
+                      'funtofem'
+        '''
+
+        self.tacs = tacs
+        self.num_nearest = num_nearest
+        self.transfer = transfer
+        self.funtofem = None
+        self.L = None
+
+        # Set up the matrices/pc/Krylov solver that will be required
+        # for the flutter analysis
+        self.mat = tacs.createFEMat()
+
+        # The raw stiffness/mass matrices
+        self.kmat = tacs.createFEMat()
+        self.mmat = tacs.createFEMat()
+
+        # Create the preconditioner and the solver object.  Note that
+        # these settings are best for a shell-type finite-element
+        # model.
+        self.pc = TACS.Pc(self.mat)
+
+        # Create the GMRES object
+        gmres_iters = 10
+        nrestart = 0
+        self.ksm = TACS.KSM(self.mat, self.pc, gmres_iters, nrestart)
+
+        # The shift of the factored matrix
+        self.sigma = None
+
+        return
+
+    def createVec(self):
+        '''Create a structural vector'''
+        return self.tacs.createVec()
+
+    def applyBCs(self, vec):
+        '''Apply the boundary conditions'''
+        self.tacs.applyBCs(vec)
+        return
+
+    def setAeroNodes(self, X):
+        '''
+        Set up the load and displacement transfer between the
+        structural nodes and the aerodynamic nodes X.
+        '''
+
+        # Get the structural nodes
+        Xs = self.tacs.createNodeVec()
+        self.tacs.getNodes(Xs)
+
+        if self.transfer != 'funtofem':
+            vars_per_node = self.tacs.getVarsPerNode()
+            self.L = computeTransferMatrix(Xs.getArray(), X,
+                                           vars_per_node, self.transfer,
+                                           self.num_nearest)
+            return
+
+        # FUNtoFEM is only required for this transfer
+        from funtofem import FUNtoFEM
+        from mpi4py import MPI
+
+        # Get the communicator
+        comm = MPI.COMM_WORLD
+
+        # Now, set up the load and displacement transfer object
+        struct_root = 0
+        aero_root = 0
+
+        # Specify the load/displacement transfer data
+        isymm = -1
+        self.funtofem = FUNtoFEM.pyFUNtoFEM(comm, comm, struct_root,
+                                            comm, aero_root,
+                                            FUNtoFEM.PY_LINEAR, isymm)
+        self.funtofem.setAeroNodes(X.flatten())
+
+        # Set the structural points into FUNtoFEM
+        self.funtofem.setStructNodes(Xs.getArray())
+
+        # Initialize the load/displacement transfer
+        self.funtofem.initialize(self.num_nearest)
+
+        return
+
+    def assemble(self):
+        '''Assemble the stiffness and mass matrices'''
+
+        self.tacs.assembleJacobian(1.0, 0.0, 0.0, None, self.kmat)
+        self.tacs.assembleMatType(TACS.PY_MASS_MATRIX,
+                                  self.mmat, TACS.PY_NORMAL)
+
+        # The factorization is no longer valid
+        self.sigma = None
+
+        return
+
+    def multK(self, x, y):
+        '''Compute y = K*x'''
+        self.kmat.mult(x, y)
+        return
+
+    def multM(self, x, y):
+        '''Compute y = M*x'''
+        self.mmat.mult(x, y)
+        return
+
+    def factorShift(self, sigma):
+        '''
+        Factor the preconditioner for K - sigma*M. The factorization is
+        reused if the shift has not changed since the last assembly.
+        '''
+
+        if self.sigma == sigma:
+            return
+
+        self.mat.copyValues(self.kmat)
+        self.mat.axpy(-sigma, self.mmat)
+        self.pc.factor()
+        self.sigma = sigma
+
+        return
+
+    def solveShift(self, b, x):
+        '''Solve (K - sigma*M)*x = b'''
+        self.ksm.solve(b, x)
+        return
+
+    def transferDisps(self, vec):
+        '''Transfer the displacements to the aerodynamic surface'''
+
+        if self.L is not None:
+            return self.L.dot(vec.getArray())
+
+        self.funtofem.transferDisps(vec.getArray())
+        return np.array(self.funtofem.getAeroDisps())
+
+    def transferLoads(self, forces, vec):
+        '''Transfer the aerodynamic forces to the structure'''
+
+        if self.L is not None:
+            vec.getArray()[:] = self.L.T.dot(forces)
+        else:
+            self.funtofem.transferLoads(forces)
+            vec.getArray()[:] = self.funtofem.getStructLoads()
+
+        return
+
+    def setDesignVars(self, x):
+        '''Set the design variable values'''
+        self.tacs.setDesignVars(x)
+        return
+
+    def getDesignVars(self, x):
+        '''Get the design variable values'''
+        self.tacs.getDesignVars(x)
+        return
+
+    def addMatDVSensInnerProduct(self, scale, mtype, psi, phi, dfdx):
+        '''Add the derivative of psi^{T}*A*phi to dfdx'''
+
+        if mtype == 'stiffness':
+            mtype = TACS.PY_STIFFNESS_MATRIX
+        else:
+            mtype = TACS.PY_MASS_MATRIX
+        self.tacs.addMatDVSensInnerProduct(scale, mtype, psi, phi, dfdx)
+
+        return
@@ -0,0 +1,176 @@
+from __future__ import print_function
+
+'''
+Load and displacement transfer between a structural model and the
+aerodynamic surface. The transfer is a sparse matrix L that maps the
+structural degrees of freedom to the displacements of the aerodynamic
+nodes. The aerodynamic forces are transferred to the structure with
+L^{T}, so that the transfer is conservative: the work done by the
+aerodynamic forces on the aerodynamic displacements is equal to the
+work done by the structural loads on the structural displacements.
+'''
+
+import numpy as np
+import scipy.sparse as sparse
+from scipy.spatial import cKDTree
+
+def computeTransferMatrix(Xs, Xa, vars_per_node=3, method='rbf',
+                          num_nearest=10):
+    '''
+    Compute the displacement transfer matrix from the structural nodes
+    to the aerodynamic nodes. The first three variables at each
+    structural node must be the displacements, and for the rigid link
+    transfer the next three variables must be the rotations.
+
+    Input:
+    Xs:            the structural nodes, shape (ns, 3)
+    Xa:            the aerodynamic nodes, shape (na, 3)
+    vars_per_node: the number of variables per structural node
+    method:        'nearest', 'rigid' or 'rbf'
+    num_nearest:   the number of structural nodes used by the radial
+                   basis function interpolation for each aerodynamic node
+
+    Output:
+    L:             the sparse transfer matrix of shape
+                   (3*na, vars_per_node*ns)
+    '''
+
+    if vars_per_node < 3:
+        raise ValueError('The transfer requires three displacements per node')
+
+    Xs = np.array(Xs, dtype=np.float64).reshape(-1, 3)
+    Xa = np.array(Xa, dtype=np.float64).reshape(-1, 3)
+    ns = Xs.shape[0]
+    na = Xa.shape[0]
+
+    # Build the spatial index for the structural nodes
+    tree = cKDTree(Xs)
+
+    if method == 'nearest' or method == 'rigid':
+        # Each aerodynamic node is attached to the closest structural
+        # node
+        dist, index = tree.query(Xa)
+        rows, cols, vals = _linkEntries(Xs, Xa, index, vars_per_node,
+                                        method == 'rigid')
+    elif method == 'rbf':
+        num_nearest = min(num_nearest, ns)
+        rows, cols, vals = _rbfEntries(Xs, Xa, tree, num_nearest,
+                                       vars_per_node)
+    else:
+        raise ValueError('Unknown transfer method %s'%(method))
+
+    L = sparse.csr_matrix((vals, (rows, cols)),
+                          shape=(3*na, vars_per_node*ns))
+
+    return L
+
+def _linkEntries(Xs, Xa, index, vars_per_node, rigid):
+    '''
+    Compute the entries of the transfer matrix for a link to the
+    closest structural node. For the rigid link, the rotations at the
+    structural node are included: ua = us + theta x (Xa - Xs).
+    '''
+
+    na = Xa.shape[0]
+
+    # The translations are transferred directly
+    rows = [np.arange(3*na)]
+    cols = [vars_per_node*np.repeat(index, 3) + np.tile(np.arange(3), na)]
+    vals = [np.ones(3*na)]
+
+    if rigid:
+        if vars_per_node < 6:
+            raise ValueError(
+                'The rigid link transfer requires the rotations')
+
+        # Add the contributions from theta x r
+        r = Xa - Xs[index]
+        base = vars_per_node*index + 3
+        for (i, j, k, sign) in [(0, 1, 2, 1.0), (0, 2, 1, -1.0),
+                                (1, 0, 2, -1.0), (1, 2, 0, 1.0),
+                                (2, 0, 1, 1.0), (2, 1, 0, -1.0)]:
+            # Component i of the displacement due to rotation j
+            rows.append(3*np.arange(na) + i)
+            cols.append(base + j)
+            vals.append(sign*r[:,k])
+
+    return np.hstack(rows), np.hstack(cols), np.hstack(vals)
+
+def _rbfEntries(Xs, Xa, tree, num_nearest, vars_per_node):
+    '''
+    Compute the entries of the transfer matrix for a local radial basis
+    function interpolation augmented with a linear polynomial. For
+    each aerodynamic node, the interpolation uses the num_nearest
+    closest structural nodes and a compactly supported Wendland
+    function. The linear polynomial ensures that rigid translations and
+    small rigid rotations are transferred exactly. When the nearest
+    structural nodes lie along a line or in a plane, or there are
+    fewer than three of them, the degenerate polynomial directions are
+    removed. The weights for all the
+    aerodynamic nodes are computed with a single batched solve.
+    '''
+
+    na = Xa.shape[0]
+    k = num_nearest
+
+    # Find the nearest structural nodes
+    dist, index = tree.query(Xa, k=k)
+    dist = dist.reshape(na, k)
+    index = index.reshape(na, k)
+
+    # Set the support radius for each aerodynamic node
+    radius = 1.5*np.max(dist, axis=1) + 1e-30
+
+    # Compute the linear polynomial terms centered at the aerodynamic
+    # node in the principal directions of the nearest nodes
+    Xn = Xs[index]
+    P = Xn - Xa[:,np.newaxis,:]
+    Pc = P - np.mean(P, axis=1)[:,np.newaxis,:]
+    if k < 3:
+        # Pad with zero rows so that all three directions are found.
+        # The missing directions are then degenerate.
+        Pc = np.concatenate((Pc, np.zeros((na, 3-k, 3))), axis=1)
+    U, S, Vt = np.linalg.svd(Pc, full_matrices=False)
+    P = np.einsum('nkj,nij->nki', P, Vt)
+
+    # Remove the directions in which the nodes are degenerate
+    degen = S <= 1e-8*radius[:,np.newaxis]
+    P[np.repeat(degen[:,np.newaxis,:], k, axis=1)] = 0.0
+
+    # Form the interpolation matrices for each aerodynamic node
+    diff = Xn[:,:,np.newaxis,:] - Xn[:,np.newaxis,:,:]
+    rn = np.sqrt(np.sum(diff**2, axis=3))/radius[:,np.newaxis,np.newaxis]
+
+    A = np.zeros((na, k+4, k+4))
+    A[:,:k,:k] = _wendland(rn)
+    A[:,:k,k] = 1.0
+    A[:,k,:k] = 1.0
+    A[:,:k,k+1:] = P
+    A[:,k+1:,:k] = np.transpose(P, (0, 2, 1))
+    for i in range(3):
+        A[degen[:,i],k+1+i,k+1+i] = 1.0
+
+    # Form the right-hand-side for the aerodynamic node. The
+    # polynomial is centered at the aerodynamic node.
+    b = np.zeros((na, k+4))
+    b[:,:k] = _wendland(dist/radius[:,np.newaxis])
+    b[:,k] = 1.0
+
+    # Compute the interpolation weights. The matrix is symmetric so the
+    # weights are the solution of A*w = b.
+    w = np.linalg.solve(A, b[:,:,np.newaxis])[:,:k,0]
+
+    # Each displacement component is interpolated from the same
+    # component at the structural nodes
+    rows = np.repeat(3*np.arange(na), 3*k) + np.tile(
+        np.repeat(np.arange(3), k), na)
+    cols = vars_per_node*np.tile(index, (1, 3)).flatten() + np.tile(
+        np.repeat(np.arange(3), k), na)
+    vals = np.tile(w, (1, 3)).flatten()
+
+    return rows, cols, vals
+
+def _wendland(r):
+    '''The Wendland C2 function with unit support radius'''
+    r = np.minimum(r, 1.0)
+    return (1.0 - r)**4*(4.0*r + 1.0)
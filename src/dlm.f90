@@ -85,6 +85,77 @@ subroutine approxKernelIntegrals(I0, J0, u1, k1)
   
 end subroutine approxKernelIntegrals
 
+subroutine approxKernelIntegralsDeriv(I0, J0, dI0, dJ0, u1, k1)
+  ! Compute the approximate values of the integrals I0 and J0 and
+  ! their derivatives with respect to k1. This is the forward-mode
+  ! derivative of approxKernelIntegrals.
+  !
+  ! Input:
+  ! u1:  (M*R - x0)/(beta^2*x0)
+  ! k1:  omega*r1/U
+  !
+  ! Output:
+  ! I0, J0:    Approximate values of the integrals I0 and J0
+  ! dI0, dJ0:  The derivatives of I0 and J0 w.r.t. k1
+  
+  use precision
+  implicit none
+  real(kind=dtype), intent(in) :: u1, k1
+  complex(kind=dtype), intent(out) :: I0, J0, dI0, dJ0
+  integer :: n
+  real(kind=dtype) :: pn, a(12)
+  complex(kind=dtype) :: expn, invn, kval, dexpn, dinvn, fn
+
+  ! Constants used in this function
+  complex(kind=dtype), parameter :: I = cmplx(0.0, 1.0, kind=dtype)
+
+  ! Set the parameter b - the expontential in the kernel integral
+  real(kind=dtype), parameter :: b = 0.009054814793_dtype
+
+  ! Set the values of the constants requried for the evaluation of the
+  ! approximate integrals
+  a(1) = 0.000319759140_dtype
+  a(2) = -0.000055461471_dtype
+  a(3) = 0.002726074362_dtype
+  a(4) = 0.005749551566_dtype
+  a(5) = 0.031455895072_dtype
+  a(6) = 0.106031126212_dtype
+  a(7) = 0.406838011567_dtype
+  a(8) = 0.798112357155_dtype
+  a(9) = -0.417749229098_dtype
+  a(10) = 0.077480713894_dtype
+  a(11) = -0.012677284771_dtype
+  a(12) = 0.001787032960_dtype
+
+  ! Evaluate the integral for I0 and J0
+  I0 = cmplx(0.0, 0.0, kind=dtype)
+  J0 = cmplx(0.0, 0.0, kind=dtype)
+  dI0 = cmplx(0.0, 0.0, kind=dtype)
+  dJ0 = cmplx(0.0, 0.0, kind=dtype)
+
+  ! Evaluate the integral for positive values of u1. Note that
+  ! d(kval)/d(k1) = I
+  do n = 1, 12
+     pn = b*(2**n)
+     kval = cmplx(pn, k1, kind=dtype)
+     expn = exp(-kval*u1)
+     invn = 1.0/kval
+     fn = kval*u1 + cmplx(1.0, 0.0, kind=dtype)
+
+     ! Compute the derivatives of the terms
+     dexpn = -I*u1*expn
+     dinvn = -I*invn*invn
+
+     I0 = I0 + a(n)*expn*invn
+     J0 = J0 + a(n)*expn*fn*invn*invn
+
+     dI0 = dI0 + a(n)*(dexpn*invn + expn*dinvn)
+     dJ0 = dJ0 + a(n)*(dexpn*fn*invn*invn + expn*I*u1*invn*invn + &
+          2.0*expn*fn*invn*dinvn)
+  end do
+  
+end subroutine approxKernelIntegralsDeriv
+
 subroutine evalK1K2Coeff(Kf1, Kf2, r1, u1, k1, beta, R, M)
   ! Compute the value of the K1 and K2 functions given the values of
   ! the local panel variables. This code calls the function
@@ -177,6 +248,122 @@ subroutine evalK1K2Coeff(Kf1, Kf2, r1, u1, k1, beta, R, M)
 
 end subroutine evalK1K2Coeff
 
+subroutine evalK1K2CoeffDeriv(Kf1, Kf2, dKf1, dKf2, r1, u1, k1, beta, R, M)
+  ! Compute the value of the K1 and K2 functions and their
+  ! derivatives with respect to k1. This is the forward-mode
+  ! derivative of evalK1K2Coeff. Note that u1 does not depend on k1.
+  !
+  ! Input:
+  ! u1:   (M*R - x0)/(beta^2*x0)
+  ! k1:   omega*r1/U
+  ! beta: sqrt(1.0 - M**2)
+  ! R:    sqrt(x0**2 + (beta*r1)**2)
+  ! M:    Mach number
+  !
+  ! Output:
+  ! K1, K2:    the kernel functions
+  ! dK1, dK2:  the derivatives of the kernel functions w.r.t. k1
+  
+  use precision
+  implicit none
+  real(kind=dtype), intent(in) :: r1, u1, k1, beta, R, M
+  complex(kind=dtype), intent(out) :: Kf1, Kf2, dKf1, dKf2
+  
+  ! Local temporary variables
+  real(kind=dtype) :: invsqrt, invR, u1pos
+  complex(kind=dtype) :: expk, I0, J0, I1, I2 
+  complex(kind=dtype) :: I10, I20, I11, I21
+  complex(kind=dtype) :: dexpk, dI0, dJ0, dI1, dI2
+  complex(kind=dtype) :: dI10, dI20, dI11, dI21
+
+  ! Constant definitions
+  complex(kind=dtype), parameter :: I = cmplx(0.0, 1.0, kind=dtype)
+  real(kind=dtype), parameter :: zero = 0.0_dtype
+  real(kind=dtype), parameter :: one = 1.0_dtype
+  real(kind=dtype), parameter :: two = 2.0_dtype
+
+  invR = one/R
+  invsqrt = one/sqrt(one + u1**2)
+
+  if (u1 < zero) then
+     ! Use separate logic when the argument u1 is negative. This is
+     ! required since the approximate integrals for I0 and J0 are not
+     ! defined for negative values of u1. 
+     call approxKernelIntegralsDeriv(I0, J0, dI0, dJ0, zero, k1)
+
+     ! Evaluate I1
+     I10 = one - I*k1*I0
+     dI10 = -I*I0 - I*k1*dI0
+     
+     ! Evaluate 3*I2
+     I20 = two - I*k1*I0 + J0*k1**2
+     dI20 = -I*I0 - I*k1*dI0 + dJ0*k1**2 + two*J0*k1
+
+     ! Evaluate the approximate integrals I0 and J0
+     u1pos = -u1
+     call approxKernelIntegralsDeriv(I0, J0, dI0, dJ0, u1pos, k1)
+
+     ! Compute the temporary variable values that will be used below
+     expk = exp(-I*k1*u1pos)
+     dexpk = -I*u1pos*expk
+
+     ! Evaluate I1
+     I11 = (one - u1pos*invsqrt)*expk - I*k1*I0
+     dI11 = (one - u1pos*invsqrt)*dexpk - I*I0 - I*k1*dI0
+     
+     ! Evaluate 3*I2
+     I21 = ((two + I*k1*u1pos)*(one - u1pos*invsqrt) &
+          - u1pos*invsqrt**3)*expk - I*k1*I0 + J0*k1**2
+     dI21 = I*u1pos*(one - u1pos*invsqrt)*expk &
+          + ((two + I*k1*u1pos)*(one - u1pos*invsqrt) &
+          - u1pos*invsqrt**3)*dexpk &
+          - I*I0 - I*k1*dI0 + dJ0*k1**2 + two*J0*k1
+
+     I1 = cmplx(2.0*real(I10) - real(I11), aimag(I11), kind=dtype)
+     I2 = cmplx(2.0*real(I20) - real(I21), aimag(I21), kind=dtype)
+
+     ! Since k1 is real, the derivatives follow the same pattern
+     dI1 = cmplx(2.0*real(dI10) - real(dI11), aimag(dI11), kind=dtype)
+     dI2 = cmplx(2.0*real(dI20) - real(dI21), aimag(dI21), kind=dtype)
+
+     ! Recompute expk
+     expk = exp(-I*k1*u1)
+     dexpk = -I*u1*expk
+  else 
+     ! Compute the temporary variable values that will be used below
+     expk = exp(-I*k1*u1)
+     dexpk = -I*u1*expk
+
+     ! Evaluate the approximate integrals I0 and J0
+     call approxKernelIntegralsDeriv(I0, J0, dI0, dJ0, u1, k1)
+
+     ! Evaluate I1
+     I1 = (one - u1*invsqrt)*expk - I*k1*I0
+     dI1 = (one - u1*invsqrt)*dexpk - I*I0 - I*k1*dI0
+     
+     ! Evaluate 3*I2
+     I2 = ((two + I*k1*u1)*(one - u1*invsqrt) &
+          - u1*invsqrt**3)*expk - I*k1*I0 + J0*k1**2
+     dI2 = I*u1*(one - u1*invsqrt)*expk &
+          + ((two + I*k1*u1)*(one - u1*invsqrt) &
+          - u1*invsqrt**3)*dexpk &
+          - I*I0 - I*k1*dI0 + dJ0*k1**2 + two*J0*k1
+  end if
+
+  ! Compute the first component of the kernel function
+  Kf1 = I1 + M*r1*invR*invsqrt*expk
+  dKf1 = dI1 + M*r1*invR*invsqrt*dexpk
+  
+  ! Compute the second component of the kernel function
+  Kf2 = -I2 - I*k1*invsqrt*expk*(M*r1*invR)**2 &
+       - (M*r1*invR)*((one + u1**2)*(beta*r1*invR)**2 + &
+       two + M*r1*u1*invR)*expk*invsqrt**3
+  dKf2 = -dI2 - I*invsqrt*(expk + k1*dexpk)*(M*r1*invR)**2 &
+       - (M*r1*invR)*((one + u1**2)*(beta*r1*invR)**2 + &
+       two + M*r1*u1*invR)*dexpk*invsqrt**3
+
+end subroutine evalK1K2CoeffDeriv
+
 subroutine evalKernelNumerator(Kf1, Kf2, omega, U, beta, M, &
      x0, r1, R, T1, T2, steadykernel, epstol)
   ! Evaluate the two components of the kernel function which are
@@ -240,6 +427,72 @@ subroutine evalKernelNumerator(Kf1, Kf2, omega, U, beta, M, &
 
 end subroutine evalKernelNumerator
 
+subroutine evalKernelNumeratorDeriv(Kf1, Kf2, dKf1, dKf2, omega, U, &
+     beta, M, x0, r1, R, T1, T2, steadykernel, epstol)
+  ! Evaluate the two components of the kernel function and their
+  ! derivatives with respect to the frequency omega. This is the
+  ! forward-mode derivative of evalKernelNumerator.
+  ! 
+  ! Input:
+  ! omega:      the frequency of oscillation
+  ! U:          the free-stream velocity
+  ! beta:       sqrt(1 - M**2)
+  ! M :         the free-stream Mach number
+  ! x0, r1, R:  the distances from the current panel location
+  ! T1, T2:     the directional factors
+  !
+  ! Output
+  ! Kf1, Kf2:   the kernel numerator components
+  ! dKf1, dKf2: the derivatives of the components w.r.t. omega
+
+  use precision
+  implicit none
+
+  logical, intent(in) :: steadykernel
+  complex(kind=dtype), intent(out) :: Kf1, Kf2, dKf1, dKf2
+  real(kind=dtype), intent(in) :: omega, U, beta, M, x0, r1, R
+  real(kind=dtype), intent(in) :: T1, T2, epstol
+  
+  ! Local temporary variables
+  complex(kind=dtype) :: expk, dexpk
+  real(kind=dtype) :: k1, dk1, u1, Kf10, Kf20
+
+  ! Constants used in this function
+  real(kind=dtype), parameter :: zero = 0.0_dtype
+  real(kind=dtype), parameter :: one = 1.0_dtype
+  real(kind=dtype), parameter :: two = 2.0_dtype
+  complex(kind=dtype), parameter :: I = cmplx(0.0, 1.0, kind=dtype)
+
+  ! Compute the k1 and u1 coefficients used elsewhere
+  k1 = omega*r1/U
+  dk1 = r1/U
+  if (r1 <= epstol) then
+     u1 = (M*R - x0)/(epstol*beta**2)
+  else
+     u1 = (M*R - x0)/(r1*beta**2)
+  end if
+
+  call evalK1K2CoeffDeriv(Kf1, Kf2, dKf1, dKf2, r1, u1, k1, beta, R, M)
+
+  ! Compute the zero-frequency contributions from the coefficients
+  if (steadykernel) then
+     Kf10 = one + x0/R
+     Kf20 = -two - (x0/R)*(two + (beta*r1/R)**2)
+  else
+     Kf10 = zero
+     Kf20 = zero
+  end if
+
+  ! Complete the value values of the kernel function
+  expk = exp(-I*omega*x0/U)
+  dexpk = -I*(x0/U)*expk
+  dKf1 = (dKf1*dk1*expk + Kf1*dexpk)*T1
+  dKf2 = (dKf2*dk1*expk + Kf2*dexpk)*T2
+  Kf1 = (Kf1*expk - Kf10)*T1
+  Kf2 = (Kf2*expk - Kf20)*T2
+
+end subroutine evalKernelNumeratorDeriv
+
 subroutine computeQuadDoubletCoeff(dinf, omega, U, beta, M, &
      dxav, xr, xi, xo, e, cosr, sinr, coss, sins, steadykernel, epstol)
   ! Evaluate the influence coefficient between a sending panel and a
@@ -397,6 +650,187 @@ subroutine computeQuadDoubletCoeff(dinf, omega, U, beta, M, &
   
 end subroutine computeQuadDoubletCoeff
 
+subroutine computeQuadDoubletCoeffDeriv(dinf, ddinf, omega, U, beta, M, &
+     dxav, xr, xi, xo, e, cosr, sinr, coss, sins, steadykernel, epstol)
+  ! Evaluate the influence coefficient between a sending panel and a
+  ! recieving point and its derivative with respect to the frequency
+  ! omega. This is the forward-mode derivative of
+  ! computeQuadDoubletCoeff. Note that the steady horseshoe vortex
+  ! contribution does not depend on omega.
+
+  use precision
+  use constants
+  implicit none
+
+  ! Input/output arguments
+  logical, intent(in) :: steadykernel
+  complex(kind=dtype), intent(out) :: dinf, ddinf
+  real(kind=dtype), intent(in) :: omega, U, beta, M, epstol
+  real(kind=dtype), intent(in) :: dxav, xr(3), xi(3), xo(3)
+  real(kind=dtype), intent(in) :: e, cosr, sinr, coss, sins
+
+  ! Local real values
+  real(kind=dtype) :: x0, y0, z0
+  real(kind=dtype) :: eta, zeta, F
+
+  ! The influence coefficients for the different terms
+  complex(kind=dtype) :: dinf0, dinf1, dinf2, ddinf1, ddinf2
+
+  ! The kernel functions evaluate at the different points
+  complex(kind=dtype) :: Ki1, Ki2, Km1, Km2, Ko1, Ko2
+  complex(kind=dtype) :: dKi1, dKi2, dKm1, dKm2, dKo1, dKo2
+  real(kind=dtype) :: r1, R, T1, T2
+  complex(kind=dtype) :: A1, B1, C1, A2, B2, C2, alpha
+  complex(kind=dtype) :: dA1, dB1, dC1, dA2, dB2, dC2
+
+  ! The coefficients for the horseshoe vortex computation
+  real(kind=dtype) :: vy, vz, a(3), b(3), anrm, bnrm, ainv, binv
+  real(kind=dtype) :: fact
+
+  ! Set a constant for later useage
+  real(kind=dtype), parameter :: zero = 0.0_dtype
+  real(kind=dtype), parameter :: half = 0.5_dtype
+  real(kind=dtype), parameter :: one = 1.0_dtype
+
+  fact = dxav/(8.0*PI)
+
+  dinf0 = zero
+  dinf1 = zero
+  dinf2 = zero
+  ddinf1 = zero
+  ddinf2 = zero
+
+  if (omega > 0.0) then
+     ! T1 = cos(gr - gs)
+     T1 = cosr*coss + sinr*sins
+
+     ! Compute the kernel function at the inboard point
+     x0 = xr(1) - xi(1)
+     y0 = xr(2) - xi(2)
+     z0 = xr(3) - xi(3)
+     T2 = (z0*coss - y0*sins)*(z0*cosr - y0*sinr)
+
+     ! Conmpute the distances
+     r1 = sqrt(y0**2 + z0**2)
+     R = sqrt(x0**2 + beta**2*(y0**2 + z0**2))
+     call evalKernelNumeratorDeriv(Ki1, Ki2, dKi1, dKi2, omega, U, beta, M, &
+          x0, r1, R, T1, T2, steadykernel, epstol)
+     
+     ! Evaluate the kernel function at the outboard point
+     x0 = xr(1) - xo(1)
+     y0 = xr(2) - xo(2)
+     z0 = xr(3) - xo(3)
+     T2 = (z0*coss - y0*sins)*(z0*cosr - y0*sinr)
+
+     ! Conmpute the distances
+     r1 = sqrt(y0**2 + z0**2)
+     R = sqrt(x0**2 + beta**2*(y0**2 + z0**2))
+     call evalKernelNumeratorDeriv(Ko1, Ko2, dKo1, dKo2, omega, U, beta, M, &
+          x0, r1, R, T1, T2, steadykernel, epstol)
+     
+     ! Evaluate the kennel function at the mid-point
+     x0 = xr(1) - half*(xi(1) + xo(1))
+     y0 = xr(2) - half*(xi(2) + xo(2))
+     z0 = xr(3) - half*(xi(3) + xo(3))
+     T2 = (z0*coss - y0*sins)*(z0*cosr - y0*sinr)
+
+     ! Conmpute the distances
+     r1 = sqrt(y0**2 + z0**2)
+     R = sqrt(x0**2 + beta**2*(y0**2 + z0**2))
+     call evalKernelNumeratorDeriv(Km1, Km2, dKm1, dKm2, omega, U, beta, M, &
+          x0, r1, R, T1, T2, steadykernel, epstol)
+
+     ! Compute the A, B and C coefficients for the first term
+     A1 = (Ki1 - 2.0*Km1 + Ko1)/(2.0*e**2)
+     B1 = (Ko1 - Ki1)/(2.0*e)
+     C1 = Km1
+     dA1 = (dKi1 - 2.0*dKm1 + dKo1)/(2.0*e**2)
+     dB1 = (dKo1 - dKi1)/(2.0*e)
+     dC1 = dKm1
+
+     ! Compute the A, B and C coefficients for the second term
+     A2 = (Ki2 - 2.0*Km2 + Ko2)/(2.0*e**2)
+     B2 = (Ko2 - Ki2)/(2.0*e)
+     C2 = Km2
+     dA2 = (dKi2 - 2.0*dKm2 + dKo2)/(2.0*e**2)
+     dB2 = (dKo2 - dKi2)/(2.0*e)
+     dC2 = dKm2
+
+     ! Compute horizontal and vertical distances from the origin in
+     ! the local ref. frame
+     eta = y0*coss + z0*sins
+     zeta = -y0*sins + z0*coss
+     
+     ! First compute the F-integral
+     if (abs(zeta) < epstol*e) then
+        F = 2*e/(eta**2 - e**2)
+     else 
+        F = atan(2*e*abs(zeta)/(eta**2 + zeta**2 - e**2))/abs(zeta)
+     end if
+
+     ! Compute the contribution from the integral of 
+     ! (A1*y**2 + B1*y + C1)/((eta - y)**2 + zeta**2). This is linear
+     ! in A1, B1 and C1.
+     dinf1 = (((eta**2 - zeta**2)*A1 + eta*B1 + C1)*F &
+          + (0.5*B1 + eta*A1)*log(((eta - e)**2 + zeta**2)/ &
+          ((eta + e)**2 + zeta**2)) + 2.0*e*A1)
+     ddinf1 = (((eta**2 - zeta**2)*dA1 + eta*dB1 + dC1)*F &
+          + (0.5*dB1 + eta*dA1)*log(((eta - e)**2 + zeta**2)/ &
+          ((eta + e)**2 + zeta**2)) + 2.0*e*dA1)
+
+     if (abs(zeta) < epstol*e) then
+        dinf2 = zero
+        ddinf2 = zero
+     else
+        ! Compute the contribution from the integral of 
+        ! (A2*y**2 + B2*y + C2)/((eta - y)**2 + zeta**2)**2. This is
+        ! linear in A2, B2 and C2.
+        alpha = (e/zeta)**2*(one - (eta**2 + zeta**2 - e**2)/(2*e)*F)
+
+        dinf2 = e/(eta**2 + zeta**2 - e**2)*(( &
+             (2.0*(eta**2 + zeta**2 + e**2)*(e**2*A2 + C2) + 4.0*eta*e**2*B2))/ &
+             (((eta + e)**2 + zeta**2)*((eta - e)**2 + zeta**2)) &
+             - (alpha/e**2)*((eta**2 + zeta**2)*A2 + eta*B2 + C2))
+        ddinf2 = e/(eta**2 + zeta**2 - e**2)*(( &
+             (2.0*(eta**2 + zeta**2 + e**2)*(e**2*dA2 + dC2) + 4.0*eta*e**2*dB2))/ &
+             (((eta + e)**2 + zeta**2)*((eta - e)**2 + zeta**2)) &
+             - (alpha/e**2)*((eta**2 + zeta**2)*dA2 + eta*dB2 + dC2))
+     end if
+  end if
+
+  if (steadykernel) then
+     ! Compute the term dinf0 from a horseshoe vortex method. First add
+     ! the contribution from the inboard and outboard vorticies
+     a(1) = (xr(1) - xi(1))/beta
+     a(2) = (xr(2) - xi(2))
+     a(3) = (xr(3) - xi(3))
+     anrm = sqrt(a(1)**2 + a(2)**2 + a(3)**2)
+     ainv = one/(anrm*(anrm - a(1)))
+     
+     b(1) = (xr(1) - xo(1))/beta
+     b(2) = (xr(2) - xo(2))
+     b(3) = (xr(3) - xo(3))
+     bnrm = sqrt(b(1)**2 + b(2)**2 + b(3)**2)
+     binv = one/(bnrm*(bnrm - b(1)))
+     
+     vy =  a(3)*ainv - b(3)*binv
+     vz = -a(2)*ainv + b(2)*binv
+     
+     ! Now, add the contribution from the bound vortex
+     ainv = one/(anrm*bnrm*(anrm*bnrm + a(1)*b(1) + a(2)*b(2) + a(3)*b(3)))
+     vy = vy + (a(3)*b(1) - a(1)*b(3))*(anrm + bnrm)*ainv
+     vz = vz + (a(1)*b(2) - a(2)*b(1))*(anrm + bnrm)*ainv
+     
+     ! Compute the steady normalwash
+     dinf0 = -(sinr*vy - cosr*vz)
+  end if
+
+  ! Add up all the contributions to the doublet
+  dinf = fact*(dinf0 + dinf1 + dinf2)
+  ddinf = fact*(ddinf1 + ddinf2)
+  
+end subroutine computeQuadDoubletCoeffDeriv
+
 subroutine computeInputMeshSegment(n, m, x0, span, dihedral, sweep, cr, tr, &
      Xi, Xo, Xr, dXav)
   ! This routine computes parts of the input mesh for a given lifting
@@ -548,6 +982,8 @@ subroutine computeInfluenceMatrix(D, omega, U, M, np, &
   ! Output:
   ! D:  complex coefficient matrix
 
+  ! Release the GIL so that frequencies can be assembled concurrently
+  !f2py threadsafe
   use precision
   implicit none
 
@@ -611,6 +1047,94 @@ subroutine computeInfluenceMatrix(D, omega, U, M, np, &
   end if
 end subroutine computeInfluenceMatrix
 
+subroutine computeInfluenceMatrixDeriv(D, dD, omega, U, M, np, &
+     Xi, Xo, Xr, dXav, symmetric, steadykernel, epstol)
+  ! This routine computes the complex influence coefficient matrix
+  ! and its derivative with respect to the frequency omega in a
+  ! single pass.
+  ! 
+  ! Input:
+  ! omega: the frequency of oscillation
+  ! U:     the velocity of the free-stream
+  ! M:     the free-stream Mach number
+  ! np:    number of panels
+  ! Xi:    inboad sending point
+  ! Xo:    outboard sending point
+  ! Xr:    receiving point
+  ! dXav:  average length in the x-direction of the panel
+  !
+  ! Output:
+  ! D:   complex coefficient matrix
+  ! dD:  derivative of the coefficient matrix w.r.t. omega
+
+  !f2py threadsafe
+  use precision
+  implicit none
+
+  ! Input/output types
+  logical, intent(in) :: steadykernel
+  integer, intent(in) :: np, symmetric
+  complex(kind=dtype), intent(inout) :: D(np, np), dD(np, np)
+  real(kind=dtype), intent(in) :: omega, U, M, epstol
+  real(kind=dtype), intent(in) :: Xi(3,np), Xo(3,np), Xr(3,np), dXav(np)
+
+  ! Temporary data used internally
+  integer :: r, s
+  real(kind=dtype) :: beta, xrsymm(3), sinsymm
+  real(kind=dtype) :: pe(np), pcos(np), psin(np)
+  complex(kind=dtype) :: dtmp, ddtmp
+
+  ! Compute the compressibility factor
+  beta = sqrt(1.0 - M**2)
+
+  ! Pre-processing step: Compute the sin/cos and length of all the
+  ! panels in the model
+  do r = 1, np
+     ! Compute 1/2 the bound vortex length
+     pe(r) = 0.5*sqrt((Xo(2,r) - Xi(2,r))**2 + (Xo(3,r) - Xi(3,r))**2)
+
+     ! Compute the sin and cos of the dihedral
+     pcos(r) = 0.5*(Xo(2,r) - Xi(2,r))/pe(r)
+     psin(r) = 0.5*(Xo(3,r) - Xi(3,r))/pe(r)
+  end do
+
+  if (symmetric == 0) then
+     do s = 1, np
+        do r = 1, np
+           ! Compute the panel influence coefficient
+           call computeQuadDoubletCoeffDeriv(D(r, s), dD(r, s), &
+                omega, U, beta, M, &
+                dXav(s), Xr(:, r), Xi(:, s), Xo(:, s), pe(s), &
+                pcos(r), psin(r), pcos(s), psin(s), steadykernel, epstol)
+        end do
+     end do
+  else
+     do s = 1, np
+        do r = 1, np
+           ! Compute the panel influence coefficient
+           call computeQuadDoubletCoeffDeriv(D(r, s), dD(r, s), &
+                omega, U, beta, M, &
+                dXav(s), Xr(:, r), Xi(:, s), Xo(:, s), pe(s), &
+                pcos(r), psin(r), pcos(s), psin(s), steadykernel, epstol)
+
+           ! Compute the influence from the same panel, but the
+           ! reflected point
+           xrsymm(1) =  Xr(1, r)
+           xrsymm(2) = -Xr(2, r)
+           xrsymm(3) =  Xr(3, r)
+           sinsymm = -psin(r)
+
+           call computeQuadDoubletCoeffDeriv(dtmp, ddtmp, &
+                omega, U, beta, M, &
+                dXav(s), xrsymm, Xi(:, s), Xo(:, s), pe(s), &
+                pcos(r), sinsymm, pcos(s), psin(s), steadykernel, epstol)
+           D(r, s) = D(r, s) + dtmp
+           dD(r, s) = dD(r, s) + ddtmp
+        end do
+     end do
+  end if
+end subroutine computeInfluenceMatrixDeriv
+
 subroutine addCpForces(np, n, qinf, Cp, X, conn, forces)
   ! Given the coefficient of pressure, compute the forces at each
   ! node. This distributes the force to each of the corresponding